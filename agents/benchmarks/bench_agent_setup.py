@@ -0,0 +1,55 @@
+# %%
+"""
+Porównanie kosztu przygotowania agenta na jeden kurs:
+nowy CourseRanker dla każdego kursu (poprzednie drivery) vs jeden agent resetowany przed każdym kursem.
+Nie wysyła zapytań do modelu - mierzy wyłącznie narzut konstrukcji agenta (łącznie z agentem swarms,
+który LazyAgent tworzy dopiero przy pierwszym użyciu) i budowy danych kursu.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+AGENTS_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(AGENTS_DIR / "ranking agents"))
+from course_ranker import CourseRanker
+
+survey_data = {
+    "Preferowana tematyka zajęć": "Historia i archeologia",
+    "Preferowany tryb prowadzenia zajęć": "zdalnie",
+    "Preferowany rodzaj zaliczenia": "Test/egzamin",
+}
+
+# %%
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--courses-filename", default=str(AGENTS_DIR.parent / "train_data" / "oguny.json"))
+    parser.add_argument("--model-name", default="gpt-4.1-nano")
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    template = CourseRanker(survey_data, args.courses_filename, model_name=args.model_name)
+    names = template.catalog.names()[:args.runs]
+    # Import swarms outside the timed loops; only the creation of its agents is measured
+    template.agent
+
+    start = time.perf_counter()
+    for name in names:
+        agent = CourseRanker(survey_data, args.courses_filename, model_name=args.model_name)
+        agent.agent
+        agent.get_course_details(name)
+    before = (time.perf_counter() - start) / len(names)
+
+    start = time.perf_counter()
+    agent = CourseRanker(survey_data, args.courses_filename, model_name=args.model_name)
+    for name in names:
+        agent.agent
+        agent.reset_history()
+        agent.get_course_details(name)
+    after = (time.perf_counter() - start) / len(names)
+
+    print(f"Courses: {len(names)}")
+    print(f"New agent per course:    {before * 1000:.2f} ms/course")
+    print(f"Reused agent with reset: {after * 1000:.2f} ms/course")
+    print(f"Speedup: {before / after:.1f}x")
+    print(f"Conversation entries after reset: {len(agent.short_memory.conversation_history)}")
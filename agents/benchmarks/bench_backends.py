@@ -0,0 +1,74 @@
+# %%
+"""
+Test obciążeniowy ścieżek agenta filtrującego na deterministycznym StubBackend (bez sieci, GPU i kluczy API):
+współbieżność run_many, cache odpowiedzi (drugi przebieg to same trafienia), strumieniowe ucinanie
+odpowiedzi i parsowanie. Opóźnienie, jego rozrzut i odsetek błędów symulują prawdziwego dostawcę.
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+AGENTS_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(AGENTS_DIR))
+sys.path.append(str(AGENTS_DIR / "filtering agents"))
+from common.backends import create_backend
+from common.response_cache import ResponseCache
+from course_ranker import CourseRanker
+
+
+def run_pass(agent, names, concurrency):
+    start = time.perf_counter()
+    outputs = agent.run_many(names, concurrency=concurrency)
+    elapsed = time.perf_counter() - start
+    errors = sum(1 for output in outputs if output["nazwa przedmiotu"] == "Błąd")
+    confidence = {}
+    for output in outputs:
+        if "pewność parsowania" in output:
+            confidence[output["pewność parsowania"]] = confidence.get(output["pewność parsowania"], 0) + 1
+    return elapsed, errors, confidence
+
+
+def report(label, names, elapsed, errors, confidence):
+    print(f"{label:<40} {len(names) / elapsed:8.1f} courses/s  errors={errors:<3} "
+          f"parsing={dict(sorted(confidence.items()))}")
+
+
+# %%
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--courses-filename", default=str(AGENTS_DIR.parent / "train_data" / "oguny.json"))
+    parser.add_argument("--courses", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    survey_data = {"Preferowana tematyka zajęć": "Historia i archeologia"}
+
+    def make_agent(**kwargs):
+        llm = create_backend("stub", seed=args.seed, latency=args.latency, jitter=args.jitter,
+                             error_rate=args.error_rate)
+        return CourseRanker(survey_data, args.courses_filename, llm=llm, **kwargs)
+
+    names = make_agent().catalog.names()[:args.courses]
+    print(f"{len(names)} courses, latency={args.latency}s ± {args.jitter}s, error rate={args.error_rate}")
+
+    for concurrency in args.concurrency:
+        report(f"concurrency={concurrency}", names, *run_pass(make_agent(), names, concurrency))
+
+    concurrency = max(args.concurrency)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = ResponseCache(str(Path(cache_dir) / "llm_cache.sqlite"))
+        agent = make_agent(cache=cache)
+        report(f"cache, cold, concurrency={concurrency}", names, *run_pass(agent, names, concurrency))
+        report(f"cache, warm, concurrency={concurrency}", names, *run_pass(agent, names, concurrency))
+        print(f"cache stats: {cache.stats()}")
+        cache.close()
+
+    for stream_scores in (False, True):
+        report(f"stream_scores={stream_scores}, concurrency={concurrency}", names,
+               *run_pass(make_agent(stream_scores=stream_scores), names, concurrency))
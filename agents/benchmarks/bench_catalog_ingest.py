@@ -0,0 +1,130 @@
+# %%
+"""
+Odświeżenie katalogu na nowy semestr (catalog_ingest.ingest) na tymczasowej kopii oguny.json z agentem
+filtrującym na StubBackend: nowe pobranie z kilkoma usuniętymi, zmienionymi i dodanymi kursami.
+Porównuje pełną przebudowę (zwięzłe rekordy, indeks wektorowy, oceny tematyczne) z aktualizacją
+przyrostową: czas, liczbę wywołań modelu i zgodność wyników.
+"""
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+AGENTS_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(AGENTS_DIR))
+sys.path.append(str(AGENTS_DIR / "filtering agents"))
+from common.backends import create_backend
+from common.catalog_ingest import ingest
+from common.course_catalog import CourseCatalog
+from common.embedding_index import EmbeddingIndex
+from common.prompt_compaction import PromptCompactor
+from common.topic_labels import TOPIC_KEY, TopicLabels, read_categories
+from course_ranker import CourseRanker
+
+
+def new_term(courses_data, removed, changed, added):
+    """A scrape of the next term: the first courses removed, the next ones with a new description, copies added."""
+    keys = list(courses_data)
+    scrape = {key: dict(courses_data[key]) for key in keys[removed:]}
+    for key in keys[removed:removed + changed]:
+        scrape[key]["Skrócony opis"] = scrape[key].get("Skrócony opis", "") + " Program zaktualizowany."
+    for i, key in enumerate(keys[-added:]):
+        course = dict(courses_data[key])
+        course["Nazwa przedmiotu"] = f"{course['Nazwa przedmiotu']} (nowa edycja {i})"
+        course["Kod przedmiotu"] = f"{course.get('Kod przedmiotu', 'NEW')}-N{i}"
+        scrape[course["Nazwa przedmiotu"]] = course
+    return scrape
+
+
+def build_all(courses_filename, labels, categories, llm, concurrency, embedder=None):
+    """Full rebuild of everything derived from the catalog; returns the index, model calls and seconds."""
+    def score_many(category, course_names, on_result):
+        agent = CourseRanker({TOPIC_KEY: category}, courses_filename, llm=llm)
+        return agent.run_many(course_names, concurrency=concurrency, on_result=on_result)
+
+    calls = llm.calls
+    start = time.perf_counter()
+    CourseCatalog.clear()
+    catalog = CourseCatalog.load(courses_filename)
+    catalog.compact_records(PromptCompactor())
+    index = EmbeddingIndex.build(courses_filename, embedder)
+    labels.update(catalog, categories, score_many, model=llm.model_id, variant=CourseRanker.label_variant())
+    return index, llm.calls - calls, time.perf_counter() - start
+
+
+# %%
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--courses-filename", default=str(AGENTS_DIR.parent / "train_data" / "oguny.json"))
+    parser.add_argument("--categories-filename",
+                        default=str(AGENTS_DIR.parent / "train_data" / "courses_with_categories.csv"))
+    parser.add_argument("--topics", type=int, default=4)
+    parser.add_argument("--removed", type=int, default=10)
+    parser.add_argument("--changed", type=int, default=15)
+    parser.add_argument("--added", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.002, help="Czas odpowiedzi stubu w sekundach")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    categories = read_categories(args.categories_filename)[:args.topics]
+    llm = create_backend("stub", latency=args.latency)
+    with open(args.courses_filename, "r", encoding="utf-8") as file:
+        scrape = new_term(json.load(file), args.removed, args.changed, args.added)
+
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        (directory / "current").mkdir()
+        (directory / "full").mkdir()
+        courses_filename = str(directory / "current" / "oguny.json")
+        shutil.copy(args.courses_filename, courses_filename)
+        scrape_filename = str(directory / "scrape.json")
+        with open(scrape_filename, "w", encoding="utf-8") as file:
+            json.dump(scrape, file, ensure_ascii=False)
+
+        # Previous term: everything built from scratch
+        labels = TopicLabels(str(directory / "current" / "topic_labels.sqlite"))
+        index, calls, elapsed = build_all(courses_filename, labels, categories, llm, args.concurrency)
+        index_path = str(directory / "current" / "course_index")
+        index.save(index_path)
+        print(f"{'previous term, full build':<30} model calls={calls:<5} {elapsed:6.2f}s")
+
+        # New term, rebuilt from scratch (with the same embedder, to compare vectors)
+        full_filename = str(directory / "full" / "oguny.json")
+        shutil.copy(scrape_filename, full_filename)
+        full_labels = TopicLabels(str(directory / "full" / "topic_labels.sqlite"))
+        full_index, calls, elapsed = build_all(full_filename, full_labels, categories, llm, args.concurrency,
+                                               embedder=index.embedder)
+        print(f"{'new term, full rebuild':<30} model calls={calls:<5} {elapsed:6.2f}s")
+
+        # New term, incremental
+        def score_many(category, course_names, on_result):
+            agent = CourseRanker({TOPIC_KEY: category}, courses_filename, llm=llm)
+            return agent.run_many(course_names, concurrency=args.concurrency, on_result=on_result)
+
+        calls = llm.calls
+        start = time.perf_counter()
+        report = ingest(scrape_filename, courses_filename, compactor=PromptCompactor(), index_path=index_path,
+                        topic_labels=labels, categories=categories, score_many=score_many, model=llm.model_id,
+                        variant=CourseRanker.label_variant())
+        elapsed = time.perf_counter() - start
+        print(f"{'new term, incremental ingest':<30} model calls={llm.calls - calls:<5} {elapsed:6.2f}s")
+        for step, counts in report.items():
+            print(f"    {step:<11} {counts}")
+
+        # The incremental result matches the full rebuild
+        catalog = CourseCatalog.load(courses_filename)
+        compactor = PromptCompactor()
+        print("same compact records:",
+              catalog.compact_records(compactor) == compactor.compact_all(catalog.records()))
+        updated_index = EmbeddingIndex.load(index_path)
+        print("same embeddings:", updated_index.courses == full_index.courses
+              and bool(np.allclose(updated_index.matrix, full_index.matrix, atol=1e-6)))
+        print("same topic labels:", all(labels.scores(category) == full_labels.scores(category)
+                                        for category in categories))
+        labels.close()
+        full_labels.close()
@@ -0,0 +1,100 @@
+# %%
+"""
+Katalog kursów w kilku procesach roboczych naraz: CourseCatalog z pliku JSON (json.load w każdym procesie)
+albo MappedCourseCatalog z pliku binarnego (common.catalog_file) współdzielonego przez mmap.
+Każdy proces wczytuje katalog i czyta wszystkie kursy jak agent filtrujący (tylko nazwa) albo rankingowy
+(zwięzłe rekordy promptu), po czym wszystkie procesy jednocześnie podają czas wczytania i przyrost pamięci
+względem stanu po importach: RSS, PSS (strony współdzielone dzielone przez liczbę procesów) i USS
+(strony prywatne) z /proc/self/smaps_rollup. Sprawdza też zgodność rekordów obu katalogów.
+"""
+import argparse
+import json
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+AGENTS_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(AGENTS_DIR))
+from common.catalog_file import MappedCourseCatalog, catalog_file_path, write_catalog_file
+from common.course_catalog import CourseCatalog
+from common.prompt_compaction import PromptCompactor
+
+WORKER = f"""
+import json, sys, time
+sys.path.append({str(AGENTS_DIR)!r})
+from common.catalog_file import MappedCourseCatalog
+from common.course_catalog import CourseCatalog
+from common.prompt_compaction import PromptCompactor
+
+def memory():
+    with open("/proc/self/smaps_rollup") as file:
+        fields = dict(line.split(":")[0:2] for line in file if line.count(":") == 1)
+    kb = lambda name: int(fields.get(name, "0 kB").split()[0])
+    return {{"rss": kb("Rss"), "pss": kb("Pss"), "uss": kb("Private_Clean") + kb("Private_Dirty")}}
+
+courses_filename, source, workload = sys.argv[1:4]
+compactor = PromptCompactor()
+before = memory()
+start = time.perf_counter()
+catalog = MappedCourseCatalog.open(courses_filename) if source == "mmap" else CourseCatalog(courses_filename)
+if workload == "ranking":
+    catalog.compact(catalog.names()[0], compactor)
+loaded = time.perf_counter() - start
+for name in catalog.names():
+    if workload == "ranking":
+        catalog.compact(name, compactor)
+    else:
+        catalog.get(name, ("Nazwa przedmiotu",))
+read = time.perf_counter() - start - loaded
+after = memory()
+print(json.dumps({{"load": loaded, "read": read, **{{key: after[key] - before[key] for key in after}}}}), flush=True)
+sys.stdin.read()  # stay alive until every worker has reported, so PSS sees the pages shared
+"""
+
+
+def run_workers(courses_filename, source, workload, workers):
+    """Start the workers together and collect their reports while all of them are alive."""
+    processes = [subprocess.Popen([sys.executable, "-c", WORKER, courses_filename, source, workload],
+                                  stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+                 for _ in range(workers)]
+    reports = [json.loads(process.stdout.readline()) for process in processes]
+    for process in processes:
+        process.communicate("")
+    return reports
+
+
+# %%
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--courses-filename", default=str(AGENTS_DIR.parent / "train_data" / "oguny.json"))
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        courses_filename = str(Path(directory) / "oguny.json")
+        shutil.copy(args.courses_filename, courses_filename)
+        compactor = PromptCompactor()
+        catalog = CourseCatalog(courses_filename)
+        catalog.compact_records(compactor)
+        path = write_catalog_file(courses_filename, compactor)
+        print(f"JSON {Path(courses_filename).stat().st_size / 1e6:.1f} MB, "
+              f"binary {path.stat().st_size / 1e6:.1f} MB ({catalog_file_path(courses_filename).name})")
+
+        mapped = MappedCourseCatalog.open(courses_filename)
+        names = catalog.names()
+        print("same records:", mapped.records() == catalog.records() and mapped.names() == names)
+        print("same hashes:", all(mapped.content_hash(name) == catalog.content_hash(name) for name in names))
+        print("same compact records:",
+              all(mapped.compact(name, compactor) == catalog.compact(name, compactor) for name in names))
+
+        for workload in ("filtering", "ranking"):
+            for source in ("json", "mmap"):
+                reports = run_workers(courses_filename, source, workload, args.workers)
+                median = {key: statistics.median(report[key] for report in reports) for key in reports[0]}
+                print(f"{workload:<10} {source:<5} workers={args.workers}  load={median['load'] * 1000:6.1f} ms  "
+                      f"read={median['read'] * 1000:6.1f} ms  per worker: RSS +{median['rss'] / 1024:5.1f} MB  "
+                      f"PSS +{median['pss'] / 1024:5.1f} MB  USS +{median['uss'] / 1024:5.1f} MB  "
+                      f"total PSS +{sum(report['pss'] for report in reports) / 1024:5.1f} MB")
@@ -0,0 +1,96 @@
+# %%
+"""
+Zimny start agenta filtrującego: czas i szczytowa pamięć (max RSS) nowego procesu od uruchomienia
+do pierwszej oceny kursu, mediana z kilku powtórzeń. Ścieżka OpenAI używa OpenAIHTTPBackend z lokalnym
+serwerem udającym API, więc nie wymaga sieci; swarms jest importowany tylko w wariancie z model_name.
+Wariant "previous driver imports" odtwarza importy driverów sprzed leniwego ładowania (torch i swarms).
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+AGENTS_DIR = Path(__file__).resolve().parent.parent
+
+ANSWER = "odpowiedź:{'nazwa przedmiotu': 'kurs', 'prawidłowość przedmiotu': 'tak', 'zgodność tematyki zajęć': 7}"
+
+SETUP = f"""
+import json, resource, sys, time
+start = time.perf_counter()
+sys.path.append({str(AGENTS_DIR / "filtering agents")!r})
+"""
+
+REPORT = """
+print(json.dumps({"ready": time.perf_counter() - start,
+                  "rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                  "swarms": "swarms" in sys.modules, "torch": "torch" in sys.modules}))
+"""
+
+SCENARIOS = {
+    "openai backend, first course": """
+from course_ranker import CourseRanker
+from common.backends import create_backend
+llm = create_backend("openai", "gpt-4o-mini", base_url={base_url!r}, api_key="test")
+agent = CourseRanker({{"Preferowana tematyka zajęć": "Historia i archeologia"}}, {courses_filename!r}, llm=llm)
+agent.run(agent.catalog.names()[1])
+""",
+    "swarms agent (model_name)": """
+from course_ranker import CourseRanker
+agent = CourseRanker({{"Preferowana tematyka zajęć": "Historia i archeologia"}}, {courses_filename!r},
+                     model_name="gpt-4o-mini")
+agent.agent
+""",
+    "previous driver imports": """
+import torch
+import swarms
+from course_ranker import CourseRanker
+""",
+}
+
+
+class FakeOpenAI(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps({"choices": [{"message": {"content": ANSWER}}]}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+# %%
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--courses-filename", default=str(AGENTS_DIR.parent / "train_data" / "oguny.json"))
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOpenAI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}/v1"
+
+    with tempfile.TemporaryDirectory() as directory:
+        for label, code in SCENARIOS.items():
+            script = SETUP + code.format(base_url=base_url, courses_filename=args.courses_filename) + REPORT
+            runs = []
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                # swarms writes an agent_workspace directory into the working directory
+                output = subprocess.run([sys.executable, "-c", script], cwd=directory, capture_output=True,
+                                        text=True, check=True).stdout
+                runs.append({**json.loads(output.strip().splitlines()[-1]), "wall": time.perf_counter() - start})
+            print(f"{label:<30} process={statistics.median(run['wall'] for run in runs):5.2f}s  "
+                  f"ready={statistics.median(run['ready'] for run in runs):5.2f}s  "
+                  f"max RSS={statistics.median(run['rss'] for run in runs):4.0f} MB  "
+                  f"swarms={runs[0]['swarms']} torch={runs[0]['torch']}")
+    server.shutdown()
@@ -0,0 +1,77 @@
+# %%
+"""
+Trafność wstępnego filtrowania indeksem wektorowym (EmbeddingIndex.candidates): recall@K kursów
+oznaczonych daną kategorią w courses_with_categories.csv wśród K kursów najbliższych nazwie kategorii,
+dla każdej kategorii i łącznie (ważony liczbą kursów). Podaje najmniejsze K z łącznym recall co najmniej
+--target, czyli wartość DEFAULT_TOP_K dla danego embeddera, i udział katalogu, który wtedy ocenia filtr,
+w porównaniu z --max-share (domyślnie 10%, czyli dziesięciokrotnie mniej wywołań filtra).
+"""
+import argparse
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+AGENTS_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(AGENTS_DIR))
+from common.embedding_index import EmbeddingIndex, SentenceTransformerEmbedder
+from common.topic_labels import OTHER_CATEGORY, TOPIC_KEY, read_categories
+
+
+def labelled_courses(path, categories):
+    """Course names of every category, splitting multi-category values as read_categories does."""
+    known = set(categories) | {OTHER_CATEGORY}
+    courses = {category: set() for category in categories}
+    for name, value in pd.read_csv(path).dropna().itertuples(index=False):
+        parts = [part.strip() for part in value.split(", ")]
+        if not all(part in known for part in parts):
+            parts = [value]
+        for part in parts:
+            if part in courses:
+                courses[part].add(name)
+    return courses
+
+
+# %%
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--courses-filename", default=str(AGENTS_DIR.parent / "train_data" / "oguny.json"))
+    parser.add_argument("--categories-filename",
+                        default=str(AGENTS_DIR.parent / "train_data" / "courses_with_categories.csv"))
+    parser.add_argument("--sentence-transformer", default=None,
+                        help="Nazwa modelu sentence-transformers; domyślnie offline HashingEmbedder")
+    parser.add_argument("--ks", type=int, nargs="+", default=[50, 100, 150, 200, 250, 300, 400])
+    parser.add_argument("--target", type=float, default=0.9, help="Wymagany łączny recall")
+    parser.add_argument("--max-share", type=float, default=0.1,
+                        help="Docelowy najwyższy udział katalogu oceniany przez filtr")
+    args = parser.parse_args()
+
+    embedder = SentenceTransformerEmbedder(args.sentence_transformer) if args.sentence_transformer else None
+    index = EmbeddingIndex.build(args.courses_filename, embedder)
+    categories = read_categories(args.categories_filename)
+    relevant = labelled_courses(args.categories_filename, categories)
+    catalog_size = len(index.courses)
+
+    found = {k: 0 for k in args.ks}
+    print(f"{'category':<42} {'courses':>7} " + " ".join(f"{f'@{k}':>6}" for k in args.ks))
+    for category in categories:
+        if not relevant[category]:
+            continue
+        candidates = index.candidates({TOPIC_KEY: category}, max(args.ks))
+        hits = [len(relevant[category] & set(candidates[:k])) for k in args.ks]
+        for k, hit in zip(args.ks, hits):
+            found[k] += hit
+        print(f"{category[:42]:<42} {len(relevant[category]):>7} "
+              + " ".join(f"{hit / len(relevant[category]):>6.2f}" for hit in hits))
+
+    total = sum(len(courses) for courses in relevant.values())
+    recall = {k: found[k] / total for k in args.ks}
+    print(f"{'all categories':<42} {total:>7} " + " ".join(f"{recall[k]:>6.2f}" for k in args.ks))
+    chosen = next((k for k in args.ks if recall[k] >= args.target), None)
+    if chosen is None:
+        print(f"no K of {args.ks} reaches recall {args.target}")
+    else:
+        print(f"K={chosen}: recall {recall[chosen]:.2f}, the filter scores {chosen}/{catalog_size} "
+              f"({chosen / catalog_size:.0%}) of the catalog")
+        if chosen > args.max_share * catalog_size:
+            print(f"target cut not met: {args.max_share:.0%} of the catalog is K={int(args.max_share * catalog_size)}")
@@ -0,0 +1,80 @@
+# %%
+"""
+Porównanie oceniania nazw kursów pojedynczo (run_many) i partiami (run_batch) w agencie filtrującym.
+Raportuje liczbę zapytań, tokeny i czas na kurs. Wymaga klucza API dla wybranego modelu, chyba że
+podano --fake-llm (StubBackend, który odpowiada na partie rekordami z 'nr', więc sprawdza parsowanie partii).
+"""
+import argparse
+import sys
+import threading
+import time
+from pathlib import Path
+
+AGENTS_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(AGENTS_DIR / "filtering agents"))
+sys.path.append(str(AGENTS_DIR))
+from common.backends import create_backend
+from course_ranker import CourseRanker
+
+try:
+    import tiktoken
+    encoding = tiktoken.get_encoding("cl100k_base")
+
+    def count_tokens(text):
+        return len(encoding.encode(text))
+except Exception:  # tiktoken missing, or its encoding cannot be downloaded offline
+    def count_tokens(text):
+        # Rough estimate for Polish text when tiktoken is not available
+        return len(text) // 4
+
+
+class CountingRanker(CourseRanker):
+    """CourseRanker that records prompt and completion tokens of every model call."""
+
+    usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+    lock = threading.Lock()
+
+    def _call_llm(self, prompt, **kwargs):
+        output = super()._call_llm(prompt, **kwargs)
+        with self.lock:
+            self.usage["calls"] += 1
+            self.usage["prompt_tokens"] += count_tokens(self.system_prompt + prompt)
+            self.usage["completion_tokens"] += count_tokens(output)
+        return output
+
+
+def report(label, names, outputs, elapsed):
+    usage = CountingRanker.usage
+    errors = sum(1 for o in outputs if o['nazwa przedmiotu'] == 'Błąd')
+    print(f"{label}: calls={usage['calls']}, errors={errors}, "
+          f"prompt tokens/course={usage['prompt_tokens'] / len(names):.0f}, "
+          f"completion tokens/course={usage['completion_tokens'] / len(names):.0f}, "
+          f"time/course={elapsed / len(names):.3f}s")
+    for key in usage:
+        usage[key] = 0
+
+
+# %%
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--courses-filename", default=str(AGENTS_DIR.parent / "train_data" / "oguny.json"))
+    parser.add_argument("--model-name", default="gpt-4.1-nano")
+    parser.add_argument("--courses", type=int, default=40)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[5, 10, 20])
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--fake-llm", action="store_true", help="Deterministyczny StubBackend zamiast modelu")
+    args = parser.parse_args()
+
+    survey_data = {"Preferowana tematyka zajęć": "Historia i archeologia"}
+    agent_kwargs = {"llm": create_backend("stub")} if args.fake_llm else {}
+    agent = CountingRanker(survey_data, args.courses_filename, model_name=args.model_name, **agent_kwargs)
+    names = agent.catalog.names()[:args.courses]
+
+    start = time.perf_counter()
+    outputs = agent.run_many(names, concurrency=args.concurrency)
+    report("one course per prompt", names, outputs, time.perf_counter() - start)
+
+    for batch_size in args.batch_sizes:
+        start = time.perf_counter()
+        outputs = agent.run_batch(names, batch_size=batch_size, concurrency=args.concurrency)
+        report(f"batch_size={batch_size}", names, outputs, time.perf_counter() - start)
@@ -0,0 +1,44 @@
+# %%
+"""
+Porównanie generowania lokalnym modelem prompt po promptcie i partiami (TransformersBackend.generate_batch).
+Domyślnie używa małego modelu testowego na CPU, więc działa bez GPU.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+AGENTS_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(AGENTS_DIR / "filtering agents"))
+from course_ranker_local import CourseRanker
+from common.backends.transformers_local import TransformersBackend
+
+survey_data = {"Preferowana tematyka zajęć": "Historia i archeologia"}
+
+# %%
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--courses-filename", default=str(AGENTS_DIR.parent / "train_data" / "oguny.json"))
+    parser.add_argument("--model-id", default="sshleifer/tiny-gpt2")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--courses", type=int, default=32)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--max-new-tokens", type=int, default=96)
+    args = parser.parse_args()
+
+    backend = TransformersBackend.load(args.model_id, device=args.device, max_new_tokens=args.max_new_tokens)
+    agent = CourseRanker(survey_data, args.courses_filename, llm=backend)
+    names = agent.catalog.names()[:args.courses]
+    prompts = [agent.build_prompt(name, agent.get_course_details(name)) for name in names]
+
+    # Warm-up so that lazy initialisation is not counted in the first measurement
+    backend.generate(prompts[0], system_prompt=agent.system_prompt)
+
+    baseline = None
+    for batch_size in args.batch_sizes:
+        backend.batch_size = batch_size
+        start = time.perf_counter()
+        backend.generate_batch(prompts, system_prompt=agent.system_prompt)
+        per_course = (time.perf_counter() - start) / len(prompts)
+        baseline = baseline or per_course
+        print(f"batch_size={batch_size:>3}: {per_course * 1000:.1f} ms/course, speedup {baseline / per_course:.1f}x")
@@ -0,0 +1,65 @@
+# %%
+"""
+Oceny agenta filtrującego z lokalnego modelu: generowanie odpowiedzi i jej parsowanie (run_local_batch)
+wobec odczytu ocen z prawdopodobieństw następnego tokenu w jednym przebiegu na wymiar (run_logit_batch).
+Podaje czas na kurs, udział odpowiedzi, których nie udało się sparsować, zgodność ocen obu trybów
+oraz średnie prawdopodobieństwo wybranej oceny. Bez --model-id używa małego losowego modelu Llama
+(jak bench_prefix_cache.py), więc mierzy tylko koszt - trafność ocen wymaga prawdziwego modelu.
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+AGENTS_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(AGENTS_DIR))
+sys.path.append(str(AGENTS_DIR / "filtering agents"))
+from bench_prefix_cache import random_model, survey_data
+from common.backends.transformers_local import TransformersBackend
+from common.output_parser import FAILED
+from course_ranker_local import CourseRanker
+
+SCORE_KEY = 'zgodność tematyki zajęć'
+
+
+# %%
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--courses-filename", default=str(AGENTS_DIR.parent / "train_data" / "oguny.json"))
+    parser.add_argument("--model-id", default=None, help="Model HuggingFace; domyślnie mały losowy model Llama")
+    parser.add_argument("--layers", type=int, default=8)
+    parser.add_argument("--hidden-size", type=int, default=512)
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--courses", type=int, default=64)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--max-new-tokens", type=int, default=96)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        model_id = args.model_id or random_model(directory, args.courses_filename, args.layers, args.hidden_size)
+        backend = TransformersBackend(model_id, device=args.device, batch_size=args.batch_size,
+                                      max_new_tokens=args.max_new_tokens, prefix_cache=True)
+
+        results = {}
+        for label, logit_scores in (("generate", False), ("logits", True)):
+            agent = CourseRanker(survey_data, args.courses_filename, llm=backend, scores_only=True,
+                                 logit_scores=logit_scores)
+            names = agent.catalog.names()[:args.courses]
+            # Warm-up so that lazy initialisation is not counted in the measurement
+            agent.run_many(names[:1])
+            start = time.perf_counter()
+            results[label] = agent.run_many(names)
+            per_course = (time.perf_counter() - start) / len(names)
+            failed = sum(result['pewność parsowania'] == FAILED for result in results[label])
+            print(f"{label:<9}: {per_course * 1000:7.1f} ms/course  unparsed {failed}/{len(names)}")
+
+    logits = results["logits"]
+    agreed = [generated.get(SCORE_KEY) == scored[SCORE_KEY]
+              for generated, scored in zip(results["generate"], logits)]
+    print(f"same topic score as generated: {sum(agreed)}/{len(agreed)}")
+    print(f"mean probability of the chosen topic score: "
+          f"{sum(result['prawdopodobieństwo oceny'] for result in logits) / len(logits):.2f}, "
+          f"of the chosen label: {sum(result['prawdopodobieństwo prawidłowości'] for result in logits) / len(logits):.2f}")
+    print(f"topic score argmax vs expected, mean |difference|: "
+          f"{sum(abs(r[SCORE_KEY] - r['oczekiwana zgodność tematyki zajęć']) for r in logits) / len(logits):.2f}")
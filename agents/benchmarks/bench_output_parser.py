@@ -0,0 +1,169 @@
+# %%
+"""
+Mikrobenchmark i test odporności parsera odpowiedzi (common.output_parser) względem poprzedniego
+find_key_positions/extract_values_between_keys. Korpus jest budowany z prawdziwych wyników
+w Evaluation/*/output-*/scores_*.json i zaburzany w sposób, który nie zmienia oczekiwanych wartości.
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+AGENTS_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(AGENTS_DIR))
+from common.output_parser import OutputParser
+
+EVALUATION_DIR = AGENTS_DIR.parent / "Evaluation"
+
+TOPIC = 'zgodność tematyki zajęć'
+MODE = 'zgodność trybu prowadzenia zajęć'
+ASSESSMENT = 'zgodność rodzaju zaliczenia'
+VALIDITY = 'prawidłowość przedmiotu'
+
+FEATURE_KEYS = {"Tryb": MODE, "Kryteria": ASSESSMENT, "Tematyka": TOPIC}
+LABEL_KEYS = {"tryb": MODE, "kryterium": ASSESSMENT, "tematyka": TOPIC}
+
+TEMPLATE = """odpowiedź:{
+    'nazwa przedmiotu': {nazwa przedmiotu},
+    'zgodność tematyki zajęć':{liczba 0-10 odzwierciedlająca dopasowanie Opisu kursu do Preferencje studenta}
+}
+"""
+JUSTIFICATION = "\nUzasadnienie: kurs porusza część zagadnień bliskich zainteresowaniom studenta, ale nie wszystkie."
+
+
+def find_key_positions(text, keys):
+    """Previous implementation, kept here as the baseline."""
+    positions = []
+    for key in keys:
+        for match in re.finditer(re.escape(key), text):
+            positions.append((match.start(), key))
+    return sorted(positions, key=lambda x: x[0])
+
+
+def extract_values_between_keys(text, keys, defaults):
+    """Previous implementation, kept here as the baseline."""
+    positions = find_key_positions(text, keys)
+    results = dict(defaults)
+    for i, (start_idx, key) in enumerate(positions):
+        key_end = start_idx + len(key)
+        end_idx = positions[i + 1][0] if i + 1 < len(positions) else len(text)
+        snippet = text[key_end:end_idx]
+        if "liczba" in snippet:
+            continue
+        if key == VALIDITY:
+            results[key] = snippet
+        else:
+            match = re.search(r'\d{1,3}', snippet)
+            if match and key != '}' and int(match.group()) > results[key]:
+                results[key] = int(match.group())
+    return results
+
+
+def notebook_label(snippet):
+    """The tak/nie/err mapping used in Evaluation/eval_filter.ipynb."""
+    if 'tak' in snippet and 'nie' in snippet:
+        return 'err'
+    if 'tak' in snippet:
+        return 'tak'
+    if 'nie' in snippet:
+        return 'nie'
+    return 'err'
+
+
+def render(name, values, rng):
+    """Render a model-like answer with random formatting that keeps the values readable."""
+    quote = rng.choice(["'", '"'])
+    items = [f"{quote}nazwa przedmiotu{quote}: {quote}{name}{quote}"]
+    for key, value in values.items():
+        if isinstance(value, int) and rng.random() < 0.2:
+            value = f"{value}/10"
+        elif isinstance(value, str):
+            value = f"{quote}{value}{quote}"
+        items.append(f"{quote}{key}{quote}: {value}")
+    separator = rng.choice([", ", ",\n    ", "\n    "])
+    text = "odpowiedź:{" + separator.join(items) + "}"
+    if rng.random() < 0.3:
+        text = TEMPLATE + text
+    if rng.random() < 0.3:
+        text = "```\n" + text + "\n```"
+    if rng.random() < 0.5:
+        text += JUSTIFICATION
+    return text
+
+
+def build_corpus(seed=0):
+    rng = random.Random(seed)
+    corpus = []
+
+    for path in sorted(EVALUATION_DIR.glob("filterting/output-*/scores_*.json")):
+        for name, (score, snippet, _) in json.load(open(path, encoding="utf-8")).items():
+            # Real answer fragment between the validity key and the next key
+            text = f"odpowiedź:{{'nazwa przedmiotu': '{name}', '{VALIDITY}{snippet}{TOPIC}': {score}}}"
+            if rng.random() < 0.5:
+                text += JUSTIFICATION
+            # Only an unambiguous whole-word answer counts as the expected label
+            words = {word.lower() for word in re.findall(r"\b(tak|nie)\b", snippet, re.IGNORECASE)}
+            label = words.pop() if len(words) == 1 else None
+            corpus.append({"kind": "filter", "text": text, "expected": {TOPIC: score, VALIDITY: label}})
+
+    for path in sorted(EVALUATION_DIR.glob("recomendations/output-*/scores_*_*.json")):
+        feature = path.stem.split("_")[1]
+        for pair, scores in json.load(open(path, encoding="utf-8")).items():
+            if not isinstance(scores, list):
+                continue
+            key = FEATURE_KEYS.get(feature) or LABEL_KEYS[pair.rsplit("_", 1)[-1]]
+            for score in scores:
+                if score == -1:
+                    continue
+                values = {TOPIC: rng.randint(0, 10), MODE: rng.randint(0, 10), ASSESSMENT: rng.randint(0, 10)}
+                values[key] = score
+                corpus.append({"kind": "rank", "text": render(pair.split("_")[0], values, rng), "expected": values})
+
+    return corpus
+
+
+# %%
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--write-corpus", default=None, help="Zapisz korpus do pliku JSONL")
+    args = parser.parse_args()
+
+    corpus = build_corpus()
+    if args.write_corpus:
+        with open(args.write_corpus, "w", encoding="utf-8") as file:
+            for item in corpus:
+                file.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+    parsers = {
+        "filter": OutputParser([TOPIC], [VALIDITY]),
+        "rank": OutputParser([TOPIC, MODE, ASSESSMENT]),
+    }
+    old_keys = {"filter": [VALIDITY, TOPIC, '}'], "rank": [TOPIC, MODE, ASSESSMENT, '}']}
+    old_defaults = {"filter": {VALIDITY: 'ok', TOPIC: -1}, "rank": {TOPIC: -1, MODE: -1, ASSESSMENT: -1}}
+
+    timings = {}
+    for label, parse in [
+        ("old", lambda item: extract_values_between_keys(item["text"], old_keys[item["kind"]], old_defaults[item["kind"]])),
+        ("new", lambda item: parsers[item["kind"]].parse(item["text"]).values),
+    ]:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            outputs = [parse(item) for item in corpus]
+        timings[label] = (time.perf_counter() - start) / (args.repeat * len(corpus))
+
+        correct = 0
+        for item, output in zip(corpus, outputs):
+            expected = {key: value for key, value in item["expected"].items() if value is not None}
+            values = {key: notebook_label(value) if key == VALIDITY else value for key, value in output.items()}
+            correct += all(values.get(key) == value for key, value in expected.items())
+        print(f"{label}: {timings[label] * 1e6:.1f} us/answer, all expected values recovered in "
+              f"{correct}/{len(corpus)} answers")
+
+    confidence = Counter(parsers[item["kind"]].parse(item["text"]).confidence for item in corpus)
+    print(f"Corpus: {len(corpus)} answers, new parser confidence: {dict(confidence)}")
+    print(f"Speedup: {timings['old'] / timings['new']:.2f}x")
@@ -0,0 +1,101 @@
+# %%
+"""
+Opóźnienie rekomendacji od ankiety do listy top-N (RecommendationPipeline) z agentami na StubBackend:
+czas do pierwszej rekomendacji i do wyniku końcowego (p50/p95 po ankietach), liczba wywołań modelu
+w obu etapach oraz przekroczone limity czasu. Wariant z indeksem wektorowym (EmbeddingIndex) filtruje tylko
+kandydatów z indeksu, a wariant z tabelą TopicLabels pokazuje filtr bez wywołań modelu.
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+AGENTS_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(AGENTS_DIR))
+from common.backends import create_backend
+from common.course_catalog import CourseCatalog
+from common.embedding_index import EmbeddingIndex
+from common.pipeline import RecommendationPipeline, load_course_ranker
+from common.topic_labels import TOPIC_KEY, TopicLabels, read_categories
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run(label, pipeline, surveys, filter_llm, rank_llm):
+    first, final, timed_out = [], [], 0
+    calls = filter_llm.calls, rank_llm.calls
+    for survey in surveys:
+        first_top = None
+        for update in pipeline.stream(survey):
+            if update.top and first_top is None:
+                first_top = update.elapsed
+        first.append(first_top if first_top is not None else update.elapsed)
+        final.append(update.elapsed)
+        timed_out += bool(update.timed_out)
+    print(f"{label:<28} first result p50={statistics.median(first):5.2f}s p95={percentile(first, 0.95):5.2f}s  "
+          f"final p50={statistics.median(final):5.2f}s p95={percentile(final, 0.95):5.2f}s  "
+          f"filter calls/survey={(filter_llm.calls - calls[0]) / len(surveys):6.1f}  "
+          f"rank calls/survey={(rank_llm.calls - calls[1]) / len(surveys):5.1f}  timed out={timed_out}/{len(surveys)}")
+
+
+# %%
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--courses-filename", default=str(AGENTS_DIR.parent / "train_data" / "oguny.json"))
+    parser.add_argument("--categories-filename",
+                        default=str(AGENTS_DIR.parent / "train_data" / "courses_with_categories.csv"))
+    parser.add_argument("--surveys", type=int, default=6, help="Liczba ankiet (kolejne kategorie tematyczne)")
+    parser.add_argument("--filter-latency", type=float, default=0.05, help="Czas odpowiedzi modelu filtrującego")
+    parser.add_argument("--rank-latency", type=float, default=0.5, help="Czas odpowiedzi modelu rankingowego")
+    parser.add_argument("--jitter", type=float, default=0.5, help="Rozrzut czasu odpowiedzi jako ułamek średniej")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--max-candidates", type=int, default=40)
+    parser.add_argument("--rank-timeout", type=float, default=60.0)
+    parser.add_argument("--latency-budget", type=float, default=75.0)
+    args = parser.parse_args()
+
+    FilterRanker = load_course_ranker("filtering agents")
+    RankRanker = load_course_ranker("ranking agents")
+    topics = read_categories(args.categories_filename)[:args.surveys]
+    surveys = [{"Preferowna tematyka zajęć": topic,
+                "Preferowany tryb prowadzenia zajęć": "zdalnie",
+                "Preferowany rodzaj zaliczenia": "projekt"} for topic in topics]
+
+    filter_llm = create_backend("stub", latency=args.filter_latency, jitter=args.jitter * args.filter_latency)
+    rank_llm = create_backend("stub", latency=args.rank_latency, jitter=args.jitter * args.rank_latency, seed=1)
+    settings = dict(top_n=args.top_n, max_candidates=args.max_candidates, rank_timeout=args.rank_timeout,
+                    latency_budget=args.latency_budget, concurrency=args.concurrency)
+
+    with tempfile.TemporaryDirectory() as directory:
+        topic_labels = TopicLabels(str(Path(directory) / "topic_labels.sqlite"))
+        embedding_index = EmbeddingIndex.build(args.courses_filename)
+        variants = (("filter by model calls", None, None),
+                    ("filter embedding candidates", None, embedding_index),
+                    ("filter from labels table", topic_labels, None))
+        for label, labels, index in variants:
+            if labels is not None:
+                # Offline labeling of the benchmark topics, as label_course_topics.py does
+                def score_many(category, course_names, on_result):
+                    agent = FilterRanker({TOPIC_KEY: category}, args.courses_filename, llm=filter_llm)
+                    return agent.run_many(course_names, concurrency=args.concurrency, on_result=on_result)
+
+                start = time.perf_counter()
+                labels.update(CourseCatalog.load(args.courses_filename), topics, score_many,
+                              model=filter_llm.model_id, variant=FilterRanker.label_variant())
+                print(f"offline labeling of {len(topics)} topics: {time.perf_counter() - start:.1f}s")
+
+            pipeline = RecommendationPipeline(
+                lambda survey: FilterRanker(survey, args.courses_filename, llm=filter_llm, topic_labels=labels),
+                lambda survey: RankRanker(survey, args.courses_filename, llm=rank_llm),
+                args.courses_filename,
+                embedding_index=index,
+                **settings,
+            )
+            run(label, pipeline, surveys, filter_llm, rank_llm)
+        topic_labels.close()
@@ -0,0 +1,91 @@
+# %%
+"""
+Wspólny prefiks promptów w lokalnym modelu (TransformersBackend z prefix_cache): prompty agenta filtrującego
+dla jednej ankiety generowane partiami i po jednym (jak agent rankingowy), z cache prefiksu i bez.
+Podaje czas na kurs, liczbę tokenów promptów przepuszczonych przez model i zgodność odpowiedzi.
+Bez --model-id tworzy mały losowy model Llama z tokenizerem uczonym na katalogu, więc działa bez sieci i GPU.
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+AGENTS_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(AGENTS_DIR))
+sys.path.append(str(AGENTS_DIR / "filtering agents"))
+from common.backends.transformers_local import TransformersBackend
+from course_ranker_local import CourseRanker
+
+survey_data = {"Preferowana tematyka zajęć": "Historia i archeologia"}
+
+
+def random_model(directory, courses_filename, layers, hidden_size):
+    """A randomly initialised Llama with a byte-level BPE tokenizer trained on the catalog texts."""
+    import torch
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+    from transformers import LlamaConfig, LlamaForCausalLM, PreTrainedTokenizerFast
+
+    with open(courses_filename, "r", encoding="utf-8") as file:
+        texts = [" ".join(map(str, course.values())) for course in json.load(file).values()]
+    tokenizer = Tokenizer(models.BPE())
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    tokenizer.train_from_iterator(texts, trainers.BpeTrainer(
+        vocab_size=8000, special_tokens=["<eos>"], initial_alphabet=pre_tokenizers.ByteLevel.alphabet()))
+    tokenizer = PreTrainedTokenizerFast(tokenizer_object=tokenizer, eos_token="<eos>", pad_token="<eos>")
+    tokenizer.save_pretrained(directory)
+
+    torch.manual_seed(0)
+    config = LlamaConfig(vocab_size=len(tokenizer), hidden_size=hidden_size, intermediate_size=hidden_size * 8 // 3,
+                         num_hidden_layers=layers, num_attention_heads=hidden_size // 64,
+                         num_key_value_heads=hidden_size // 64, max_position_embeddings=4096,
+                         bos_token_id=0, eos_token_id=0, pad_token_id=0)
+    LlamaForCausalLM(config).save_pretrained(directory)
+    return directory
+
+
+# %%
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--courses-filename", default=str(AGENTS_DIR.parent / "train_data" / "oguny.json"))
+    parser.add_argument("--model-id", default=None, help="Model HuggingFace; domyślnie mały losowy model Llama")
+    parser.add_argument("--layers", type=int, default=8)
+    parser.add_argument("--hidden-size", type=int, default=512)
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--courses", type=int, default=64)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--max-new-tokens", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        model_id = args.model_id or random_model(directory, args.courses_filename, args.layers, args.hidden_size)
+        backends = {prefix_cache: TransformersBackend(model_id, device=args.device, max_new_tokens=args.max_new_tokens,
+                                                      prefix_cache=prefix_cache)
+                    for prefix_cache in (False, True)}
+
+        agent = CourseRanker(survey_data, args.courses_filename, llm=backends[False])
+        names = agent.catalog.names()[:args.courses]
+        prompts = [agent.build_prompt(name, agent.get_course_details(name)) for name in names]
+        for backend in backends.values():
+            # Warm-up so that lazy initialisation is not counted in the first measurement
+            backend.generate(prompts[0], system_prompt=agent.system_prompt)
+
+        for batch_size in args.batch_sizes:
+            outputs = {}
+            for prefix_cache, backend in backends.items():
+                backend.batch_size = batch_size
+                backend.prompt_tokens = backend.encoded_tokens = 0
+                start = time.perf_counter()
+                if batch_size == 1:
+                    # One generate call per course, as the ranking agent calls the model
+                    outputs[prefix_cache] = [backend.generate(prompt, agent.system_prompt) for prompt in prompts]
+                else:
+                    outputs[prefix_cache] = backend.generate_batch(prompts, agent.system_prompt)
+                per_course = (time.perf_counter() - start) / len(prompts)
+                print(f"batch_size={batch_size:>3} prefix_cache={str(prefix_cache):<5}: "
+                      f"{per_course * 1000:6.1f} ms/course  prompt tokens encoded "
+                      f"{backend.encoded_tokens}/{backend.prompt_tokens} "
+                      f"({backend.encoded_tokens / backend.prompt_tokens:.0%})")
+            print(f"batch_size={batch_size:>3} same outputs: {outputs[False] == outputs[True]}")
@@ -0,0 +1,89 @@
+# %%
+"""
+Liczba tokenów promptu agenta rankingowego z pełnymi polami katalogu i ze zwięzłym opisem kursu
+(PromptCompactor), dla wszystkich kursów katalogu, oraz czas przygotowania zwięzłego katalogu:
+obliczenie, odczyt z pliku obok katalogu i z pamięci. Nie wysyła zapytań do modelu (StubBackend).
+"""
+import argparse
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+AGENTS_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(AGENTS_DIR))
+sys.path.append(str(AGENTS_DIR / "ranking agents"))
+from common.backends import create_backend
+from common.course_catalog import CourseCatalog
+from common.prompt_compaction import PromptCompactor
+from course_ranker import CourseRanker
+
+try:
+    import tiktoken
+    encoding = tiktoken.get_encoding("cl100k_base")
+
+    def count_tokens(text):
+        return len(encoding.encode(text))
+except ImportError:
+    def count_tokens(text):
+        # Rough estimate for Polish text when tiktoken is not available
+        return len(text) // 4
+
+survey_data = {
+    "Preferowana tematyka zajęć": "Historia i archeologia",
+    "Preferowany tryb prowadzenia zajęć": "zdalnie",
+    "Preferowany rodzaj zaliczenia": "Test/egzamin",
+}
+
+
+class PromptRecorder(CourseRanker):
+    """CourseRanker that keeps the token count of every prompt it sends."""
+
+    def _call_llm(self, prompt, **kwargs):
+        self.prompt_tokens.append(count_tokens(self.system_prompt + prompt))
+        return super()._call_llm(prompt, **kwargs)
+
+
+def report(label, tokens):
+    tokens = sorted(tokens)
+    print(f"{label:<10} prompt tokens: mean={statistics.mean(tokens):7.0f}  p50={tokens[len(tokens) // 2]:6d}  "
+          f"p95={tokens[int(len(tokens) * 0.95)]:6d}  max={tokens[-1]:6d}  total={sum(tokens)}")
+
+
+# %%
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--courses-filename", default=str(AGENTS_DIR.parent / "train_data" / "oguny.json"))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # A copy, so that the compact cache file is not written next to the original catalog
+        courses_filename = str(Path(tmp_dir) / Path(args.courses_filename).name)
+        shutil.copy(args.courses_filename, courses_filename)
+        compactor = PromptCompactor()
+
+        start = time.perf_counter()
+        CourseCatalog.load(courses_filename).compact_records(compactor)
+        computed = time.perf_counter() - start
+        CourseCatalog.clear()
+        start = time.perf_counter()
+        CourseCatalog.load(courses_filename).compact_records(compactor)
+        from_file = time.perf_counter() - start
+        start = time.perf_counter()
+        CourseCatalog.load(courses_filename).compact_records(compactor)
+        from_memory = time.perf_counter() - start
+        print(f"compact catalog: computed {computed * 1000:.1f} ms, from {Path(courses_filename).stem}.compact.json "
+              f"{from_file * 1000:.1f} ms (with catalog load), from memory {from_memory * 1000:.3f} ms")
+
+        totals = {}
+        for label, agent_compactor in (("raw", None), ("compact", compactor)):
+            agent = PromptRecorder(survey_data, courses_filename, llm=create_backend("stub"),
+                                   compactor=agent_compactor)
+            agent.prompt_tokens = []
+            for name in agent.catalog.names():
+                agent.score_course(name)
+            report(label, agent.prompt_tokens)
+            totals[label] = sum(agent.prompt_tokens)
+        print(f"prompt tokens saved: {100 * (1 - totals['compact'] / totals['raw']):.1f}%")
@@ -0,0 +1,52 @@
+# %%
+"""
+Zachowanie RateLimiter wobec dostawcy z limitem równoległych zapytań, symulowanego przez StubBackend
+(nadmiarowe wywołania dostają 429): agent filtrujący z run_many bez harmonogramu i z nim, oraz z limitem RPM.
+Raportuje przepustowość, wyniki 'Błąd', ponowienia, liczbę 429, czas oczekiwania i ustaloną równoległość.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+AGENTS_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(AGENTS_DIR))
+sys.path.append(str(AGENTS_DIR / "filtering agents"))
+from common.backends import create_backend
+from common.rate_limit import RateLimiter
+from course_ranker import CourseRanker
+
+
+# %%
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--courses-filename", default=str(AGENTS_DIR.parent / "train_data" / "oguny.json"))
+    parser.add_argument("--courses", type=int, default=120)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--provider-limit", type=int, default=4, help="Równoległe zapytania przyjmowane przez stub")
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--rpm", type=float, default=1200)
+    args = parser.parse_args()
+
+    survey_data = {"Preferowana tematyka zajęć": "Historia i archeologia"}
+    limiters = {
+        "no limiter": None,
+        "adaptive concurrency": RateLimiter(max_concurrency=args.concurrency, base_delay=0.05, max_delay=2.0, seed=0),
+        f"adaptive + rpm={args.rpm:g}": RateLimiter(rpm=args.rpm, max_concurrency=args.concurrency,
+                                                      base_delay=0.05, max_delay=2.0, seed=0),
+    }
+
+    for label, limiter in limiters.items():
+        llm = create_backend("stub", latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                             max_in_flight=args.provider_limit)
+        agent = CourseRanker(survey_data, args.courses_filename, llm=llm, rate_limiter=limiter)
+        names = agent.catalog.names()[:args.courses]
+
+        start = time.perf_counter()
+        outputs = agent.run_many(names, concurrency=args.concurrency)
+        elapsed = time.perf_counter() - start
+        errors = sum(1 for output in outputs if output["nazwa przedmiotu"] == "Błąd")
+        print(f"{label:<24} {len(names) / elapsed:7.1f} courses/s  errors={errors:<3} provider calls={llm.calls:<4} "
+              f"limiter={limiter.stats() if limiter else '-'}")
@@ -0,0 +1,88 @@
+# %%
+"""
+Trafienia w cache odpowiedzi (ResponseCache) agenta rankingowego na StubBackend dla wielu studentów
+z losowymi ankietami: kilka tematyk, trybów i rodzajów zaliczenia, a brak preferencji zapisany
+na różne sposoby (jak w driverach i w app/survey.py). Porównuje prompt z całą ankietą z oceną
+każdego wymiaru osobno (per_dimension), także z trybem i zaliczeniem z reguł (StructuredScorer).
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+AGENTS_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(AGENTS_DIR))
+sys.path.append(str(AGENTS_DIR / "ranking agents"))
+from common.backends import create_backend
+from common.course_catalog import CourseCatalog
+from common.response_cache import ResponseCache
+from common.structured_scorer import StructuredScorer
+from common.survey import canonical_survey
+from common.topic_labels import read_categories
+from course_ranker import CourseRanker
+
+NO_PREFERENCE_ANSWERS = ["nie mam preferencji", "BRAK PREFERENCJI", "Brak preferencji ", " nie mam  preferencji"]
+MODES = ["zdalnie", "w sali", "mieszany: w sali i zdalnie"]
+ASSESSMENTS = ["Test/egzamin", "Projekt/zadanie", "Esej/praca pisemna"]
+
+
+def random_survey(rng, categories):
+    """A student's survey: each answer is a preference or one of the ways to say there is none."""
+    def answer(values):
+        return rng.choice(values) if rng.random() < 0.6 else rng.choice(NO_PREFERENCE_ANSWERS)
+
+    # Surveys from the app spell the topic key as "Preferowna tematyka zajęć"
+    topic_key = rng.choice(["Preferowana tematyka zajęć", "Preferowna tematyka zajęć"])
+    return {
+        topic_key: answer(categories),
+        "Preferowany tryb prowadzenia zajęć": answer(MODES),
+        "Preferowany rodzaj zaliczenia": answer(ASSESSMENTS),
+    }
+
+
+# %%
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--courses-filename", default=str(AGENTS_DIR.parent / "train_data" / "oguny.json"))
+    parser.add_argument("--categories-filename",
+                        default=str(AGENTS_DIR.parent / "train_data" / "courses_with_categories.csv"))
+    parser.add_argument("--students", type=int, default=60)
+    parser.add_argument("--courses", type=int, default=20, help="Liczba kursów ocenianych dla każdego studenta")
+    parser.add_argument("--topics", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.002, help="Czas odpowiedzi stubu w sekundach")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    categories = read_categories(args.categories_filename)[:args.topics]
+    surveys = [random_survey(rng, categories) for _ in range(args.students)]
+    course_names = CourseCatalog.load(args.courses_filename).names()[:args.courses]
+    scorer = StructuredScorer(args.courses_filename)
+
+    raw = {repr(survey) for survey in surveys}
+    canonical = {repr(canonical_survey(survey)) for survey in surveys}
+    print(f"{args.students} students: {len(raw)} distinct surveys as written, {len(canonical)} canonical")
+
+    variants = {
+        "whole survey": {},
+        "per dimension": {"per_dimension": True},
+        "per dimension + rules": {"per_dimension": True, "structured_scorer": scorer},
+    }
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for label, options in variants.items():
+            llm = create_backend("stub", latency=args.latency)
+            cache = ResponseCache(str(Path(directory) / f"{label}.sqlite"))
+            start = time.perf_counter()
+            for survey in surveys:
+                agent = CourseRanker(survey, args.courses_filename, llm=llm, cache=cache, **options)
+                agent.run_many(course_names, concurrency=args.concurrency)
+            results[label] = (llm.calls, cache.stats()["hit_rate"], time.perf_counter() - start)
+            cache.close()
+
+    print(f"{'without canonical surveys':<24} model calls={len(raw) * len(course_names):<6} (whole-survey prompts)")
+    for label, (calls, hit_rate, elapsed) in results.items():
+        print(f"{label:<24} model calls={calls:<6} cache hit rate={hit_rate:6.1%}  {elapsed:6.2f}s")
@@ -0,0 +1,92 @@
+# %%
+"""
+Tabela ocen tematycznych (TopicLabels) z agentem filtrującym na StubBackend, na tymczasowej kopii katalogu:
+pełne etykietowanie, ponowne uruchomienie bez zmian, aktualizacja po zmianie opisów kilku kursów
+oraz czas odpowiedzi filtrowania z tabeli w porównaniu z wywołaniami modelu.
+"""
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+AGENTS_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(AGENTS_DIR))
+sys.path.append(str(AGENTS_DIR / "filtering agents"))
+from common.backends import create_backend
+from common.course_catalog import CourseCatalog
+from common.topic_labels import TOPIC_KEY, TopicLabels, read_categories
+from course_ranker import CourseRanker
+
+
+def label(labels, courses_filename, categories, llm, concurrency):
+    def score_many(category, course_names, on_result):
+        agent = CourseRanker({TOPIC_KEY: category}, courses_filename, llm=llm)
+        return agent.run_many(course_names, concurrency=concurrency, on_result=on_result)
+
+    calls = llm.calls
+    start = time.perf_counter()
+    counts = labels.update(CourseCatalog.load(courses_filename), categories, score_many, model=llm.model_id,
+                           variant=CourseRanker.label_variant())
+    return counts, llm.calls - calls, time.perf_counter() - start
+
+
+# %%
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--courses-filename", default=str(AGENTS_DIR.parent / "train_data" / "oguny.json"))
+    parser.add_argument("--categories-filename",
+                        default=str(AGENTS_DIR.parent / "train_data" / "courses_with_categories.csv"))
+    parser.add_argument("--topics", type=int, default=4)
+    parser.add_argument("--changed", type=int, default=5, help="Liczba kursów, których opis jest zmieniany")
+    parser.add_argument("--latency", type=float, default=0.002, help="Czas odpowiedzi stubu w sekundach")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    categories = read_categories(args.categories_filename)[:args.topics]
+    llm = create_backend("stub", latency=args.latency)
+
+    with tempfile.TemporaryDirectory() as directory:
+        courses_filename = str(Path(directory) / "oguny.json")
+        shutil.copy(args.courses_filename, courses_filename)
+        labels = TopicLabels(str(Path(directory) / "topic_labels.sqlite"))
+        courses = len(CourseCatalog.load(courses_filename))
+
+        for run in ("initial labeling", "rerun, nothing changed"):
+            counts, calls, elapsed = label(labels, courses_filename, categories, llm, args.concurrency)
+            print(f"{run:<32} {courses} courses x {len(categories)} topics: model calls={calls:<5} "
+                  f"{elapsed:7.2f}s  {counts}")
+
+        with open(courses_filename, "r", encoding="utf-8") as file:
+            courses_data = json.load(file)
+        for key in list(courses_data)[:args.changed]:
+            courses_data[key]["Skrócony opis"] = courses_data[key].get("Skrócony opis", "") + " (zaktualizowano)"
+        with open(courses_filename, "w", encoding="utf-8") as file:
+            json.dump(courses_data, file, ensure_ascii=False)
+        CourseCatalog.clear()
+        counts, calls, elapsed = label(labels, courses_filename, categories, llm, args.concurrency)
+        print(f"{f'{args.changed} descriptions changed':<32} {courses} courses x {len(categories)} topics: "
+              f"model calls={calls:<5} {elapsed:7.2f}s  {counts}")
+
+        # Query time: the filtering agent for one survey topic over the whole catalog
+        survey_data = {TOPIC_KEY: categories[0]}
+        scores = {}
+        for source, topic_labels in (("model calls", None), ("labels table", labels)):
+            agent = CourseRanker(survey_data, courses_filename, llm=llm, topic_labels=topic_labels)
+            names = agent.catalog.names()
+            calls = llm.calls
+            start = time.perf_counter()
+            outputs = agent.run_many(names, concurrency=args.concurrency)
+            elapsed = time.perf_counter() - start
+            print(f"filter via {source:<21} {len(names)} courses: model calls={llm.calls - calls:<5} "
+                  f"{1e3 * elapsed:9.1f} ms")
+            scores[source] = [output["zgodność tematyki zajęć"] for output in outputs]
+        print("same scores from the table as from the model:", scores["model calls"] == scores["labels table"])
+
+        start = time.perf_counter()
+        for name in names:
+            agent.lookup_label(name)
+        print(f"table lookup per course: {1e6 * (time.perf_counter() - start) / len(names):.1f} µs")
+        labels.close()
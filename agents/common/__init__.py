@@ -0,0 +1,3 @@
+"""
+Wspólne moduły agentów filtrujących i rankingowych.
+"""
@@ -0,0 +1,91 @@
+import copy
+from typing import Any, Optional
+
+from common.perf_log import current_record
+
+
+class LazyAgent:
+    """
+    Baza agentów oceniających przyjmująca argumenty swarms.Agent, ale bez importu swarms przy tworzeniu:
+    agent swarms powstaje dopiero przy pierwszym wywołaniu modelu przez swarms (model_name bez backendu
+    z common.backends). Przebiegi na backendach LLMBackend nie importują więc swarms wcale.
+    Atrybuty, których tu nie ma (np. short_memory), są pobierane z agenta swarms.
+    """
+
+    def __init__(
+            self,
+            agent_name: str,
+            agent_description: str,
+            system_prompt: str,
+            max_loops: int,
+            max_tokens: int,
+            temperature: float,
+            model_name: str,
+            **kwargs: Any,
+    ):
+        """
+        Parametry:
+            agent_name (str): Nazwa agenta, używana też w promptach.
+            agent_description (str): Opis agenta.
+            system_prompt (str): Prompt systemowy.
+            max_loops (int): Maksymalna liczba pętli przetwarzania.
+            max_tokens (int): Maksymalna liczba tokenów w odpowiedzi.
+            temperature (float): Temperatura próbkowania.
+            model_name (str): Nazwa modelu (litellm) dla wywołań przez swarms.
+            **kwargs: Pozostałe argumenty swarms.Agent (np. llm, output_type, retry_attempts).
+        """
+        self.agent_name = agent_name
+        self.agent_description = agent_description
+        self.system_prompt = system_prompt
+        self.max_loops = max_loops
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.model_name = model_name
+        self._agent_kwargs = dict(
+            agent_name=agent_name,
+            agent_description=agent_description,
+            system_prompt=system_prompt,
+            max_loops=max_loops,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            model_name=model_name,
+            **kwargs,
+        )
+        self._agent = None
+        self._base_history: Optional[list] = None
+
+    @property
+    def agent(self) -> Any:
+        """The swarms agent behind this one, created (importing swarms) on first use."""
+        if self._agent is None:
+            from swarms import Agent
+
+            self._agent = Agent(**self._agent_kwargs)
+            # Conversation right after construction (system prompt only), restored before every run
+            self._base_history = copy.deepcopy(self._agent.short_memory.conversation_history)
+        return self._agent
+
+    def __getattr__(self, name: str) -> Any:
+        # Called only for attributes missing here; private ones must not create the swarms agent
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.agent, name)
+
+    def run(self, task: str, *args: Any, **kwargs: Any) -> Any:
+        """Run a task on the swarms agent, passing the token usage reported by the provider to the perf log."""
+        agent = self.agent
+        before = getattr(agent, "usage", None)
+        output = agent.run(task, *args, **kwargs)
+        after = getattr(agent, "usage", None)
+        if isinstance(before, dict) and isinstance(after, dict) and after["total_tokens"] > before["total_tokens"]:
+            current_record().add_usage(after["input_tokens"] - before["input_tokens"],
+                                       after["output_tokens"] - before["output_tokens"])
+        return output
+
+    def reset_history(self) -> None:
+        """
+        Przywraca historię rozmowy do stanu po inicjalizacji, dzięki czemu ten sam agent
+        może oceniać kolejne kursy bez powiększania promptu o poprzednie odpowiedzi.
+        """
+        if self._agent is not None:
+            self._agent.short_memory.conversation_history = copy.deepcopy(self._base_history)
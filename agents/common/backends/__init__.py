@@ -0,0 +1,31 @@
+"""
+Implementacje modeli językowych używanych przez agentów.
+"""
+import importlib
+from typing import Any
+
+from common.backends.base import LLMBackend
+
+# Backends are imported on first use, so that e.g. the stub does not pull in torch
+BACKENDS = {
+    "openai": ("common.backends.openai_http", "OpenAIHTTPBackend"),
+    "transformers": ("common.backends.transformers_local", "TransformersBackend"),
+    "stub": ("common.backends.stub", "StubBackend"),
+}
+
+
+def create_backend(kind: str, *args: Any, **kwargs: Any) -> LLMBackend:
+    """
+    Tworzy backend o podanym rodzaju ("openai", "transformers", "stub").
+
+    Parametry:
+        kind (str): Rodzaj backendu, klucz BACKENDS.
+        *args, **kwargs: Argumenty konstruktora backendu.
+    """
+    if kind not in BACKENDS:
+        raise ValueError(f"Nieznany backend: {kind}; dostępne: {', '.join(BACKENDS)}")
+    module_name, class_name = BACKENDS[kind]
+    backend_class = getattr(importlib.import_module(module_name), class_name)
+    if kind == "transformers":
+        return backend_class.load(*args, **kwargs)
+    return backend_class(*args, **kwargs)
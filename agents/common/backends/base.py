@@ -0,0 +1,53 @@
+from typing import Any, Callable, Iterator, Optional
+
+
+class LLMBackend:
+    """
+    Wspólny interfejs modeli używanych przez agentów CourseRanker (przekazywanych jako llm=).
+    Implementacja musi dostarczyć generate; pozostałe metody mają domyślne wersje oparte na nim.
+    """
+
+    model_id: str = ""
+
+    def generate(self, prompt: str, system_prompt: str = "", max_new_tokens: Optional[int] = None) -> str:
+        """
+        Generuje odpowiedź dla jednego promptu.
+
+        Parametry:
+            prompt (str): Prompt użytkownika.
+            system_prompt (str): Prompt systemowy.
+            max_new_tokens (int | None): Limit tokenów odpowiedzi; domyślnie ustawienie backendu.
+        """
+        raise NotImplementedError
+
+    def generate_batch(
+        self,
+        prompts: list[str],
+        system_prompt: str = "",
+        max_new_tokens: Optional[int] = None,
+        stop_when: Optional[Callable[[str], bool]] = None,
+    ) -> list[str]:
+        """Generate responses one prompt at a time; backends with real batching override this."""
+        return [self.generate(prompt, system_prompt, max_new_tokens) for prompt in prompts]
+
+    def stream(self, prompt: str, system_prompt: str = "", max_new_tokens: Optional[int] = None) -> Iterator[str]:
+        """Yield the response in chunks; without native streaming the whole response is one chunk."""
+        yield self.generate(prompt, system_prompt, max_new_tokens)
+
+    def run(self, task: Optional[str] = None, *args, messages: Optional[list[dict[str, Any]]] = None, **kwargs) -> str:
+        """
+        Punkt wejścia używany przez swarms.Agent, który przekazuje albo task, albo rozmowę jako messages=.
+
+        Parametry:
+            task (str | None): Prompt.
+            messages (list[dict] | None): Wiadomości w formacie chat (role, content).
+        """
+        system_prompt, prompt = split_messages(messages) if task is None and messages else ("", task or "")
+        return self.generate(prompt, system_prompt)
+
+
+def split_messages(messages: list[dict[str, Any]]) -> tuple[str, str]:
+    """Turn chat messages into (system prompt, prompt): system messages apart, the rest joined in order."""
+    system = [str(message.get("content", "")) for message in messages if message.get("role") == "system"]
+    other = [str(message.get("content", "")) for message in messages if message.get("role") != "system"]
+    return "\n".join(system), "\n".join(other)
@@ -0,0 +1,106 @@
+import json
+import os
+import threading
+from typing import Any, Iterator, Optional
+
+from common.backends.base import LLMBackend
+from common.perf_log import current_record
+
+
+class OpenAIHTTPBackend(LLMBackend):
+    """
+    Model dostępny przez API zgodne z OpenAI (/chat/completions): OpenAI, vLLM, llama.cpp, Ollama itp.
+    Korzysta bezpośrednio z HTTP (requests), bez litellm i swarms.
+    """
+
+    def __init__(
+        self,
+        model_id: str,
+        base_url: str = "https://api.openai.com/v1",
+        api_key: Optional[str] = None,
+        max_new_tokens: int = 512,
+        temperature: float = 0.0,
+        timeout: float = 60.0,
+    ):
+        """
+        Parametry:
+            model_id (str): Nazwa modelu po stronie serwera, np. "gpt-4o-mini".
+            base_url (str): Adres API, np. "http://localhost:8000/v1" dla vLLM.
+            api_key (str | None): Klucz API; domyślnie zmienna środowiskowa OPENAI_API_KEY.
+            max_new_tokens (int): Domyślny limit tokenów odpowiedzi.
+            temperature (float): Temperatura próbkowania.
+            timeout (float): Limit czasu pojedynczego zapytania w sekundach.
+        """
+        self.model_id = model_id
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key or os.environ.get("OPENAI_API_KEY", "")
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.timeout = timeout
+        # requests.Session is not guaranteed to be thread-safe, so every thread keeps its own
+        self._local = threading.local()
+
+    def _session(self) -> Any:
+        if not hasattr(self._local, "session"):
+            import requests
+
+            self._local.session = requests.Session()
+            if self.api_key:
+                self._local.session.headers["Authorization"] = f"Bearer {self.api_key}"
+        return self._local.session
+
+    def _payload(self, prompt: str, system_prompt: str, max_new_tokens: Optional[int], stream: bool) -> dict:
+        messages = [{"role": "user", "content": prompt}]
+        if system_prompt:
+            messages.insert(0, {"role": "system", "content": system_prompt})
+        return {
+            "model": self.model_id,
+            "messages": messages,
+            "max_tokens": max_new_tokens or self.max_new_tokens,
+            "temperature": self.temperature,
+            "stream": stream,
+            # A stream carries the token usage only when asked, in a final chunk without choices
+            **({"stream_options": {"include_usage": True}} if stream else {}),
+        }
+
+    def generate(self, prompt: str, system_prompt: str = "", max_new_tokens: Optional[int] = None) -> str:
+        response = self._session().post(
+            f"{self.base_url}/chat/completions",
+            json=self._payload(prompt, system_prompt, max_new_tokens, stream=False),
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        body = response.json()
+        record_usage(body.get("usage"))
+        return body["choices"][0]["message"]["content"] or ""
+
+    def stream(self, prompt: str, system_prompt: str = "", max_new_tokens: Optional[int] = None) -> Iterator[str]:
+        response = self._session().post(
+            f"{self.base_url}/chat/completions",
+            json=self._payload(prompt, system_prompt, max_new_tokens, stream=True),
+            timeout=self.timeout,
+            stream=True,
+        )
+        try:
+            response.raise_for_status()
+            # Server-sent events: "data: {json}" lines, terminated by "data: [DONE]"
+            for line in response.iter_lines():
+                line = line.decode("utf-8")
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                record_usage(chunk.get("usage"))
+                choices = chunk.get("choices") or [{}]
+                yield choices[0].get("delta", {}).get("content") or ""
+        finally:
+            # Dropping the connection is what stops the server from generating further
+            response.close()
+
+
+def record_usage(usage: Optional[dict]) -> None:
+    """Pass the token usage of an OpenAI-style response (if any) to the perf log record of this call."""
+    if usage:
+        current_record().add_usage(usage.get("prompt_tokens") or 0, usage.get("completion_tokens") or 0)
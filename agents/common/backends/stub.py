@@ -0,0 +1,123 @@
+import hashlib
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from common.backends.base import LLMBackend
+
+# A course of a batched filtering prompt ("  3. 'Nazwa kursu'"), answered with a record carrying its 'nr'
+BATCH_COURSE = re.compile(r"^\s*(\d+)\. '(.*)'\s*$", re.MULTILINE)
+
+
+class StubBackendError(RuntimeError):
+    """Simulated provider failure raised by StubBackend, with the HTTP status a provider would send."""
+
+    def __init__(self, message: str, status_code: int = 503, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class StubBackend(LLMBackend):
+    """
+    Deterministyczny model zastępczy do lokalnych testów i benchmarków bez sieci i GPU.
+    Zwraca odpowiedź w formacie agentów z ocenami wyliczonymi ze skrótu promptu,
+    więc ten sam prompt zawsze dostaje tę samą odpowiedź. Na prompt z ponumerowaną listą kursów
+    (CourseRanker.run_batch) odpowiada osobnym rekordem z 'nr' i nazwą dla każdego kursu. Opóźnienie, jego rozrzut
+    i odsetek błędów pozwalają symulować zachowanie prawdziwego dostawcy.
+    """
+
+    model_id = "stub"
+
+    def __init__(
+        self,
+        seed: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        max_in_flight: Optional[int] = None,
+        retry_after: Optional[float] = None,
+    ):
+        """
+        Parametry:
+            seed (int): Ziarno mieszane do skrótu promptu i losowania opóźnień oraz błędów.
+            latency (float): Średni czas generowania odpowiedzi w sekundach.
+            jitter (float): Maksymalne odchylenie czasu od średniej w sekundach (rozkład jednostajny).
+            error_rate (float): Prawdopodobieństwo zgłoszenia StubBackendError (503) zamiast odpowiedzi.
+            max_in_flight (int | None): Limit równoległych wywołań; nadmiarowe dostają StubBackendError 429.
+            retry_after (float | None): Wartość Retry-After (w sekundach) dołączana do odpowiedzi 429.
+        """
+        self.seed = seed
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.max_in_flight = max_in_flight
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def answer(self, prompt: str, system_prompt: str = "") -> str:
+        """The deterministic answer for a prompt, without any delay."""
+        key = f"{self.seed}\n{system_prompt}\n{prompt}"
+        courses = BATCH_COURSE.findall(prompt) if "'nr'" in prompt else []
+        if courses:
+            records = "\n".join(self._record(hashlib.sha256(f"{key}\n{number}".encode("utf-8")).digest(),
+                                             f"'nr': {number}, 'nazwa przedmiotu': '{name}'")
+                                for number, name in courses)
+            return f"odpowiedź:\n{records}\nOdpowiedź wygenerowana przez StubBackend."
+        return (
+            "odpowiedź:"
+            + self._record(hashlib.sha256(key.encode("utf-8")).digest(), "'nazwa przedmiotu': 'kurs'")
+            + "\nUzasadnienie: kurs częściowo odpowiada preferencjom studenta. "
+            "Zaletą jest tematyka zajęć, wadą może być forma zaliczenia lub tryb prowadzenia. "
+            "Odpowiedź wygenerowana przez StubBackend."
+        )
+
+    @staticmethod
+    def _record(digest: bytes, fields: str) -> str:
+        return (
+            "{" + fields + ", "
+            f"'prawidłowość przedmiotu': '{'tak' if digest[0] % 2 else 'nie'}', "
+            f"'zgodność tematyki zajęć': {digest[1] % 11}, "
+            f"'zgodność trybu prowadzenia zajęć': {digest[2] % 11}, "
+            f"'zgodność rodzaju zaliczenia': {digest[3] % 11}"
+            "}"
+        )
+
+    @contextmanager
+    def _request(self) -> Iterator[tuple[float, bool]]:
+        """Count the call in flight and draw its delay and whether it fails; raise 429 over max_in_flight."""
+        with self._lock:
+            self.calls += 1
+            if self.max_in_flight is not None and self.in_flight >= self.max_in_flight:
+                raise StubBackendError("symulowany limit zapytań", status_code=429, retry_after=self.retry_after)
+            self.in_flight += 1
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            failed = self._random.random() < self.error_rate
+        try:
+            yield delay, failed
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def generate(self, prompt: str, system_prompt: str = "", max_new_tokens: Optional[int] = None) -> str:
+        with self._request() as (delay, failed):
+            time.sleep(delay)
+        if failed:
+            raise StubBackendError("symulowany błąd dostawcy")
+        return self.answer(prompt, system_prompt)
+
+    def stream(self, prompt: str, system_prompt: str = "", max_new_tokens: Optional[int] = None) -> Iterator[str]:
+        # The delay is spread over the chunks, so that stopping early saves the rest of it
+        with self._request() as (delay, failed):
+            chunks = [word + " " for word in self.answer(prompt, system_prompt).split(" ")]
+            for chunk in chunks:
+                time.sleep(delay / len(chunks))
+                if failed:
+                    raise StubBackendError("symulowany błąd dostawcy")
+                yield chunk
@@ -0,0 +1,402 @@
+import copy
+import math
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator, Optional, Sequence
+
+from common.backends.base import LLMBackend
+
+
+@dataclass
+class OptionScores:
+    """Rozkład prawdopodobieństwa dozwolonych odpowiedzi odczytany z logitów modelu (score_options)."""
+
+    probabilities: dict[str, float]  # Normalised over the options
+    mass: float  # Probability the model put on any of the options before normalising
+
+    @property
+    def best(self) -> str:
+        return max(self.probabilities, key=self.probabilities.get)
+
+    @property
+    def confidence(self) -> float:
+        return self.probabilities[self.best]
+
+    def expected(self) -> float:
+        """Expected value of numeric options, e.g. the expected 0-10 score."""
+        return sum(float(option) * probability for option, probability in self.probabilities.items())
+
+
+class TransformersBackend(LLMBackend):
+    """
+    Lokalny model HuggingFace (np. speakleash/Bielik-1.5B-v3.0-Instruct) generujący odpowiedzi partiami.
+    Model i tokenizer są wczytywane raz na proces, prompty są dopełniane z lewej strony
+    i przetwarzane jednym wywołaniem generate na partię. Z prefix_cache wspólny początek promptów
+    (szablon rozmowy, prompt systemowy i część promptu przed danymi kursu) jest kodowany raz,
+    a jego past_key_values są używane ponownie w kolejnych partiach i wywołaniach.
+    """
+
+    _instances: dict[tuple, "TransformersBackend"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(
+        self,
+        model_id: str,
+        device: Optional[str] = None,
+        max_new_tokens: int = 96,
+        batch_size: int = 16,
+        torch_dtype: Any = None,
+        prefix_cache: bool = False,
+        min_prefix_tokens: int = 16,
+    ):
+        """
+        Parametry:
+            model_id (str): Identyfikator modelu na HuggingFace Hub lub ścieżka lokalna.
+            device (str | None): Urządzenie ("cuda", "cpu"); domyślnie cuda, jeśli jest dostępna.
+            max_new_tokens (int): Limit nowych tokenów - krótki format odpowiedzi nie potrzebuje więcej.
+            batch_size (int): Liczba promptów w jednym wywołaniu generate.
+            torch_dtype: Typ wag modelu (np. torch.float16 na GPU).
+            prefix_cache (bool): Czy kodować wspólny prefiks promptów raz i przechowywać jego past_key_values.
+                Prefiks to najdłuższy wspólny początek tokenów partii; część wspólna z prefiksem poprzedniego
+                wywołania nie jest kodowana ponownie, więc korzystają z niego też wywołania po jednym prompcie.
+            min_prefix_tokens (int): Krótszy wspólny prefiks partii nie jest brany z cache.
+        """
+        import torch
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+
+        self.model_id = model_id
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.max_new_tokens = max_new_tokens
+        self.batch_size = batch_size
+        self.prefix_cache = prefix_cache
+        self.min_prefix_tokens = min_prefix_tokens
+        # Prompt tokens of all calls and those actually run through the model (the rest came from the prefix cache)
+        self.prompt_tokens = 0
+        self.encoded_tokens = 0
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_id, padding_side="left")
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+
+        model_kwargs = {} if torch_dtype is None else {"torch_dtype": torch_dtype}
+        self.model = AutoModelForCausalLM.from_pretrained(model_id, **model_kwargs)
+        self.model.to(self.device)
+        self.model.eval()
+
+        # A single model instance must not run two generate calls at the same time
+        self._lock = threading.Lock()
+        # Token ids and KV cache of the last shared prefix (batch of one), guarded by _lock
+        self._prefix_ids: list[int] = []
+        self._prefix_kv: Any = None
+
+    @classmethod
+    def load(cls, model_id: str, **kwargs) -> "TransformersBackend":
+        """
+        Zwraca współdzielony model dla danego identyfikatora i ustawień, wczytując go przy pierwszym użyciu.
+
+        Parametry:
+            model_id (str): Identyfikator modelu na HuggingFace Hub lub ścieżka lokalna.
+        """
+        key = (model_id, tuple(sorted((name, str(value)) for name, value in kwargs.items())))
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(model_id, **kwargs)
+            return cls._instances[key]
+
+    def render(self, prompt: str, system_prompt: str = "") -> str:
+        """Build the model input text, using the tokenizer chat template when there is one."""
+        if getattr(self.tokenizer, "chat_template", None):
+            messages = [{"role": "user", "content": prompt}]
+            if system_prompt:
+                messages.insert(0, {"role": "system", "content": system_prompt})
+            return self.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+        return f"{system_prompt}\n{prompt}" if system_prompt else prompt
+
+    def encode(self, texts: list[str]) -> tuple[Any, list[int]]:
+        """
+        Tokenizuje partię tekstów. Z prefix_cache zwraca też wspólny prefiks tokenów (pusty, gdy jest
+        krótszy niż min_prefix_tokens); dopełnienie trafia wtedy między prefiks a resztę każdego wiersza,
+        dzięki czemu prefiks zajmuje w każdym wierszu te same pozycje co w cache.
+
+        Parametry:
+            texts (list[str]): Teksty wejściowe (np. z render).
+        """
+        import torch
+
+        if self.prefix_cache:
+            rows = self.tokenizer(texts, add_special_tokens=False)["input_ids"]
+            prefix = shared_prefix_length(rows)
+            if prefix >= self.min_prefix_tokens:
+                width = max(len(row) for row in rows)
+                pad = self.tokenizer.pad_token_id
+                input_ids = [row[:prefix] + [pad] * (width - len(row)) + row[prefix:] for row in rows]
+                attention_mask = [[1] * prefix + [0] * (width - len(row)) + [1] * (len(row) - prefix) for row in rows]
+                inputs = {"input_ids": torch.tensor(input_ids, device=self.device),
+                          "attention_mask": torch.tensor(attention_mask, device=self.device)}
+                return inputs, rows[0][:prefix]
+
+        inputs = self.tokenizer(texts, return_tensors="pt", padding=True, add_special_tokens=False).to(self.device)
+        return inputs, []
+
+    def prefix_kv(self, prefix: list[int], batch: int) -> Any:
+        """
+        Zwraca past_key_values prefiksu dla partii batch wierszy (kopię, którą generate może rozszerzać).
+        Przechowywany cache poprzedniego prefiksu jest przycinany do części wspólnej, a model koduje
+        tylko pozostałe tokeny. Wywoływana pod self._lock.
+
+        Parametry:
+            prefix (list[int]): Tokeny wspólnego prefiksu partii.
+            batch (int): Liczba wierszy partii.
+        """
+        import torch
+
+        shared = shared_prefix_length([self._prefix_ids, prefix], keep_last=False)
+        if self._prefix_kv is None or not shared:
+            self._prefix_kv = None
+            shared = 0
+        else:
+            # A negative length removes that many tokens from the end, in every transformers version
+            self._prefix_kv.crop(shared - self._prefix_kv.get_seq_length())
+        if len(prefix) > shared:
+            outputs = self.model(
+                input_ids=torch.tensor([prefix[shared:]], device=self.device),
+                past_key_values=self._prefix_kv,
+                use_cache=True,
+                logits_to_keep=1,
+            )
+            self._prefix_kv = outputs.past_key_values
+            self.encoded_tokens += len(prefix) - shared
+        self._prefix_ids = list(prefix)
+
+        past_key_values = copy.deepcopy(self._prefix_kv)
+        past_key_values.batch_repeat_interleave(batch)
+        return past_key_values
+
+    def generate_batch(
+        self,
+        prompts: list[str],
+        system_prompt: str = "",
+        max_new_tokens: Optional[int] = None,
+        stop_when: Optional[Callable[[str], bool]] = None,
+    ) -> list[str]:
+        """
+        Generuje odpowiedzi dla wielu promptów, po batch_size promptów na wywołanie generate.
+        Zwraca wyłącznie nowo wygenerowany tekst, w kolejności promptów.
+
+        Parametry:
+            prompts (list[str]): Prompty użytkownika.
+            system_prompt (str): Wspólny prompt systemowy.
+            max_new_tokens (int | None): Limit nowych tokenów; domyślnie wartość z konstruktora.
+            stop_when (Callable[[str], bool] | None): Warunek na dotychczas wygenerowany tekst wiersza
+                (np. OutputParser.settled); wiersz, który go spełnia, przestaje być generowany.
+        """
+        import torch
+        from transformers import StoppingCriteria, StoppingCriteriaList
+
+        class StopWhen(StoppingCriteria):
+            def __init__(self, tokenizer, prompt_length: int):
+                self.tokenizer = tokenizer
+                self.prompt_length = prompt_length
+
+            def __call__(self, input_ids, scores, **kwargs):
+                texts = self.tokenizer.batch_decode(input_ids[:, self.prompt_length:], skip_special_tokens=True)
+                return torch.tensor([stop_when(text) for text in texts], device=input_ids.device)
+
+        texts = [self.render(prompt, system_prompt) for prompt in prompts]
+        outputs = []
+        for start in range(0, len(texts), self.batch_size):
+            inputs, prefix = self.encode(texts[start:start + self.batch_size])
+
+            stopping_criteria = None
+            if stop_when is not None:
+                stopping_criteria = StoppingCriteriaList([StopWhen(self.tokenizer, inputs["input_ids"].shape[1])])
+
+            with self._lock, torch.inference_mode():
+                generated = self.model.generate(
+                    **inputs,
+                    past_key_values=self._past_key_values(inputs, prefix),
+                    max_new_tokens=max_new_tokens or self.max_new_tokens,
+                    do_sample=False,
+                    pad_token_id=self.tokenizer.pad_token_id,
+                    stopping_criteria=stopping_criteria,
+                )
+
+            # With left padding every row's prompt ends at the same column
+            new_tokens = generated[:, inputs["input_ids"].shape[1]:]
+            outputs.extend(self.tokenizer.batch_decode(new_tokens, skip_special_tokens=True))
+
+        return outputs
+
+    def _past_key_values(self, inputs: Any, prefix: list[int]) -> Any:
+        # Count the prompt tokens and take the prefix from the cache; called under self._lock
+        rows = int(inputs["attention_mask"].sum())
+        self.prompt_tokens += rows
+        if not prefix:
+            self.encoded_tokens += rows
+            return None
+        batch = inputs["input_ids"].shape[0]
+        self.encoded_tokens += rows - batch * len(prefix)
+        return self.prefix_kv(prefix, batch)
+
+    def score_options(
+        self,
+        prompts: list[str],
+        answer_prefixes: list[str],
+        options: Sequence[str],
+        system_prompt: str = "",
+    ) -> list[OptionScores]:
+        """
+        Ocenia prompty bez generowania: dopisuje do każdego początek odpowiedzi (answer_prefix) i z rozkładu
+        następnego tokenu odczytuje prawdopodobieństwa odpowiedzi options (np. " 0".." 10" albo "tak"/"nie").
+        Jeden przebieg modelu na partię; odpowiedzi o wspólnych początkowych tokenach (np. "1" i "10")
+        rozstrzyga dodatkowy krok o jednym tokenie. Korzysta z prefix_cache tak jak generate_batch.
+
+        Parametry:
+            prompts (list[str]): Prompty użytkownika.
+            answer_prefixes (list[str]): Początek odpowiedzi modelu dla każdego promptu, kończący się tuż przed
+                odpowiedzią; options są tokenizowane w kontekście pierwszego z nich.
+            options (Sequence[str]): Dozwolone odpowiedzi.
+            system_prompt (str): Wspólny prompt systemowy.
+        """
+        import torch
+
+        if len(answer_prefixes) != len(prompts):
+            raise ValueError("Każdy prompt musi mieć swój początek odpowiedzi")
+        anchor = self.tokenizer(answer_prefixes[0], add_special_tokens=False)["input_ids"]
+        option_ids = []
+        for option in options:
+            ids = self.tokenizer(answer_prefixes[0] + option, add_special_tokens=False)["input_ids"]
+            # The option's own tokens, unless it merges with the end of the answer prefix
+            option_ids.append(tuple(ids[len(anchor):] if ids[:len(anchor)] == anchor else
+                                    self.tokenizer(option, add_special_tokens=False)["input_ids"]))
+        if len(set(option_ids)) != len(option_ids) or not all(option_ids):
+            raise ValueError(f"Odpowiedzi {list(options)} nie dają różnych ciągów tokenów")
+
+        texts = [self.render(prompt, system_prompt) + answer_prefix
+                 for prompt, answer_prefix in zip(prompts, answer_prefixes)]
+        scores = []
+        for start in range(0, len(texts), self.batch_size):
+            inputs, prefix = self.encode(texts[start:start + self.batch_size])
+            mask = inputs["attention_mask"]
+            position_ids = (mask.cumsum(-1) - 1).clamp(min=0)
+            with self._lock, torch.inference_mode():
+                past_key_values = self._past_key_values(inputs, prefix)
+                outputs = self.model(
+                    input_ids=inputs["input_ids"][:, len(prefix):],
+                    attention_mask=mask,
+                    position_ids=position_ids[:, len(prefix):],
+                    past_key_values=past_key_values,
+                    use_cache=True,
+                    logits_to_keep=1,
+                )
+                logprobs = self._option_logprobs(option_ids, (), outputs.logits[:, -1].float().log_softmax(-1),
+                                                 outputs.past_key_values, mask, position_ids[:, -1])
+            for row in logprobs.exp().tolist():
+                mass = sum(row)
+                scores.append(OptionScores({option: probability / mass for option, probability in zip(options, row)},
+                                           mass))
+        return scores
+
+    def _option_logprobs(self, option_ids: list[tuple[int, ...]], path: tuple[int, ...], logprobs: Any,
+                         past_key_values: Any, mask: Any, positions: Any) -> Any:
+        # Log-probabilities (rows x options) of the options that continue path, given the next-token logprobs
+        # after it; options ending at path get the probability of not continuing towards another option
+        import torch
+
+        result = torch.full((logprobs.shape[0], len(option_ids)), -math.inf, device=logprobs.device)
+        below = [i for i, ids in enumerate(option_ids) if ids[:len(path)] == path]
+        next_tokens = sorted({option_ids[i][len(path)] for i in below if len(option_ids[i]) > len(path)})
+        for i in below:
+            if len(option_ids[i]) == len(path):
+                continuing = logprobs[:, next_tokens].exp().sum(-1)
+                result[:, i] = torch.log1p(-continuing.clamp(max=1 - 1e-6))
+        for token in next_tokens:
+            under = [i for i in below if len(option_ids[i]) > len(path) and option_ids[i][len(path)] == token]
+            if len(under) == 1:
+                # The first token tells this option apart from all others
+                result[:, under[0]] = logprobs[:, token]
+                continue
+            extended = torch.cat([mask, mask.new_ones((mask.shape[0], 1))], dim=-1)
+            outputs = self.model(
+                input_ids=torch.full((mask.shape[0], 1), token, device=mask.device),
+                attention_mask=extended,
+                position_ids=(positions + 1)[:, None],
+                past_key_values=copy.deepcopy(past_key_values),
+                use_cache=True,
+            )
+            deeper = self._option_logprobs(option_ids, path + (token,), outputs.logits[:, -1].float().log_softmax(-1),
+                                           outputs.past_key_values, extended, positions + 1)
+            result[:, under] = logprobs[:, token, None] + deeper[:, under]
+        return result
+
+    def generate(self, prompt: str, system_prompt: str = "", max_new_tokens: Optional[int] = None) -> str:
+        """Generate a response for a single prompt."""
+        return self.generate_batch([prompt], system_prompt, max_new_tokens)[0]
+
+    def stream(self, prompt: str, system_prompt: str = "", max_new_tokens: Optional[int] = None) -> Iterator[str]:
+        """
+        Generuje odpowiedź dla jednego promptu, zwracając tekst fragmentami w miarę dekodowania.
+        Zamknięcie generatora zatrzymuje generate po bieżącym tokenie i zwalnia model.
+
+        Parametry:
+            prompt (str): Prompt użytkownika.
+            system_prompt (str): Prompt systemowy.
+            max_new_tokens (int | None): Limit nowych tokenów; domyślnie wartość z konstruktora.
+        """
+        import torch
+        from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+
+        cancelled = threading.Event()
+
+        class Cancelled(StoppingCriteria):
+            def __call__(self, input_ids, scores, **kwargs) -> bool:
+                return cancelled.is_set()
+
+        inputs, prefix = self.encode([self.render(prompt, system_prompt)])
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+
+        errors: list[BaseException] = []
+
+        def generate() -> None:
+            try:
+                with self._lock, torch.inference_mode():
+                    self.model.generate(
+                        **inputs,
+                        past_key_values=self._past_key_values(inputs, prefix),
+                        max_new_tokens=max_new_tokens or self.max_new_tokens,
+                        do_sample=False,
+                        pad_token_id=self.tokenizer.pad_token_id,
+                        streamer=streamer,
+                        stopping_criteria=StoppingCriteriaList([Cancelled()]),
+                    )
+            except BaseException as exc:
+                errors.append(exc)
+                streamer.end()  # Unblock the consumer, the error is re-raised below
+
+        thread = threading.Thread(target=generate, daemon=True)
+        thread.start()
+        finished = False
+        try:
+            yield from streamer
+            finished = True
+        finally:
+            cancelled.set()
+            if not finished:
+                # Drain what generate already queued so that it is never blocked on the streamer
+                for _ in streamer:
+                    pass
+            thread.join()
+        if errors:
+            raise errors[0]
+
+
+def shared_prefix_length(rows: list[list[int]], keep_last: bool = True) -> int:
+    """
+    Length of the token prefix all rows share; with keep_last at least one token of every row
+    is left out of it, since generate needs an input token to start from.
+    """
+    limit = min(len(row) for row in rows) - (1 if keep_last else 0)
+    length = 0
+    while length < limit and all(row[length] == rows[0][length] for row in rows):
+        length += 1
+    return length
@@ -0,0 +1,85 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+
+def run_many(
+    fn: Callable[[Any], Any],
+    items: Iterable[Any],
+    concurrency: int = 4,
+    on_error: Optional[Callable[[Any, Exception], Any]] = None,
+    on_result: Optional[Callable[[Any, Any], None]] = None,
+) -> list[Any]:
+    """
+    Wywołuje fn dla każdego elementu w puli wątków z ograniczoną liczbą równoległych wywołań.
+
+    Wyniki są zwracane w kolejności wejściowej. Wyjątek w jednym wywołaniu nie przerywa
+    całej partii - w jego miejsce trafia on_error(item, exc) albo sam wyjątek.
+
+    Parametry:
+        fn (Callable): Funkcja wywoływana dla pojedynczego elementu.
+        items (Iterable): Elementy do przetworzenia.
+        concurrency (int): Maksymalna liczba jednocześnie trwających wywołań.
+        on_error (Callable | None): Funkcja budująca wynik zastępczy dla nieudanego wywołania.
+        on_result (Callable | None): Wywoływana z (item, wynik) zaraz po każdym udanym wywołaniu,
+            np. do zapisu postępu; wywołania mogą przychodzić z różnych wątków.
+    """
+    items = list(items)
+    results: list[Any] = [None] * len(items)
+
+    def call(index: int, item: Any) -> None:
+        try:
+            results[index] = fn(item)
+        except Exception as exc:
+            results[index] = exc if on_error is None else on_error(item, exc)
+            return
+        if on_result is not None:
+            on_result(item, results[index])
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        list(executor.map(call, range(len(items)), items))
+
+    return results
+
+
+class AgentPool:
+    """
+    Pula gotowych agentów wielokrotnego użytku.
+    Agent jest wypożyczany na czas jednego wywołania, więc nigdy nie obsługuje dwóch wątków naraz.
+    Nowy agent powstaje tylko wtedy, gdy wszystkie istniejące są zajęte.
+    """
+
+    def __init__(self, factory: Callable[[], Any], agents: Iterable[Any] = ()):
+        """
+        Parametry:
+            factory (Callable): Funkcja tworząca nowego agenta.
+            agents (Iterable): Agenci dostępni w puli od początku.
+        """
+        self.factory = factory
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self.created = 0
+        for agent in agents:
+            self._idle.put(agent)
+            self.created += 1
+
+    @contextmanager
+    def acquire(self) -> Iterator[Any]:
+        """Borrow an idle agent (or build one) and return it to the pool afterwards."""
+        try:
+            agent = self._idle.get_nowait()
+        except queue.Empty:
+            agent = self.factory()
+            with self._lock:
+                self.created += 1
+        try:
+            yield agent
+        finally:
+            self._idle.put(agent)
+
+    def run(self, *args, **kwargs) -> Any:
+        """Run a single task on a borrowed agent."""
+        with self.acquire() as agent:
+            return agent.run(*args, **kwargs)
@@ -0,0 +1,220 @@
+import json
+import mmap
+import os
+import struct
+import threading
+from array import array
+from pathlib import Path
+from typing import Optional, Sequence
+
+from common.course_catalog import PROMPT_FIELDS, CourseCatalog
+from common.prompt_compaction import PromptCompactor
+
+# magic, format version, number of courses, number of columns, length of the JSON metadata
+HEADER = struct.Struct("<4sIIII")
+MAGIC = b"CCAT"
+VERSION = 1
+# Length of a missing field in the offset table (an empty string has length 0)
+MISSING = 0xFFFFFFFF
+KEY_COLUMN, HASH_COLUMN = "#key", "#hash"
+RECORD_FIELDS = ("Nazwa przedmiotu", "Kod przedmiotu") + PROMPT_FIELDS
+COMPACT_PREFIX = "compact:"
+
+
+def catalog_file_path(courses_filename: str) -> Path:
+    """Binary catalog next to the JSON one, e.g. oguny.catalog.bin."""
+    path = Path(courses_filename)
+    return path.with_name(f"{path.stem}.catalog.bin")
+
+
+def source_stat(courses_filename: str) -> dict[str, int]:
+    """Size and modification time of the JSON catalog; the binary file is used only while they match."""
+    stat = os.stat(courses_filename)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def write_catalog_file(courses_filename: str, compactor: Optional[PromptCompactor] = None) -> Path:
+    """
+    Zapisuje katalog w formacie binarnym czytanym przez MappedCourseCatalog: nagłówek, metadane JSON,
+    tablica przesunięć o stałej szerokości (przesunięcie i długość uint32 dla każdego kursu i kolumny)
+    oraz teksty pól w UTF-8. Kolumny to klucz katalogu, skrót treści, pola rekordu (w tym "Kod przedmiotu")
+    i opcjonalnie zwięzłe rekordy promptu dla ustawień compactor.
+
+    Parametry:
+        courses_filename (str): Ścieżka do pliku z metadanymi kursów (np. oguny.json).
+        compactor (PromptCompactor | None): Ustawienia zwięzłych rekordów zapisywanych w pliku.
+    """
+    stat = source_stat(courses_filename)
+    catalog = CourseCatalog(courses_filename)
+    records = catalog.records()
+    columns = [KEY_COLUMN, HASH_COLUMN, *RECORD_FIELDS]
+    compact_fields = []
+    if compactor is not None:
+        compact = catalog.compact_records(compactor)
+        compact_fields = ["Nazwa przedmiotu", *compactor.budgets]
+        columns += [COMPACT_PREFIX + field for field in compact_fields]
+
+    table = array("I")
+    blobs = bytearray()
+    for key, record in records.items():
+        values = [key, catalog.content_hash(key), *(record.get(field) for field in RECORD_FIELDS)]
+        if compact_fields:
+            values += [compact[key].get(field) for field in compact_fields]
+        for value in values:
+            if value is None:
+                table.extend((0, MISSING))
+                continue
+            encoded = str(value).encode("utf-8")
+            table.extend((len(blobs), len(encoded)))
+            blobs += encoded
+    if table.itemsize != 4 or len(blobs) >= MISSING:
+        raise ValueError("Katalog nie mieści się w 32-bitowych przesunięciach")
+
+    meta = {
+        "columns": columns,
+        "source": stat,
+        "source_hash": catalog.source_hash,
+        "compact_settings": compactor.settings_key() if compactor is not None else None,
+    }
+    meta_bytes = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+    padding = b"\0" * (-(HEADER.size + len(meta_bytes)) % 4)
+
+    path = catalog_file_path(courses_filename)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(records), len(columns), len(meta_bytes)))
+        file.write(meta_bytes)
+        file.write(padding)
+        file.write(table.tobytes())
+        file.write(blobs)
+    os.replace(tmp_path, path)
+    return path
+
+
+class MappedCourseCatalog(CourseCatalog):
+    """
+    Katalog przedmiotów czytany przez mmap z pliku zapisanego przez write_catalog_file.
+    Procesy korzystające z tego samego pliku współdzielą strony w pamięci podręcznej systemu,
+    a teksty pól są dekodowane dopiero przy odczycie rekordu, tylko dla potrzebnych pól.
+    CourseCatalog.load wybiera go automatycznie, gdy plik binarny jest aktualny względem pliku JSON.
+    """
+
+    def __init__(self, courses_filename: str, buffer: mmap.mmap, meta: dict, rows: int, table_start: int):
+        """
+        Parametry:
+            courses_filename (str): Ścieżka do pliku JSON, z którego zbudowano plik binarny.
+            buffer (mmap.mmap): Zmapowany plik binarny.
+            meta (dict): Metadane z nagłówka pliku.
+            rows (int): Liczba kursów.
+            table_start (int): Początek tablicy przesunięć w pliku.
+        """
+        self.courses_filename = courses_filename
+        self.source_hash = meta["source_hash"]
+        self._buffer = buffer
+        self._columns = {column: i for i, column in enumerate(meta["columns"])}
+        self._compact_settings = meta["compact_settings"]
+        self._table = memoryview(buffer)[table_start:table_start + rows * len(self._columns) * 8].cast("I")
+        self._blobs_start = table_start + rows * len(self._columns) * 8
+
+        self._compact: dict[str, dict[str, dict[str, str]]] = {}
+        self._compact_lock = threading.Lock()
+        self._hashes: dict[str, str] = {}
+        self._keys: list[str] = []
+        self._names: list[str] = []
+        # Row of every catalog key and name, and of every course code, as CourseCatalog resolves them
+        self._row_of: dict[str, int] = {}
+        self._row_of_code: dict[str, int] = {}
+        self._key_of: dict[str, str] = {}
+        for row in range(rows):
+            key = self._value(row, self._columns[KEY_COLUMN])
+            name = self._value(row, self._columns["Nazwa przedmiotu"])
+            code = self._value(row, self._columns["Kod przedmiotu"])
+            self._keys.append(key)
+            self._names.append(name)
+            self._row_of[key] = row
+            self._row_of.setdefault(name, row)
+            self._key_of[key] = key
+            self._key_of.setdefault(name, key)
+            if code is not None:
+                self._row_of_code[code] = row
+                self._key_of.setdefault(code, key)
+
+    @classmethod
+    def open(cls, courses_filename: str) -> Optional["MappedCourseCatalog"]:
+        """
+        Otwiera plik binarny katalogu albo zwraca None, gdy go nie ma lub jest nieaktualny.
+
+        Parametry:
+            courses_filename (str): Ścieżka do pliku JSON katalogu.
+        """
+        try:
+            with open(catalog_file_path(courses_filename), "rb") as file:
+                buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, rows, _, meta_length = HEADER.unpack_from(buffer, 0)
+            if magic != MAGIC or version != VERSION:
+                return None
+            meta = json.loads(buffer[HEADER.size:HEADER.size + meta_length].decode("utf-8"))
+            if meta["source"] != source_stat(courses_filename):
+                return None
+        except (OSError, ValueError, struct.error):
+            return None
+        table_start = HEADER.size + meta_length
+        return cls(courses_filename, buffer, meta, rows, table_start + -table_start % 4)
+
+    def _value(self, row: int, column: int) -> Optional[str]:
+        i = 2 * (row * len(self._columns) + column)
+        offset, length = self._table[i], self._table[i + 1]
+        if length == MISSING:
+            return None
+        start = self._blobs_start + offset
+        return self._buffer[start:start + length].decode("utf-8")
+
+    def _row(self, course: str) -> int:
+        if course in self._row_of:
+            return self._row_of[course]
+        return self._row_of_code[course]
+
+    def _record(self, row: int, fields: Sequence[str]) -> dict[str, str]:
+        record = {}
+        for field in fields:
+            value = self._value(row, self._columns[field])
+            if value is not None:
+                record[field] = value
+        return record
+
+    def get(self, course: str, fields: Optional[Sequence[str]] = None) -> dict[str, str]:
+        return self._record(self._row(course), RECORD_FIELDS if fields is None else fields)
+
+    def content_hash(self, course: str) -> str:
+        return self._value(self._row(course), self._columns[HASH_COLUMN])
+
+    def compact(self, course: str, compactor: PromptCompactor) -> dict[str, str]:
+        if compactor.settings_key() != self._compact_settings:
+            return super().compact(course, compactor)
+        record = self._record(self._row(course),
+                              [COMPACT_PREFIX + field for field in ["Nazwa przedmiotu", *compactor.budgets]])
+        return {field[len(COMPACT_PREFIX):]: value for field, value in record.items()}
+
+    def records(self) -> dict[str, dict[str, str]]:
+        return {key: self._record(row, RECORD_FIELDS) for row, key in enumerate(self._keys)}
+
+    def names(self) -> list[str]:
+        return list(self._names)
+
+    def __contains__(self, course: str) -> bool:
+        return course in self._row_of or course in self._row_of_code
+
+
+if __name__ == "__main__":
+    # Run from the agents directory: python -m common.catalog_file --courses-filename oguny.json
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Zapisuje katalog kursów w formacie binarnym czytanym przez mmap.")
+    parser.add_argument("--courses-filename", default="oguny.json")
+    parser.add_argument("--no-compact", action="store_true",
+                        help="Bez zwięzłych rekordów promptu (PromptCompactor z domyślnymi ustawieniami)")
+    args = parser.parse_args()
+
+    path = write_catalog_file(args.courses_filename, None if args.no_compact else PromptCompactor())
+    print(f"Zapisano {path} ({path.stat().st_size / 1e6:.1f} MB, plik JSON: "
+          f"{Path(args.courses_filename).stat().st_size / 1e6:.1f} MB)")
@@ -0,0 +1,197 @@
+import json
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from common.catalog_file import catalog_file_path, write_catalog_file
+from common.course_catalog import CourseCatalog, record_hash
+from common.embedding_index import EmbeddingIndex
+from common.prompt_compaction import PromptCompactor
+from common.topic_labels import TopicLabels
+
+
+def course_code(key: str, course: dict[str, Any]) -> str:
+    """Identity of a scraped course across terms: its USOS code, or its name if it has none."""
+    return course.get("Kod przedmiotu") or course.get("Nazwa przedmiotu", key)
+
+
+def read_scrape(path: str) -> dict[str, dict[str, Any]]:
+    """
+    Wczytuje pobrany katalog przedmiotów: słownik nazwa -> rekord (jak oguny.json) albo listę rekordów,
+    które są wtedy indeksowane po "Nazwa przedmiotu".
+
+    Parametry:
+        path (str): Ścieżka do pliku JSON.
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        data = json.load(file)
+    if isinstance(data, list):
+        if not all(isinstance(course, dict) and "Nazwa przedmiotu" in course for course in data):
+            raise ValueError(f"{path}: każdy rekord listy musi mieć pole 'Nazwa przedmiotu'")
+        data = {course["Nazwa przedmiotu"]: course for course in data}
+    if not isinstance(data, dict) or not all(isinstance(course, dict) for course in data.values()):
+        raise ValueError(f"{path}: oczekiwano słownika nazwa przedmiotu -> rekord kursu")
+    return data
+
+
+@dataclass
+class CatalogDiff:
+    """Kody kursów dodanych, zmienionych i usuniętych w nowym pobraniu katalogu oraz liczba niezmienionych."""
+
+    added: list[str] = field(default_factory=list)
+    changed: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+    unchanged: int = 0
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
+
+    def counts(self) -> dict[str, int]:
+        return {"added": len(self.added), "changed": len(self.changed), "removed": len(self.removed),
+                "unchanged": self.unchanged}
+
+
+def diff_catalogs(old: dict[str, dict[str, Any]], new: dict[str, dict[str, Any]]) -> CatalogDiff:
+    """
+    Porównuje dwa katalogi po "Kod przedmiotu" i skrócie całego rekordu: kurs jest zmieniony,
+    jeśli zmieniło się którekolwiek pole, w tym nazwa.
+
+    Parametry:
+        old (dict[str, dict[str, Any]]): Poprzedni katalog (nazwa -> rekord).
+        new (dict[str, dict[str, Any]]): Nowe pobranie katalogu.
+    """
+    old_hashes = {course_code(key, course): record_hash(course) for key, course in old.items()}
+    diff = CatalogDiff()
+    new_codes = set()
+    for key, course in new.items():
+        code = course_code(key, course)
+        new_codes.add(code)
+        if code not in old_hashes:
+            diff.added.append(code)
+        elif old_hashes[code] != record_hash(course):
+            diff.changed.append(code)
+        else:
+            diff.unchanged += 1
+    diff.removed = [code for code in old_hashes if code not in new_codes]
+    return diff
+
+
+def write_json(path: Path, data: Any) -> None:
+    """Write JSON through a temporary file, so readers never see a half-written catalog."""
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(data, file, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def ingest(
+    scrape_filename: str,
+    courses_filename: str,
+    compactor: Optional[PromptCompactor] = None,
+    index_path: Optional[str] = None,
+    topic_labels: Optional[TopicLabels] = None,
+    categories: Optional[list[str]] = None,
+    score_many: Optional[Callable[..., list[dict[str, Any]]]] = None,
+    model: Optional[str] = None,
+    variant: Optional[str] = None,
+) -> dict[str, Any]:
+    """
+    Aktualizuje katalog kursów z nowego pobrania USOS i wszystko, co jest z niego wyliczane, tylko dla
+    kursów dodanych lub zmienionych: zwięzłe rekordy promptów, indeks wektorowy i oceny tematyczne.
+    Usunięte kursy znikają ze wszystkich trzech. Plik binarny katalogu (common.catalog_file), jeśli istnieje,
+    jest zapisywany od nowa. Zwraca liczby kursów i zaktualizowanych elementów.
+
+    Parametry:
+        scrape_filename (str): Nowe pobranie katalogu (zob. read_scrape).
+        courses_filename (str): Aktualny plik katalogu (np. oguny.json), nadpisywany nowym pobraniem.
+        compactor (PromptCompactor | None): Reguły zwięzłych rekordów używane przez agentów; brak oznacza,
+            że pamięć podręczna zwięzłych rekordów nie jest odświeżana.
+        index_path (str | None): Indeks zapisany przez EmbeddingIndex.save; brak pliku oznacza pełną budowę.
+        topic_labels (TopicLabels | None): Tabela ocen tematycznych.
+        categories (list[str] | None): Kategorie do oceny; domyślnie kategorie już obecne w tabeli.
+        score_many (Callable | None): Funkcja oceniająca jak w TopicLabels.update. Bez niej oceny usuniętych
+            kursów są kasowane, a liczba ocen do uzupełnienia zwracana jako 'pending'.
+        model (str | None): Nazwa modelu zapisywana przy ocenach.
+        variant (str | None): Wariant promptu agentów score_many (TopicLabels.update).
+    """
+    if score_many is not None and (model is None or variant is None):
+        raise ValueError("Ocenianie kursów (score_many) wymaga nazwy modelu i wariantu promptu")
+    new = read_scrape(scrape_filename)
+    path = Path(courses_filename)
+    old = read_scrape(str(path)) if path.exists() else {}
+    diff = diff_catalogs(old, new)
+    report: dict[str, Any] = {"catalog": diff.counts()}
+    if not diff:
+        return report
+
+    previous = CourseCatalog(courses_filename) if old else None
+    previous_index = None
+    if index_path is not None and Path(index_path).with_suffix(".npy").exists():
+        previous_index = EmbeddingIndex.load(index_path)
+
+    write_json(path, new)
+    CourseCatalog.clear()
+    catalog = CourseCatalog.load(courses_filename)
+
+    if compactor is not None:
+        catalog.compact_records(compactor, previous)
+        report["compact"] = str(catalog.compact_path())
+
+    if catalog_file_path(courses_filename).exists():
+        # The JSON catalog changed, so the binary one is stale; rebuild it from the fresh compact records
+        report["catalog_file"] = str(write_catalog_file(courses_filename, compactor))
+        CourseCatalog.clear()
+        catalog = CourseCatalog.load(courses_filename)
+
+    if index_path is not None:
+        index = EmbeddingIndex.build(courses_filename, previous=previous_index)
+        reused = set()
+        if previous_index is not None:
+            reused = {(course["Kod przedmiotu"], course.get("hash")) for course in previous_index.courses}
+        encoded = sum((course["Kod przedmiotu"], course["hash"]) not in reused for course in index.courses)
+        index.save(index_path)
+        report["embeddings"] = {"encoded": encoded, "reused": len(index.courses) - encoded}
+
+    if topic_labels is not None:
+        categories = categories or topic_labels.categories()
+        if score_many is not None:
+            report["labels"] = topic_labels.update(catalog, categories, score_many, model, variant)
+        else:
+            removed = topic_labels.remove_missing(catalog)
+            pending = sum(len(topic_labels.stale(catalog, category, model, variant)) for category in categories)
+            report["labels"] = {"removed": removed, "pending": pending}
+    return report
+
+
+if __name__ == "__main__":
+    # Run from the agents directory: python -m common.catalog_ingest nowe_oguny.json --courses-filename oguny.json
+    import argparse
+
+    from common.topic_labels import read_categories
+
+    parser = argparse.ArgumentParser(
+        description="Aktualizuje katalog kursów z nowego pobrania USOS, przeliczając tylko nowe i zmienione kursy.")
+    parser.add_argument("scrape_filename", help="Nowe pobranie katalogu (JSON jak oguny.json albo lista rekordów)")
+    parser.add_argument("--courses-filename", default="oguny.json")
+    parser.add_argument("--no-compact", action="store_true", help="Nie odświeżaj zwięzłych rekordów promptów")
+    parser.add_argument("--index", default=None, help="Indeks wektorowy (EmbeddingIndex.save) do aktualizacji")
+    parser.add_argument("--labels", default=None,
+                        help="Tabela ocen tematycznych; usuwa oceny usuniętych kursów i podaje liczbę ocen "
+                             "do uzupełnienia przez label_course_topics.py")
+    parser.add_argument("--categories-filename", default=None)
+    args = parser.parse_args()
+
+    labels = TopicLabels(args.labels) if args.labels else None
+    report = ingest(
+        args.scrape_filename,
+        args.courses_filename,
+        compactor=None if args.no_compact else PromptCompactor(),
+        index_path=args.index,
+        topic_labels=labels,
+        categories=read_categories(args.categories_filename) if args.categories_filename else None,
+    )
+    for step, counts in report.items():
+        print(f"{step:<12} {counts}")
+    if labels is not None:
+        labels.close()
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Optional, Sequence
+
+from common.prompt_compaction import PromptCompactor
+
+# Fields that the agents paste into their prompts, in prompt order.
+PROMPT_FIELDS = (
+    "Tryb prowadzenia",
+    "Skrócony opis",
+    "Pełny opis",
+    "Efekty uczenia się",
+    "Metody i kryteria oceniania",
+)
+
+
+def record_hash(record: dict[str, str]) -> str:
+    """SHA-1 of a course record's content, independent of field order."""
+    content = json.dumps(record, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+class CourseCatalog:
+    """
+    Katalog przedmiotów wczytywany z pliku JSON jeden raz na proces.
+    Przechowuje tylko pola używane w promptach, indeksowane po nazwie i kodzie przedmiotu.
+    """
+
+    _instances: dict[str, "CourseCatalog"] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, courses_filename: str):
+        """
+        Wczytuje plik z metadanymi kursów i buduje kompaktowe rekordy.
+
+        Parametry:
+            courses_filename (str): Ścieżka do pliku z metadanymi kursów (np. oguny.json).
+        """
+        self.courses_filename = courses_filename
+
+        with open(courses_filename, "rb") as file:
+            content = file.read()
+        self.source_hash = hashlib.sha1(content).hexdigest()
+        courses_data = json.loads(content.decode("utf-8"))
+
+        self._keys: list[str] = list(courses_data)
+        self._records: dict[str, dict[str, str]] = {}
+        self._by_code: dict[str, dict[str, str]] = {}
+        # Catalog key of every name and code, to find a course's compact record
+        self._key_of: dict[str, str] = {}
+        self._compact: dict[str, dict[str, dict[str, str]]] = {}
+        self._compact_lock = threading.Lock()
+        self._hashes: dict[str, str] = {}
+        for key, course in courses_data.items():
+            record = {"Nazwa przedmiotu": course.get("Nazwa przedmiotu", key)}
+            if "Kod przedmiotu" in course:
+                record["Kod przedmiotu"] = course["Kod przedmiotu"]
+            for field in PROMPT_FIELDS:
+                if field in course:
+                    record[field] = course[field]
+
+            self._records[key] = record
+            self._records.setdefault(record["Nazwa przedmiotu"], record)
+            self._key_of[key] = key
+            self._key_of.setdefault(record["Nazwa przedmiotu"], key)
+            if "Kod przedmiotu" in record:
+                self._by_code[record["Kod przedmiotu"]] = record
+                self._key_of.setdefault(record["Kod przedmiotu"], key)
+
+    @classmethod
+    def load(cls, courses_filename: str) -> "CourseCatalog":
+        """
+        Zwraca współdzielony katalog dla danego pliku, wczytując go przy pierwszym użyciu.
+        Jeśli obok leży aktualny plik binarny (common.catalog_file), katalog jest z niego mapowany przez mmap.
+
+        Parametry:
+            courses_filename (str): Ścieżka do pliku z metadanymi kursów.
+        """
+        from common.catalog_file import MappedCourseCatalog
+
+        key = str(Path(courses_filename).resolve())
+        with cls._lock:
+            if key not in cls._instances:
+                cls._instances[key] = MappedCourseCatalog.open(courses_filename) or CourseCatalog(courses_filename)
+            return cls._instances[key]
+
+    @classmethod
+    def clear(cls) -> None:
+        """Drop all shared catalogs, e.g. after the source file changed."""
+        with cls._lock:
+            cls._instances.clear()
+
+    def get(self, course: str, fields: Optional[Sequence[str]] = None) -> dict[str, str]:
+        """
+        Zwraca rekord kursu wyszukany po nazwie albo kodzie przedmiotu.
+
+        Parametry:
+            course (str): Nazwa lub kod przedmiotu.
+            fields (Sequence[str] | None): Tylko te pola rekordu; domyślnie wszystkie.
+        """
+        record = self._records[course] if course in self._records else self._by_code[course]
+        if fields is None:
+            return record
+        return {field: record[field] for field in fields if field in record}
+
+    def content_hash(self, course: str) -> str:
+        """
+        Zwraca skrót treści rekordu kursu (nazwa, kod i pola promptu); zmienia się przy każdej zmianie opisu.
+
+        Parametry:
+            course (str): Nazwa lub kod przedmiotu.
+        """
+        if course not in self._hashes:
+            self._hashes[course] = record_hash(self.get(course))
+        return self._hashes[course]
+
+    def compact(self, course: str, compactor: PromptCompactor) -> dict[str, str]:
+        """
+        Zwraca zwięzły rekord kursu do promptu (zob. PromptCompactor), wyszukany po nazwie albo kodzie.
+        Zwięzłe rekordy całego katalogu są liczone raz i zapisywane obok pliku katalogu.
+
+        Parametry:
+            course (str): Nazwa lub kod przedmiotu.
+            compactor (PromptCompactor): Reguły i budżety tokenów.
+        """
+        if course not in self._key_of:
+            raise KeyError(course)
+        return self.compact_records(compactor)[self._key_of[course]]
+
+    def compact_path(self) -> Path:
+        """File next to the catalog caching its compact records, e.g. oguny.compact.json."""
+        path = Path(self.courses_filename)
+        return path.with_name(f"{path.stem}.compact.json")
+
+    def compact_records(self, compactor: PromptCompactor,
+                        previous: Optional["CourseCatalog"] = None) -> dict[str, dict[str, str]]:
+        """
+        Zwraca zwięzłe rekordy wszystkich kursów według klucza katalogu: z pamięci, z pliku obok katalogu
+        albo liczone i zapisywane do tego pliku.
+
+        Parametry:
+            compactor (PromptCompactor): Reguły i budżety tokenów.
+            previous (CourseCatalog | None): Poprzednia wersja katalogu (np. przed aktualizacją z nowego
+                pobrania USOS); zwięzłe rekordy niezmienionych kursów są z niej przepisywane, a nie liczone.
+        """
+        settings = compactor.settings_key()
+        with self._compact_lock:
+            if settings in self._compact:
+                return self._compact[settings]
+
+            path = self.compact_path()
+            try:
+                with open(path, "r", encoding="utf-8") as file:
+                    cached = json.load(file)
+            except (OSError, ValueError):
+                cached = {}
+            if cached.get("source") == self.source_hash and cached.get("settings") == settings:
+                records = cached["records"]
+            else:
+                if previous is not None:
+                    previous = (previous.records(), previous.compact_records(compactor))
+                records = compactor.compact_all(self.records(), previous)
+                content = {"source": self.source_hash, "settings": settings, "records": records}
+                try:
+                    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+                    with open(tmp_path, "w", encoding="utf-8") as file:
+                        json.dump(content, file, ensure_ascii=False)
+                    os.replace(tmp_path, path)
+                except OSError:
+                    pass  # A read-only catalog directory only costs recomputing in the next process
+
+            self._compact[settings] = records
+            return records
+
+    def records(self) -> dict[str, dict[str, str]]:
+        """Records of all courses by catalog key, in file order."""
+        return {key: self._records[key] for key in self._keys}
+
+    def names(self) -> list[str]:
+        """Course names in file order."""
+        return [self._records[key]["Nazwa przedmiotu"] for key in self._keys]
+
+    def __contains__(self, course: str) -> bool:
+        return course in self._records or course in self._by_code
+
+    def __len__(self) -> int:
+        return len(self._keys)
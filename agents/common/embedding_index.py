@@ -0,0 +1,246 @@
+import hashlib
+import json
+import os
+import re
+import zlib
+from pathlib import Path
+from typing import Any, Optional, Protocol
+
+import numpy as np
+
+from common.course_catalog import CourseCatalog
+from common.survey import NO_PREFERENCE, canonical_survey
+from common.topic_labels import TOPIC_KEY
+
+# Fields embedded for every course, joined into one text
+EMBEDDED_FIELDS = ("Nazwa przedmiotu", "Skrócony opis", "Pełny opis")
+
+# Candidates per topic: the smallest K whose recall of the courses labelled with the topic in
+# courses_with_categories.csv is at least 0.9 with the default HashingEmbedder (benchmarks/bench_embedding_recall.py).
+# That is 43% of the 585-course catalog, so the index saves about half of the filter calls, not an order of
+# magnitude; a smaller K needs a semantic embedder measured with the same benchmark.
+DEFAULT_TOP_K = 250
+
+
+class Embedder(Protocol):
+    """Turns texts into L2-normalised float32 row vectors."""
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        ...
+
+    def config(self) -> dict[str, Any]:
+        ...
+
+
+class HashingEmbedder:
+    """
+    Offline embedder bez zależności od modeli: słowa i 4-gramy znakowe są rzutowane
+    funkcją skrótu na wektor o stałym wymiarze, ważone log(1 + tf) * idf.
+    IDF jest dopasowywany do korpusu kursów w fit i zapisywany razem z indeksem.
+    """
+
+    def __init__(self, dim: int = 4096, idf: Optional[list[float]] = None):
+        """
+        Parametry:
+            dim (int): Wymiar wektorów.
+            idf (list[float] | None): Wagi IDF dla kubełków; brak oznacza wagi równe 1.
+        """
+        self.dim = dim
+        self.idf = np.ones(dim, dtype=np.float32) if idf is None else np.asarray(idf, dtype=np.float32)
+
+    def _features(self, text: str) -> list[int]:
+        features = []
+        for word in re.findall(r"\w+", text.lower()):
+            features.append(zlib.crc32(word.encode("utf-8")))
+            padded = f"<{word}>"
+            for i in range(len(padded) - 3):
+                features.append(zlib.crc32(padded[i:i + 4].encode("utf-8")))
+        return features
+
+    def _counts(self, texts: list[str]) -> np.ndarray:
+        counts = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            buckets = np.asarray(self._features(text), dtype=np.uint64) % self.dim
+            np.add.at(counts[row], buckets.astype(np.intp), 1.0)
+        return counts
+
+    def fit(self, texts: list[str]) -> "HashingEmbedder":
+        """Fit bucket IDF weights on the course corpus."""
+        document_frequency = (self._counts(texts) > 0).sum(axis=0)
+        self.idf = (np.log((1 + len(texts)) / (1 + document_frequency)) + 1).astype(np.float32)
+        return self
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        vectors = np.log1p(self._counts(texts)) * self.idf
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def config(self) -> dict[str, Any]:
+        return {"type": "hashing", "dim": self.dim, "idf": [round(float(w), 5) for w in self.idf]}
+
+
+class SentenceTransformerEmbedder:
+    """
+    Embedder oparty na modelu sentence-transformers (wymaga pakietu sentence-transformers).
+    """
+
+    def __init__(self, model_name: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"):
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name)
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        return np.asarray(self.model.encode(texts, normalize_embeddings=True), dtype=np.float32)
+
+    def config(self) -> dict[str, Any]:
+        return {"type": "sentence-transformers", "model_name": self.model_name}
+
+
+def embedder_from_config(config: dict[str, Any]) -> Embedder:
+    """Rebuild the embedder described in an index sidecar."""
+    if config["type"] == "hashing":
+        return HashingEmbedder(config["dim"], config.get("idf"))
+    if config["type"] == "sentence-transformers":
+        return SentenceTransformerEmbedder(config["model_name"])
+    raise ValueError(f"Nieznany typ embeddera: {config['type']}")
+
+
+def course_text(course: dict[str, str]) -> str:
+    """Text embedded for a single catalog record."""
+    return "\n".join(course[field] for field in EMBEDDED_FIELDS if field in course)
+
+
+def text_hash(text: str) -> str:
+    """Short hash of an embedded text, stored per row to reuse vectors of unchanged courses."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+class EmbeddingIndex:
+    """
+    Indeks wektorowy kursów do taniego wstępnego filtrowania przed oceną przez agentów.
+    Macierz jest zapisywana jako plik .npy (wczytywany przez mmap), a nazwy i kody kursów
+    oraz konfiguracja embeddera w pliku .json obok niej.
+    """
+
+    def __init__(self, matrix: np.ndarray, courses: list[dict[str, str]], embedder: Embedder):
+        """
+        Parametry:
+            matrix (np.ndarray): Znormalizowane wektory kursów, jeden wiersz na kurs.
+            courses (list[dict[str, str]]): Nazwa i kod przedmiotu dla każdego wiersza.
+            embedder (Embedder): Embedder użyty do zbudowania macierzy.
+        """
+        self.matrix = matrix
+        self.courses = courses
+        self.embedder = embedder
+
+    @classmethod
+    def build(cls, courses_filename: str, embedder: Optional[Embedder] = None,
+              previous: Optional["EmbeddingIndex"] = None) -> "EmbeddingIndex":
+        """
+        Buduje indeks dla wszystkich kursów z pliku z metadanymi.
+
+        Parametry:
+            courses_filename (str): Ścieżka do pliku z metadanymi kursów (np. oguny.json).
+            embedder (Embedder | None): Embedder; domyślnie embedder indeksu previous albo HashingEmbedder
+                dopasowany do katalogu.
+            previous (EmbeddingIndex | None): Poprzedni indeks zbudowany tym samym embedderem; wektory kursów
+                o niezmienionym kodzie i tekście są z niego kopiowane, kodowane są tylko nowe i zmienione kursy.
+        """
+        catalog = CourseCatalog.load(courses_filename)
+        records = [catalog.get(name) for name in catalog.names()]
+        texts = [course_text(record) for record in records]
+        if embedder is None:
+            embedder = previous.embedder if previous is not None else HashingEmbedder().fit(texts)
+
+        courses = [{"Nazwa przedmiotu": record["Nazwa przedmiotu"], "Kod przedmiotu": record.get("Kod przedmiotu", ""),
+                    "hash": text_hash(text)} for record, text in zip(records, texts)]
+        reusable = {}
+        if previous is not None and previous.embedder.config() == embedder.config():
+            reusable = {(course["Kod przedmiotu"], course.get("hash")): row
+                        for row, course in enumerate(previous.courses)}
+        rows = [reusable.get((course["Kod przedmiotu"], course["hash"])) for course in courses]
+
+        kept = [i for i, row in enumerate(rows) if row is not None]
+        missing = [i for i, row in enumerate(rows) if row is None]
+        vectors = embedder.encode([texts[i] for i in missing]).astype(np.float32) if missing else None
+        matrix = np.empty((len(courses), previous.matrix.shape[1] if kept else vectors.shape[1]), dtype=np.float32)
+        if kept:
+            matrix[kept] = previous.matrix[[rows[i] for i in kept]]
+        if missing:
+            matrix[missing] = vectors
+        return cls(matrix, courses, embedder)
+
+    def save(self, path: str) -> None:
+        """
+        Write <path>.npy and the <path>.json sidecar, each through a temporary file,
+        so that a process mapping the previous matrix never sees a truncated file.
+        """
+        path = Path(path)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        np.save(tmp_path.with_suffix(".npy"), self.matrix)
+        with open(tmp_path.with_suffix(".json"), "w", encoding="utf-8") as file:
+            json.dump({"embedder": self.embedder.config(), "courses": self.courses}, file, ensure_ascii=False)
+        os.replace(tmp_path.with_suffix(".npy"), path.with_suffix(".npy"))
+        os.replace(tmp_path.with_suffix(".json"), path.with_suffix(".json"))
+
+    @classmethod
+    def load(cls, path: str, embedder: Optional[Embedder] = None) -> "EmbeddingIndex":
+        """
+        Wczytuje indeks zapisany przez save; macierz jest mapowana do pamięci, a nie kopiowana.
+
+        Parametry:
+            path (str): Ścieżka bez rozszerzenia (lub z rozszerzeniem .npy/.json).
+            embedder (Embedder | None): Embedder zapytań; domyślnie odtworzony z pliku .json.
+        """
+        path = Path(path)
+        with open(path.with_suffix(".json"), "r", encoding="utf-8") as file:
+            sidecar = json.load(file)
+        matrix = np.load(path.with_suffix(".npy"), mmap_mode="r")
+        return cls(matrix, sidecar["courses"], embedder or embedder_from_config(sidecar["embedder"]))
+
+    def query(self, text: str, top_k: int = 50) -> list[tuple[str, float]]:
+        """
+        Zwraca top_k kursów najbardziej podobnych do tekstu (podobieństwo kosinusowe), malejąco.
+
+        Parametry:
+            text (str): Tekst zapytania, np. preferowana tematyka zajęć.
+            top_k (int): Liczba zwracanych kursów.
+        """
+        scores = self.matrix @ self.embedder.encode([text])[0]
+        top_k = min(top_k, len(scores))
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.courses[i]["Nazwa przedmiotu"], float(scores[i])) for i in top]
+
+    def candidates(self, survey_data: dict[str, Any], top_k: int = DEFAULT_TOP_K) -> list[str]:
+        """
+        Zwraca nazwy kursów, które warto przekazać agentom CourseRanker dla danej ankiety.
+        Bez preferencji tematycznej nie ma czego filtrować - zwracane są wszystkie kursy.
+
+        Parametry:
+            survey_data (dict[str, Any]): Dane z ankiety studenta.
+            top_k (int): Liczba kandydatów; wartość dla innego embeddera warto dobrać
+                benchmarkiem benchmarks/bench_embedding_recall.py.
+        """
+        topic = canonical_survey(survey_data).get(TOPIC_KEY)
+        if topic is None or re.search(NO_PREFERENCE, str(topic).lower()):
+            return [course["Nazwa przedmiotu"] for course in self.courses]
+        return [name for name, _ in self.query(topic, top_k)]
+
+
+if __name__ == "__main__":
+    # Run from the agents directory: python -m common.embedding_index --courses-filename oguny.json
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Buduje indeks wektorowy kursów.")
+    parser.add_argument("--courses-filename", default="oguny.json")
+    parser.add_argument("--output", default="course_index")
+    parser.add_argument("--sentence-transformer", default=None,
+                        help="Nazwa modelu sentence-transformers; domyślnie offline HashingEmbedder")
+    args = parser.parse_args()
+
+    embedder = SentenceTransformerEmbedder(args.sentence_transformer) if args.sentence_transformer else None
+    index = EmbeddingIndex.build(args.courses_filename, embedder)
+    index.save(args.output)
+    print(f"Zapisano {len(index.courses)} kursów do {args.output}.npy / {args.output}.json")
@@ -0,0 +1,484 @@
+import json
+from pathlib import Path
+from typing import Callable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+EVALUATION_DIR = Path(__file__).resolve().parent.parent.parent / "Evaluation"
+# Plots of this module; filter_plots/ and recom_plots/ hold the published notebook plots, whose
+# Precision@k and Recall@k break score ties by argsort order instead of top_k_counts' expected value
+PLOTS_DIR_NAME = "metrics_plots"
+
+# Score written by the sweeps for a course the model could not score ('Błąd')
+ERROR_SCORE = -1
+FILTER_K = (5, 10, 50)
+REC_K = (5, 10)
+# Recommendation sweep features; scores_<feature>.json files aggregate scores_<feature>_<preference>.json
+REC_FEATURES = ("Tryb", "Kryteria", "Tematyka", "wszystkie")
+# Feature whose pairs are scored on all three dimensions, saved as "<pair>_tryb", "<pair>_kryterium", ...
+COMBINED_FEATURE = "wszystkie"
+FEATURE_LABELS = {
+    "Tryb": "Course Conduct Mode",
+    "Kryteria": "Passing Criteria",
+    "Tematyka": "Preferred Course Topics",
+    "wszystkie": "All Categories Combined",
+}
+
+YES, NO, ERROR_ANSWER = 1, 0, -1
+
+
+def normalize_answers(answers: pd.Series) -> np.ndarray:
+    """Raw 'prawidłowość przedmiotu' answers as YES, NO or ERROR_ANSWER (none or both of 'tak' and 'nie')."""
+    answers = answers.fillna("").astype(str)
+    yes = answers.str.contains("tak", regex=False).to_numpy()
+    no = answers.str.contains("nie", regex=False).to_numpy()
+    return np.select([yes & ~no, no & ~yes], [YES, NO], ERROR_ANSWER)
+
+
+def load_filter_scores(root: Path) -> pd.DataFrame:
+    """
+    Wczytuje wyniki przebiegu filtrowania ze wszystkich plików <root>/output-<model>/scores_<preferencja>.json
+    do jednej tabeli: model, preferencja, kurs, ocena (ERROR_SCORE dla błędu), odpowiedź tak/nie
+    (YES/NO/ERROR_ANSWER), prawdziwa kategoria kursu i to, czy kurs należy do preferowanej kategorii.
+
+    Parametry:
+        root (Path): Katalog z podkatalogami output-<model>, np. Evaluation/filterting.
+    """
+    rows = []
+    for path in sorted(Path(root).glob("output-*/scores_*.json")):
+        model = path.parent.name[len("output-"):]
+        preference = path.stem[len("scores_"):]
+        with open(path, "r", encoding="utf-8") as file:
+            for course, (score, answer, category) in json.load(file).items():
+                rows.append((model, preference, course, score, answer, category))
+    scores = pd.DataFrame(rows, columns=["model", "preference", "course", "score", "answer", "category"])
+    scores["answer"] = normalize_answers(scores["answer"])
+    scores["relevant"] = scores["category"] == scores["preference"]
+    return scores
+
+
+def load_rec_scores(root: Path) -> pd.DataFrame:
+    """
+    Wczytuje wyniki przebiegu rankingu ze wszystkich plików <root>/output-<model>/scores_<cecha>_<preferencja>.json
+    do jednej tabeli par (kurs pasujący, kurs kontrolny): model, cecha, preferencja, para, ocena kursu
+    pasującego (positive) i kontrolnego (negative) oraz czy para jest ułożona poprawnie (correct).
+    Dla cechy COMBINED_FEATURE para jest oceniana w trzech wymiarach: oceny są średnią wymiarów,
+    a para jest poprawna, gdy kurs pasujący wygrywa w każdym z nich.
+
+    Parametry:
+        root (Path): Katalog z podkatalogami output-<model>, np. Evaluation/recomendations.
+    """
+    rows = []
+    for path in sorted(Path(root).glob("output-*/scores_*.json")):
+        stem = path.stem[len("scores_"):]
+        if stem in REC_FEATURES:
+            continue  # Aggregate of the per-preference files
+        model = path.parent.name[len("output-"):]
+        feature, _, preference = stem.partition("_")
+        with open(path, "r", encoding="utf-8") as file:
+            for key, (positive, negative) in json.load(file).items():
+                pair = key.rpartition("_")[0] if feature == COMBINED_FEATURE else key
+                rows.append((model, feature, preference, pair, positive, negative))
+    pairs = pd.DataFrame(rows, columns=["model", "feature", "preference", "pair", "positive", "negative"])
+
+    failed = (pairs["positive"] == ERROR_SCORE) | (pairs["negative"] == ERROR_SCORE)
+    pairs = pairs.assign(failed=failed, correct=pairs["positive"] > pairs["negative"])
+    pairs = pairs.groupby(["model", "feature", "preference", "pair"], sort=False).agg(
+        positive=("positive", "mean"), negative=("negative", "mean"),
+        failed=("failed", "any"), correct=("correct", "all"),
+    ).reset_index()
+    pairs.loc[pairs["failed"], ["positive", "negative"]] = ERROR_SCORE
+    return pairs.drop(columns="failed")
+
+
+def ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """Element-wise numerator / denominator, 0 where the denominator is 0 (as in the evaluation notebooks)."""
+    numerator = np.asarray(numerator, dtype=float)
+    denominator = np.asarray(denominator, dtype=float)
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator > 0)
+
+
+def masked_mean(values: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """Row means of values over mask, NaN for rows without any masked value."""
+    count = mask.sum(axis=1)
+    total = np.where(mask, values, 0).sum(axis=1)
+    return np.divide(total, count, out=np.full(count.shape, np.nan), where=count > 0)
+
+
+def top_k_counts(scores: np.ndarray, relevant: np.ndarray, valid: np.ndarray,
+                 k: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    TP, FP i FN każdego wiersza przy uznaniu k najwyżej ocenionych poprawnych wyników za trafne.
+    Oceny są liczbami całkowitymi 0-10, więc na pozycji k zwykle jest remis: z bloku elementów
+    z oceną równą k-tej brakujące miejsca są przydzielane losowo, a liczby są wartością oczekiwaną
+    tego przydziału (każdy element bloku trafia do k najlepszych z jednakowym prawdopodobieństwem).
+
+    Parametry:
+        scores (np.ndarray): Oceny, wymiar (próby, elementy).
+        relevant (np.ndarray): Czy element jest trafny.
+        valid (np.ndarray): Czy ocena jest poprawna (nie ERROR_SCORE).
+        k (int): Liczba elementów uznanych za trafne.
+    """
+    keys = np.where(valid, scores, -np.inf)
+    k = min(k, keys.shape[1])
+    kth = -np.partition(-keys, k - 1, axis=1)[:, k - 1:k]
+    # Rows with fewer than k valid scores take all of them
+    above = valid & ((keys > kth) | np.isneginf(kth))
+    tied = valid & (keys == kth)
+    share = ratio(k - above.sum(axis=1), tied.sum(axis=1))
+    tp = (above & relevant).sum(axis=1) + share * (tied & relevant).sum(axis=1)
+    fp = (above & ~relevant).sum(axis=1) + share * (tied & ~relevant).sum(axis=1)
+    fn = (relevant & valid).sum(axis=1) - tp
+    return tp, fp, fn
+
+
+def filter_metrics(group: dict[str, np.ndarray], ks: Sequence[int] = FILTER_K) -> dict[str, np.ndarray]:
+    """
+    Metryki przebiegu filtrowania dla każdego wiersza (próby bootstrapowej) tablic grupy.
+
+    Parametry:
+        group (dict[str, np.ndarray]): Kolumny score, answer i relevant, wymiar (próby, kursy).
+        ks (Sequence[int]): Wartości k dla Precision@k i Recall@k.
+    """
+    score, answer, relevant = group["score"], group["answer"], group["relevant"]
+    valid_num = score != ERROR_SCORE
+    valid_str = answer != ERROR_ANSWER
+    yes, no = answer == YES, answer == NO
+    tp = (yes & relevant).sum(axis=1)
+    tn = (no & ~relevant).sum(axis=1)
+    fp = (yes & ~relevant).sum(axis=1)
+    fn = (no & relevant).sum(axis=1)
+
+    metrics = {
+        "len": np.full(len(score), score.shape[1], dtype=float),
+        "error_num": 1 - valid_num.mean(axis=1),
+        "error_str": 1 - valid_str.mean(axis=1),
+        "valid_num": valid_num.mean(axis=1),
+        "valid_str": valid_str.mean(axis=1),
+        "mean_true": masked_mean(score, valid_num & relevant),
+        "mean_false": masked_mean(score, valid_num & ~relevant),
+        "accuracy": ratio(tp + tn, tp + tn + fp + fn),
+        "precision": ratio(tp, tp + fp),
+        "recall": ratio(tp, tp + fn),
+    }
+    for k in ks:
+        tp_k, fp_k, fn_k = top_k_counts(score, relevant, valid_num, k)
+        metrics[f"Precision@{k}"] = ratio(tp_k, tp_k + fp_k)
+        metrics[f"Recall@{k}"] = ratio(tp_k, tp_k + fn_k)
+    return metrics
+
+
+def rec_metrics(group: dict[str, np.ndarray], ks: Sequence[int] = REC_K) -> dict[str, np.ndarray]:
+    """
+    Metryki przebiegu rankingu dla każdego wiersza (próby bootstrapowej) tablic grupy par.
+    Precision@k i Recall@k traktują oceny kursów pasujących i kontrolnych jako jedną listę,
+    w której trafne są kursy pasujące.
+
+    Parametry:
+        group (dict[str, np.ndarray]): Kolumny positive, negative i correct, wymiar (próby, pary).
+        ks (Sequence[int]): Wartości k dla Precision@k i Recall@k.
+    """
+    positive, negative, correct = group["positive"], group["negative"], group["correct"]
+    valid = (positive != ERROR_SCORE) & (negative != ERROR_SCORE)
+    metrics = {
+        "len": np.full(len(positive), positive.shape[1], dtype=float),
+        "error": 1 - valid.mean(axis=1),
+        "valid": valid.mean(axis=1),
+        "mean1": masked_mean(positive, valid),
+        "mean2": masked_mean(negative, valid),
+        "accuracy": ratio((correct & valid).sum(axis=1), valid.sum(axis=1)),
+    }
+    scores = np.concatenate([positive, negative], axis=1)
+    relevant = np.zeros(scores.shape, dtype=bool)
+    relevant[:, :positive.shape[1]] = True
+    for k in ks:
+        tp_k, fp_k, fn_k = top_k_counts(scores, relevant, scores != ERROR_SCORE, k)
+        metrics[f"Precision@{k}"] = ratio(tp_k, tp_k + fp_k)
+        metrics[f"Recall@{k}"] = ratio(tp_k, tp_k + fn_k)
+    return metrics
+
+
+def compute_metrics(
+    data: pd.DataFrame,
+    by: Sequence[str],
+    columns: Sequence[str],
+    metric_fn: Callable[[dict[str, np.ndarray]], dict[str, np.ndarray]],
+    samples: int = 1000,
+    confidence: float = 0.95,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """
+    Liczy metryki każdej grupy wierszy wraz z bootstrapowymi przedziałami ufności (percentylowymi):
+    wiersze grupy są losowane ze zwracaniem samples razy, a metric_fn liczy metryki wszystkich prób
+    naraz na tablicach (1 + samples, liczba wierszy grupy), których pierwszy wiersz to próba oryginalna.
+    Zwraca tabelę z indeksem (*by, metric) i kolumnami value, lo, hi.
+
+    Parametry:
+        data (pd.DataFrame): Tabela z load_filter_scores albo load_rec_scores.
+        by (Sequence[str]): Kolumny grupujące, np. ["model", "preference"].
+        columns (Sequence[str]): Kolumny przekazywane do metric_fn.
+        metric_fn (Callable): filter_metrics albo rec_metrics.
+        samples (int): Liczba prób bootstrapowych (0 oznacza brak przedziałów).
+        confidence (float): Poziom ufności przedziałów.
+        seed (int): Ziarno losowania prób.
+    """
+    rng = np.random.default_rng(seed)
+    tail = 100 * (1 - confidence) / 2
+    rows = []
+    for key, group in data.groupby(list(by), sort=False):
+        size = len(group)
+        index = np.vstack([np.arange(size)[None, :], rng.integers(0, size, (samples, size))])
+        arrays = {column: group[column].to_numpy()[index] for column in columns}
+        for metric, values in metric_fn(arrays).items():
+            if samples:
+                lo, hi = np.nanpercentile(values[1:], [tail, 100 - tail]) if np.isfinite(values[1:]).any() \
+                    else (np.nan, np.nan)
+            else:
+                lo = hi = np.nan
+            rows.append((*np.atleast_1d(key), metric, values[0], lo, hi))
+    return pd.DataFrame(rows, columns=[*by, "metric", "value", "lo", "hi"]).set_index([*by, "metric"])
+
+
+def filter_report(root: Path = EVALUATION_DIR / "filterting", samples: int = 1000, seed: int = 0) -> pd.DataFrame:
+    """Metrics of the filtering sweep per (model, preference), from load_filter_scores."""
+    return compute_metrics(load_filter_scores(root), ["model", "preference"], ["score", "answer", "relevant"],
+                           filter_metrics, samples=samples, seed=seed)
+
+
+def rec_report(root: Path = EVALUATION_DIR / "recomendations", samples: int = 1000, seed: int = 0) -> pd.DataFrame:
+    """Metrics of the ranking sweep per (model, feature), preferences pooled, from load_rec_scores."""
+    return compute_metrics(load_rec_scores(root), ["model", "feature"], ["positive", "negative", "correct"],
+                           rec_metrics, samples=samples, seed=seed)
+
+
+def _grid(metrics: pd.DataFrame, metric: str,
+          labels: Optional[dict[str, str]] = None) -> tuple[list[str], list[str], np.ndarray, np.ndarray]:
+    """
+    Models, groups (in the order of labels, if given) and (group, model) arrays of values
+    and CI half-widths (lower, upper) of a metric.
+    """
+    table = metrics.xs(metric, level="metric")
+    models = list(dict.fromkeys(table.index.get_level_values(0)))
+    groups = list(dict.fromkeys(table.index.get_level_values(1)))
+    order = list(labels or {})
+    groups.sort(key=lambda group: order.index(group) if group in order else len(order))
+    table = table.reindex(pd.MultiIndex.from_product([models, groups]))
+    values = table["value"].to_numpy().reshape(len(models), len(groups)).T
+    errors = np.stack([table["value"] - table["lo"], table["hi"] - table["value"]])
+    errors = np.nan_to_num(errors.reshape(2, len(models), len(groups)).transpose(0, 2, 1)).clip(min=0)
+    return models, groups, values, errors
+
+
+def _group_colors(groups: Sequence[str]) -> list:
+    import matplotlib.pyplot as plt
+
+    return [plt.cm.tab10.colors[i % len(plt.cm.tab10.colors)] for i in range(len(groups))]
+
+
+def plot_metric(metrics: pd.DataFrame, metric: str, title: str, ylabel: str, path: Path,
+                labels: Optional[dict[str, str]] = None, baseline: Optional[float] = None) -> None:
+    """Grouped bars of one metric per model (x) and group (color), with bootstrap CI whiskers."""
+    import matplotlib.pyplot as plt
+
+    models, groups, values, errors = _grid(metrics, metric, labels)
+    labels = labels or {}
+    x = np.arange(len(models))
+    bar_width = 0.8 / len(groups)
+    fig, ax = plt.subplots(figsize=(10, 6))
+    for i, (group, color) in enumerate(zip(groups, _group_colors(groups))):
+        ax.bar(x - 0.4 + (i + 0.5) * bar_width, values[i], bar_width, yerr=errors[:, i], capsize=3,
+               color=color, label=labels.get(group, group))
+    if baseline is not None:
+        ax.axhline(baseline, linestyle='--', color='red', label=f'Baseline ({baseline})')
+    ax.set_xticks(x)
+    ax.set_xticklabels(models)
+    ax.set_ylabel(ylabel)
+    ax.set_ylim(0, 1)
+    ax.set_title(title)
+    ax.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
+    fig.tight_layout()
+    fig.savefig(path, bbox_inches='tight')
+    plt.close(fig)
+
+
+def plot_means(metrics: pd.DataFrame, positive: str, negative: str, names: tuple[str, str], title: str,
+               path: Path, labels: Optional[dict[str, str]] = None) -> None:
+    """Paired bars of the mean score of matching (solid) and other (light) courses, with bootstrap CIs."""
+    import matplotlib.colors as mcolors
+    import matplotlib.pyplot as plt
+    from matplotlib.patches import Patch
+
+    models, groups, positives, positive_errors = _grid(metrics, positive, labels)
+    _, _, negatives, negative_errors = _grid(metrics, negative, labels)
+    labels = labels or {}
+    x = np.arange(len(models))
+    bar_width = 0.8 / len(groups)
+    fig, ax = plt.subplots(figsize=(12, 6))
+    legend_elements = []
+    for i, (group, color) in enumerate(zip(groups, _group_colors(groups))):
+        xpos = x - 0.4 + i * bar_width
+        ax.bar(xpos + bar_width / 4, positives[i], bar_width / 2, yerr=positive_errors[:, i], capsize=4,
+               color=mcolors.to_rgba(color, 1.0))
+        ax.bar(xpos + 3 * bar_width / 4, negatives[i], bar_width / 2, yerr=negative_errors[:, i], capsize=4,
+               color=mcolors.to_rgba(color, 0.5))
+        label = labels.get(group, group)
+        legend_elements.append(Patch(facecolor=color, label=f"{label} - {names[0]}"))
+        legend_elements.append(Patch(facecolor=mcolors.to_rgba(color, 0.5), label=f"{label} - {names[1]}"))
+    ax.set_title(title)
+    ax.set_ylabel("Mean Score")
+    ax.set_xticks(x)
+    ax.set_xticklabels(models)
+    ax.legend(handles=legend_elements, bbox_to_anchor=(1.05, 1), loc='upper left')
+    fig.tight_layout()
+    fig.savefig(path, bbox_inches='tight')
+    plt.close(fig)
+
+
+def plot_errors(metrics: pd.DataFrame, error: str, valid: str, title: str, path: Path,
+                labels: Optional[dict[str, str]] = None) -> None:
+    """Stacked bars of the error (light) and valid (solid) share per model and group."""
+    import matplotlib.colors as mcolors
+    import matplotlib.pyplot as plt
+    from matplotlib.patches import Patch
+
+    models, groups, errors, _ = _grid(metrics, error, labels)
+    _, _, valids, _ = _grid(metrics, valid, labels)
+    labels = labels or {}
+    x = np.arange(len(models))
+    bar_width = 0.8 / len(groups)
+    fig, ax = plt.subplots(figsize=(10, 5))
+    legend_elements = []
+    for i, (group, color) in enumerate(zip(groups, _group_colors(groups))):
+        xpos = x - 0.4 + i * bar_width
+        ax.bar(xpos, errors[i], bar_width, color=mcolors.to_rgba(color, 0.4))
+        ax.bar(xpos, valids[i], bar_width, bottom=errors[i], color=mcolors.to_rgba(color, 1.0))
+        label = labels.get(group, group)
+        legend_elements.append(Patch(facecolor=mcolors.to_rgba(color, 0.4), label=f"{label} - Error"))
+        legend_elements.append(Patch(facecolor=color, label=f"{label} - Valid"))
+    ax.set_title(title)
+    ax.set_ylabel("Proportion")
+    ax.set_xticks(x)
+    ax.set_xticklabels(models)
+    ax.set_ylim(0, 1)
+    ax.legend(handles=legend_elements, bbox_to_anchor=(1.05, 1), loc='upper left')
+    fig.tight_layout()
+    fig.savefig(path, bbox_inches='tight')
+    plt.close(fig)
+
+
+def plot_at_k(metrics: pd.DataFrame, name: str, ks: Sequence[int], path: Path,
+              labels: Optional[dict[str, str]] = None, baseline: Optional[float] = None) -> None:
+    """Bars of name@k per model, group (color) and k (darker for larger k), with one legend per k."""
+    import matplotlib.colors as mcolors
+    import matplotlib.pyplot as plt
+
+    labels = labels or {}
+    grids = {k: _grid(metrics, f"{name}@{k}", labels) for k in ks}
+    models, groups = grids[ks[0]][:2]
+    x = np.arange(len(models))
+    bar_width = 0.8 / (len(groups) * len(ks))
+    brightness = np.linspace(1.0, 0.3, len(ks))
+    fig, ax = plt.subplots(figsize=(14, 6))
+    handles: dict[int, list] = {k: [] for k in ks}
+    for i, (group, color) in enumerate(zip(groups, _group_colors(groups))):
+        for j, k in enumerate(ks):
+            _, _, values, errors = grids[k]
+            rgba = mcolors.to_rgba(color)
+            shade = (rgba[0] * brightness[j], rgba[1] * brightness[j], rgba[2] * brightness[j], rgba[3])
+            offset = (i * len(ks) + j + 0.5) * bar_width - 0.4
+            bars = ax.bar(x + offset, values[i], bar_width, yerr=errors[:, i], capsize=2, color=shade)
+            handles[k].append(bars[0])
+    if baseline is not None:
+        ax.axhline(baseline, linestyle='--', color='red')
+    ax.set_xticks(x)
+    ax.set_xticklabels(models)
+    ax.set_ylabel(name)
+    ax.set_ylim(0, 1)
+    ax.set_title(f'{name}@k per Model and Category')
+    group_labels = [labels.get(group, group) for group in groups]
+    legends = []
+    for j, k in enumerate(ks):
+        legends.append(ax.legend(handles[k], group_labels, title=f'k={k}',
+                                 bbox_to_anchor=(1.05, 1 - j * 0.3), loc='upper left'))
+        ax.add_artist(legends[-1])
+    fig.tight_layout()
+    fig.savefig(path, bbox_extra_artists=legends, bbox_inches='tight')
+    plt.close(fig)
+
+
+def plot_filter(metrics: pd.DataFrame, out_dir: Path = EVALUATION_DIR / PLOTS_DIR_NAME / "filter") -> None:
+    """Draw the filtering plots (fil_*.png) from filter_report."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    plot_metric(metrics, "accuracy", "Accuracy per Model and Category", "Accuracy", out_dir / "fil_acc.png")
+    plot_metric(metrics, "precision", "Precision per Model and Category", "Precision", out_dir / "fil_prec.png")
+    plot_metric(metrics, "recall", "Recall per Model and Category", "Recall", out_dir / "fil_recall.png")
+    plot_means(metrics, "mean_true", "mean_false", ("Mean Yes", "Mean No"),
+               "Mean of scores per 'yes' and 'no' answer responses per Model by Category", out_dir / "fil_mean.png")
+    plot_errors(metrics, "error_num", "valid_num", "Error and Valid (Numerical) per Model by Category",
+                out_dir / "fil_err_num.png")
+    plot_errors(metrics, "error_str", "valid_str", "Error and Valid (Lingual) per Model by Category",
+                out_dir / "fil_err_ling.png")
+    plot_at_k(metrics, "Precision", FILTER_K, out_dir / "fil_prec_k.png")
+    plot_at_k(metrics, "Recall", FILTER_K, out_dir / "fil_recall_k.png")
+
+
+def plot_rec(metrics: pd.DataFrame, out_dir: Path = EVALUATION_DIR / PLOTS_DIR_NAME / "recom") -> None:
+    """Draw the recommendation plots (rec_*.png) from rec_report."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    plot_errors(metrics, "error", "valid", "Error and Valid per Model by Category", out_dir / "rec_err.png",
+                labels=FEATURE_LABELS)
+    plot_metric(metrics, "accuracy", "Accuracy per Model by Category", "Accuracy", out_dir / "rec_acc.png",
+                labels=FEATURE_LABELS, baseline=0.5)
+    plot_means(metrics, "mean1", "mean2", ("Positive Mean", "Negative Mean"),
+               "Mean scores of positive and negative samples per Model by Category", out_dir / "rec_mean.png",
+               labels=FEATURE_LABELS)
+    plot_at_k(metrics, "Precision", REC_K, out_dir / "rec_prec_k.png", labels=FEATURE_LABELS, baseline=0.5)
+    plot_at_k(metrics, "Recall", REC_K, out_dir / "rec_recall_k.png", labels=FEATURE_LABELS)
+
+
+def format_report(metrics: pd.DataFrame) -> pd.DataFrame:
+    """Metrics as 'value [lo, hi]' strings, one column per metric."""
+    text = metrics["value"].map("{:.3f}".format)
+    with_ci = metrics["lo"].notna() & (metrics["hi"] > metrics["lo"])
+    text[with_ci] += (" [" + metrics["lo"][with_ci].map("{:.3f}".format) + ", "
+                      + metrics["hi"][with_ci].map("{:.3f}".format) + "]")
+    return text.unstack("metric")[list(dict.fromkeys(metrics.index.get_level_values("metric")))]
+
+
+if __name__ == "__main__":
+    # Run from the agents directory: python -m common.eval_metrics
+    import argparse
+
+    import matplotlib
+
+    matplotlib.use("Agg")
+
+    parser = argparse.ArgumentParser(description="Metryki ewaluacji filtrowania i rankingu z plików scores_*.json.")
+    parser.add_argument("--evaluation-dir", type=Path, default=EVALUATION_DIR,
+                        help="Katalog z filterting/ i recomendations/")
+    parser.add_argument("--plots-dir", type=Path, default=None,
+                        help=f"Katalog wykresów (podkatalogi filter/ i recom/); domyślnie <evaluation-dir>/"
+                             f"{PLOTS_DIR_NAME}, bo filter_plots/ i recom_plots/ to wykresy z notebooków")
+    parser.add_argument("--samples", type=int, default=1000, help="Liczba prób bootstrapowych")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-plots", action="store_true", help="Tylko tabele metryk, bez wykresów")
+    parser.add_argument("--csv", action="store_true",
+                        help="Zapisz metryki do metrics_filter.csv i metrics_rec.csv w katalogu ewaluacji")
+    args = parser.parse_args()
+
+    reports = {
+        "filter": filter_report(args.evaluation_dir / "filterting", args.samples, args.seed),
+        "rec": rec_report(args.evaluation_dir / "recomendations", args.samples, args.seed),
+    }
+    with pd.option_context("display.width", 250, "display.max_columns", None, "display.max_colwidth", 30):
+        for name, metrics in reports.items():
+            print(f"##### {name} #####")
+            print(format_report(metrics).T.to_string())
+            if args.csv:
+                metrics.to_csv(args.evaluation_dir / f"metrics_{name}.csv")
+
+    if not args.no_plots:
+        plots_dir = args.plots_dir or args.evaluation_dir / PLOTS_DIR_NAME
+        plot_filter(reports["filter"], plots_dir / "filter")
+        plot_rec(reports["rec"], plots_dir / "recom")
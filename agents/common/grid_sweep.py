@@ -0,0 +1,381 @@
+import hashlib
+import importlib.util
+import json
+import random
+import subprocess
+import sys
+from dataclasses import dataclass, field
+from functools import partial
+from itertools import groupby
+from pathlib import Path
+from typing import Any
+
+import pandas as pd
+
+from common.backends import create_backend
+from common.perf_log import PerfLog, summarize
+from common.rate_limit import RateLimiter
+from common.response_cache import ResponseCache
+from common.sweep import SweepJournal, run_journaled
+
+AGENTS_DIR = Path(__file__).resolve().parent.parent
+
+FILTER = "filter"
+RANK = "rank"
+# Evaluation/<directory>/output-<model> read by eval_filter.ipynb and eval_rec.ipynb
+EVALUATION_DIRS = {FILTER: "filterting", RANK: "recomendations"}
+
+TOPIC_KEY = 'zgodność tematyki zajęć'
+MODE_KEY = 'zgodność trybu prowadzenia zajęć'
+ASSESSMENT_KEY = 'zgodność rodzaju zaliczenia'
+VALIDITY_KEY = 'prawidłowość przedmiotu'
+
+NO_PREFERENCE = "nie mam preferencji"
+SURVEY_FIELDS = {
+    "Tryb": "Preferowany tryb prowadzenia zajęć",
+    "Kryteria": "Preferowany rodzaj zaliczenia",
+    "Tematyka": "Preferowana tematyka zajęć",
+}
+RANKING_FEATURES = {
+    "Tryb": ['zdalnie', 'mieszany: w sali i zdalnie', 'w sali'],
+    "Kryteria": ['Esej/praca pisemna', 'Obecność/aktywność', 'Test/egzamin'],
+    "Tematyka": ['Języki i kultury świata', 'Historia i archeologia', 'Socjologia i antropologia'],
+}
+# Combined preferences of the "wszystkie" feature: (Tryb, Kryteria, Tematyka)
+COMBINED = {
+    'w1': ('zdalnie', 'Test/egzamin', 'Języki i kultury świata'),
+    'w2': ('mieszany: w sali i zdalnie', 'Test/egzamin', 'Historia i archeologia'),
+    'w3': ('w sali', 'Test/egzamin', 'Języki i kultury świata'),
+}
+RANKING_KEYS = {"Tryb": MODE_KEY, "Kryteria": ASSESSMENT_KEY, "Tematyka": TOPIC_KEY}
+COMBINED_LABELS = [('tryb', MODE_KEY), ('kryterium', ASSESSMENT_KEY), ('tematyka', TOPIC_KEY)]
+PAIRS = 10
+
+
+@dataclass(frozen=True)
+class WorkItem:
+    """A single (preference, course) evaluation of the grid."""
+
+    feature: str
+    pref: str
+    course: str
+    survey: dict[str, str] = field(compare=False, hash=False)
+
+    @property
+    def key(self) -> tuple[str, str, str]:
+        return (self.feature, self.pref, self.course)
+
+    def shard(self, count: int) -> int:
+        # A stable hash of the key, so that the split does not depend on the grid order or the machine
+        digest = hashlib.sha1(json.dumps(self.key, ensure_ascii=False).encode("utf-8")).digest()
+        return int.from_bytes(digest[:8], "big") % count
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """Parse an 'i/N' shard specification."""
+    index, count = (int(part) for part in value.split("/"))
+    if not 0 <= index < count:
+        raise ValueError(f"Nieprawidłowy shard: {value}")
+    return index, count
+
+
+def ranking_survey(feature: str, pref: str) -> dict[str, str]:
+    survey = {field_name: NO_PREFERENCE for field_name in SURVEY_FIELDS.values()}
+    if feature == "wszystkie":
+        survey.update(zip(SURVEY_FIELDS.values(), COMBINED[pref]))
+    else:
+        survey[SURVEY_FIELDS[feature]] = pref
+    return survey
+
+
+def ranking_samples(test_data: pd.DataFrame, seed: int = 0) -> dict[tuple[str, str], tuple[list[str], list[str]]]:
+    """
+    Losuje pary (kurs pasujący do preferencji, kurs niepasujący) dla każdej preferencji siatki rankingu,
+    tak jak get_best_courses_concurrently_local_LLM.py, ale z ziarnem zależnym od (cecha, preferencja).
+
+    Parametry:
+        test_data (pd.DataFrame): Oznaczone kursy z oguny_unique1.csv.
+        seed (int): Ziarno losowania.
+    """
+    all_names = test_data["Nazwa"].values.tolist()
+    names = {}
+    for pref in RANKING_FEATURES["Tryb"]:
+        names[pref] = test_data['Nazwa'].loc[test_data['Tryb'] == pref].values.tolist()
+    for pref in RANKING_FEATURES["Kryteria"]:
+        names[pref] = test_data['Nazwa'].loc[test_data[pref] == 1].values.tolist()
+    for pref in RANKING_FEATURES["Tematyka"]:
+        names[pref] = test_data['Nazwa'].loc[test_data['kategorie'] == pref].values.tolist()
+    for pref, values in COMBINED.items():
+        names[pref] = sorted(set.intersection(*(set(names[value]) for value in values)))
+
+    samples = {}
+    preferences = [*((feature, pref) for feature, prefs in RANKING_FEATURES.items() for pref in prefs),
+                   *(("wszystkie", pref) for pref in COMBINED)]
+    for feature, pref in preferences:
+        contr_names = sorted(set(all_names) - set(names[pref]))
+        rng = random.Random(f"{seed}:{feature}:{pref}")
+        samples[feature, pref] = (rng.choices(names[pref], k=PAIRS), rng.choices(contr_names, k=PAIRS))
+    return samples
+
+
+def filter_preferences(test_data: pd.DataFrame) -> list[str]:
+    """The four most frequent topic categories, as in course_name_categorizer.py."""
+    return test_data["kategorie"].value_counts().sort_values(ascending=False).index[:4].tolist()
+
+
+def build_grid(task: str, test_data: pd.DataFrame, seed: int = 0) -> list[WorkItem]:
+    """
+    Zwraca wszystkie elementy pracy siatki ewaluacji (bez powtórzeń), w stałej kolejności.
+
+    Parametry:
+        task (str): FILTER albo RANK.
+        test_data (pd.DataFrame): Oznaczone kursy z oguny_unique1.csv.
+        seed (int): Ziarno losowania par kursów w rankingu.
+    """
+    items: dict[tuple, WorkItem] = {}
+    if task == FILTER:
+        for pref in filter_preferences(test_data):
+            survey = {SURVEY_FIELDS["Tematyka"]: pref}
+            for course in test_data["Nazwa"]:
+                item = WorkItem("Tematyka", pref, course, survey)
+                items.setdefault(item.key, item)
+    else:
+        for (feature, pref), (pref_sample, contr_sample) in ranking_samples(test_data, seed).items():
+            survey = ranking_survey(feature, pref)
+            for course in pref_sample + contr_sample:
+                item = WorkItem(feature, pref, course, survey)
+                items.setdefault(item.key, item)
+    return list(items.values())
+
+
+def filter_scores(test_data: pd.DataFrame, results: dict[tuple, dict[str, Any]]) -> dict[str, Any]:
+    """Scores in the layout of course_name_categorizer.py: {pref: {course: [topic, validity, category]}}."""
+    scores = {}
+    for pref in filter_preferences(test_data):
+        scores[pref] = {}
+        for course, category in zip(test_data["Nazwa"], test_data["kategorie"]):
+            result = results.get(("Tematyka", pref, course))
+            if result is not None:
+                scores[pref][course] = [result[TOPIC_KEY], result[VALIDITY_KEY], category]
+    return scores
+
+
+def rank_scores(test_data: pd.DataFrame, results: dict[tuple, dict[str, Any]], seed: int = 0) -> dict[str, Any]:
+    """Scores in the layout of get_best_courses_concurrently_local_LLM.py: {feature: {pref: {pair: [s1, s2]}}}."""
+    scores: dict[str, Any] = {}
+    for (feature, pref), (pref_sample, contr_sample) in ranking_samples(test_data, seed).items():
+        pairs = scores.setdefault(feature, {}).setdefault(pref, {})
+        for n1, n2 in zip(pref_sample, contr_sample):
+            o1, o2 = results.get((feature, pref, n1)), results.get((feature, pref, n2))
+            if o1 is None or o2 is None:
+                continue  # Not evaluated yet
+            if o1['nazwa przedmiotu'] == 'Błąd' or o2['nazwa przedmiotu'] == 'Błąd':
+                pairs[n1 + "_" + n2] = 'błąd'
+            elif feature != "wszystkie":
+                key = RANKING_KEYS[feature]
+                pairs[n1 + "_" + n2] = [o1[key], o2[key]]
+            else:
+                for label, key in COMBINED_LABELS:
+                    pairs[f"{n1}_{n2}_{label}"] = [o1[key], o2[key]]
+    return scores
+
+
+def write_scores(task: str, scores: dict[str, Any], output_dir: str) -> list[Path]:
+    """
+    Zapisuje wyniki w układzie plików output/scores_*.json sterowników (czytanym przez notatniki Evaluation).
+
+    Parametry:
+        task (str): FILTER albo RANK.
+        scores (dict[str, Any]): Wynik filter_scores albo rank_scores.
+        output_dir (str): Katalog docelowy, np. Evaluation/filterting/output-gpt-4o-mini.
+    """
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    files = {"scores.json": scores}
+    for name, values in scores.items():
+        files[f"scores_{name}.json"] = values
+        if task == FILTER:
+            continue
+        for pref, pairs in values.items():
+            suffix = "mieszany" if pref == "mieszany: w sali i zdalnie" else pref.replace("/", "_")
+            files[f"scores_{name}_{suffix}.json"] = pairs
+
+    written = []
+    for filename, content in files.items():
+        with open(output_path / filename, "w", encoding="utf-8") as file:
+            json.dump(content, file, ensure_ascii=False, indent=2)
+        written.append(output_path / filename)
+    return written
+
+
+def load_journals(journal_dir: Path) -> dict[tuple, dict[str, Any]]:
+    """Merge every shard journal of a sweep into one key -> result mapping."""
+    results = {}
+    for path in sorted(journal_dir.glob("shard-*.jsonl")):
+        results.update(SweepJournal(str(path)).results())
+    return results
+
+
+def merge(task: str, test_data: pd.DataFrame, journal_dir: Path, output_dir: str, seed: int = 0) -> int:
+    """
+    Scala dzienniki wszystkich shardów i zapisuje pliki scores_*.json. Zwraca liczbę scalonych wyników.
+
+    Parametry:
+        task (str): FILTER albo RANK.
+        test_data (pd.DataFrame): Oznaczone kursy z oguny_unique1.csv.
+        journal_dir (Path): Katalog dzienników shardów.
+        output_dir (str): Katalog docelowy, np. Evaluation/filterting/output-gpt-4o-mini.
+        seed (int): Ziarno losowania par kursów w rankingu (to samo co w run).
+    """
+    results = load_journals(journal_dir)
+    scores = filter_scores(test_data, results) if task == FILTER else rank_scores(test_data, results, seed)
+    write_scores(task, scores, output_dir)
+    return len(results)
+
+
+def worker_argv(argv: list[str], index: int, count: int) -> list[str]:
+    """Command line of one local worker: the original arguments with --workers replaced by --shard."""
+    args = []
+    skip = False
+    for arg in argv:
+        if skip:
+            skip = False
+        elif arg in ("--workers", "--shard"):
+            skip = True
+        elif not arg.startswith(("--workers=", "--shard=")):
+            args.append(arg)
+    return [sys.executable, "-m", "common.grid_sweep", *args, "--shard", f"{index}/{count}"]
+
+
+def load_ranker_class(task: str, local: bool = False) -> type:
+    """Import CourseRanker from the filtering or ranking agents directory."""
+    if task == FILTER:
+        path = AGENTS_DIR / "filtering agents" / ("course_ranker_local.py" if local else "course_ranker.py")
+    else:
+        path = AGENTS_DIR / "ranking agents" / "course_ranker.py"
+    spec = importlib.util.spec_from_file_location(f"{task}_{path.stem}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.CourseRanker
+
+
+def run_shard(
+    task: str,
+    items: list[WorkItem],
+    journal_dir: Path,
+    shard: tuple[int, int],
+    courses_filename: str,
+    agent_kwargs: dict[str, Any],
+    concurrency: int = 8,
+    local: bool = False,
+) -> int:
+    """
+    Ocenia elementy siatki należące do sharda i dopisuje wyniki do jego dziennika.
+    Elementy obecne w dzienniku dowolnego sharda są pomijane. Zwraca liczbę ocenionych elementów.
+
+    Parametry:
+        task (str): FILTER albo RANK.
+        items (list[WorkItem]): Cała siatka z build_grid.
+        journal_dir (Path): Katalog dzienników shardów.
+        shard (tuple[int, int]): Numer sharda i liczba shardów.
+        courses_filename (str): Ścieżka do oguny.json.
+        agent_kwargs (dict[str, Any]): Argumenty CourseRanker (model_name, llm, cache, ...).
+        concurrency (int): Maksymalna liczba jednoczesnych zapytań.
+        local (bool): Czy użyć course_ranker_local (filtrowanie lokalnym modelem).
+    """
+    index, count = shard
+    done = load_journals(journal_dir)
+    journal = SweepJournal(str(journal_dir / f"shard-{index}-of-{count}.jsonl"))
+    todo = [item for item in items if item.shard(count) == index and item.key not in done]
+
+    ranker_class = load_ranker_class(task, local)
+    for (feature, pref), group in groupby(todo, key=lambda item: (item.feature, item.pref)):
+        group = list(group)
+        agent = ranker_class(group[0].survey, courses_filename, **agent_kwargs)
+        run_journaled(journal, (feature, pref), [item.course for item in group],
+                      partial(agent.run_many, concurrency=concurrency))
+        print(f"shard {index}/{count}: {feature} / {pref} - {len(group)} kursów")
+    return len(todo)
+
+
+if __name__ == "__main__":
+    # Run from the agents directory, e.g.:
+    #   python -m common.grid_sweep run filter --model gpt-4o-mini --shard 0/4
+    #   python -m common.grid_sweep run rank --fake-llm --workers 4
+    #   python -m common.grid_sweep run rank --model Qwen/Qwen2.5-7B-Instruct --base-url http://localhost:8000/v1
+    #   python -m common.grid_sweep merge rank --model gpt-4.1-nano --output-dir ../Evaluation/recomendations/output-gpt-4.1-nano
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Shardowany przebieg siatki ewaluacji (preferencje x kursy).")
+    parser.add_argument("command", choices=["list", "run", "merge"])
+    parser.add_argument("task", choices=[FILTER, RANK])
+    parser.add_argument("--model", default="gpt-4o-mini", help="Nazwa modelu litellm albo identyfikator HF z --local")
+    parser.add_argument("--label", default=None, help="Nazwa modelu w katalogu output-<label>; domyślnie --model")
+    parser.add_argument("--local", action="store_true", help="Lokalny model przez TransformersBackend")
+    parser.add_argument("--fake-llm", action="store_true", help="Deterministyczny StubBackend zamiast modelu")
+    parser.add_argument("--base-url", default=None,
+                        help="Serwer zgodny z OpenAI (np. vLLM) przez OpenAIHTTPBackend zamiast litellm")
+    parser.add_argument("--shard", default="0/1", help="Shard i/N przetwarzany przez ten proces")
+    parser.add_argument("--workers", type=int, default=0, help="Uruchom N lokalnych procesów (shardy 0..N-1) i scal")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rpm", type=float, default=None, help="Limit zapytań na minutę na proces")
+    parser.add_argument("--tpm", type=float, default=None, help="Limit tokenów na minutę na proces")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--courses-filename", default="oguny.json")
+    parser.add_argument("--test-data", default="oguny_unique1.csv")
+    parser.add_argument("--sweep-dir", default="sweeps", help="Katalog na dzienniki shardów")
+    parser.add_argument("--output-dir", default=None,
+                        help="Katalog scalonych wyników; domyślnie <sweep-dir>/<Evaluation dir>/output-<label>")
+    args = parser.parse_args()
+
+    label = args.label or ("stub" if args.fake_llm else args.model.split("/")[-1])
+    journal_dir = Path(args.sweep_dir) / EVALUATION_DIRS[args.task] / f"journal-{label}"
+    output_dir = args.output_dir or str(Path(args.sweep_dir) / EVALUATION_DIRS[args.task] / f"output-{label}")
+    test_data = pd.read_csv(args.test_data)
+    items = build_grid(args.task, test_data, args.seed)
+
+    if args.command == "list":
+        index, count = parse_shard(args.shard)
+        for item in items:
+            if item.shard(count) == index:
+                print("\t".join(item.key))
+
+    elif args.command == "run" and args.workers:
+        workers = [subprocess.Popen(worker_argv(sys.argv[1:], i, args.workers)) for i in range(args.workers)]
+        failed = [i for i, worker in enumerate(workers) if worker.wait() != 0]
+        if failed:
+            sys.exit(f"Shardy zakończone błędem: {failed}; uruchom ponownie, gotowe wyniki zostaną pominięte")
+        merged = merge(args.task, test_data, journal_dir, output_dir, args.seed)
+        print(f"Scalono {merged}/{len(items)} wyników do {output_dir}")
+        perf_paths = sorted(journal_dir.glob("perf-*.jsonl"))
+        if perf_paths:
+            print(summarize(PerfLog.load(perf_paths)).round(3).T.to_string())
+
+    elif args.command == "run":
+        agent_kwargs: dict[str, Any] = {"model_name": args.model}
+        if args.fake_llm:
+            agent_kwargs["llm"] = create_backend("stub", seed=args.seed)
+        elif args.local:
+            agent_kwargs["llm"] = create_backend("transformers", args.model, prefix_cache=True)
+        elif args.base_url:
+            agent_kwargs["llm"] = create_backend("openai", args.model, base_url=args.base_url)
+        if not args.local:
+            agent_kwargs["rate_limiter"] = RateLimiter(rpm=args.rpm, tpm=args.tpm, max_concurrency=args.concurrency)
+        if not args.fake_llm:
+            agent_kwargs["cache"] = ResponseCache(f"llm_cache_{args.model.replace('/', '_')}.sqlite")
+
+        shard = parse_shard(args.shard)
+        agent_kwargs["perf_log"] = PerfLog(str(journal_dir / "perf-{}-of-{}.jsonl".format(*shard)))
+
+        count = run_shard(args.task, items, journal_dir, shard, args.courses_filename,
+                          agent_kwargs, concurrency=args.concurrency, local=args.local)
+        print(f"Shard {args.shard}: oceniono {count} elementów")
+        if "rate_limiter" in agent_kwargs:
+            print("Rate limiter:", agent_kwargs["rate_limiter"].stats())
+
+    else:
+        merged = merge(args.task, test_data, journal_dir, output_dir, args.seed)
+        print(f"Scalono {merged}/{len(items)} wyników do {output_dir}")
+        perf_paths = sorted(journal_dir.glob("perf-*.jsonl"))
+        if perf_paths:
+            print(summarize(PerfLog.load(perf_paths)).round(3).T.to_string())
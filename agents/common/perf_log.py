@@ -0,0 +1,241 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+import pandas as pd
+
+from common.output_parser import STRICT, TOLERANT
+from common.rate_limit import estimate_tokens
+
+# USD per million (prompt, completion) tokens; models missing here (e.g. local ones) get no cost
+PRICES = {
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gemini/gemini-2.0-flash": (0.10, 0.40),
+}
+
+_current = threading.local()
+
+
+@dataclass
+class CallRecord:
+    """
+    Pomiary jednego wywołania modelu, zapisywane jako jedna linia dziennika wydajności.
+    Czasy są w sekundach. Liczby tokenów pochodzą od dostawcy (add_usage), a gdy ich nie podał
+    (np. cache, ucięty strumień, model lokalny), są szacowane z długości tekstu (estimate_tokens).
+    """
+
+    model: str
+    task: str
+    course: str
+    courses: int = 1
+    started: float = 0.0  # Unix time at which the call was queued
+    queue_wait: float = 0.0  # Until the last model request started: pool, executor, rate limiter, retries
+    first_token: Optional[float] = None  # From the model request to the first streamed chunk
+    latency: float = 0.0  # Of the last model request; the whole call for cache hits
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    parsed: Optional[str] = None  # Parse confidence (STRICT, TOLERANT, PARTIAL, FAILED)
+    cache_hit: bool = False
+    error: Optional[str] = None
+    tokens_estimated: bool = False  # Some token counts come from estimate_tokens, not from the provider
+
+    def model_call(self) -> None:
+        """Mark the start of a model request; a retried request restarts the latency clock."""
+        self._model_started = time.perf_counter()
+        self.first_token = None
+
+    def watch(self, chunks: Iterator[str]) -> Iterator[str]:
+        """Pass a response stream through, recording the time to its first non-empty chunk."""
+        try:
+            for chunk in chunks:
+                if chunk and self.first_token is None:
+                    self.first_token = time.perf_counter() - getattr(self, "_model_started", time.perf_counter())
+                yield chunk
+        finally:
+            close = getattr(chunks, "close", None)
+            if callable(close):
+                close()
+
+    def add_usage(self, prompt_tokens: int, completion_tokens: int) -> None:
+        """Add the token counts the provider reported for a model request; count_tokens then keeps them."""
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self._usage_reported = True
+
+    def count_tokens(self, prompt: str, output: str) -> None:
+        # Added up, since a call may send several prompts (e.g. one per ranking dimension)
+        if getattr(self, "_usage_reported", False):
+            self._usage_reported = False
+            return
+        self.prompt_tokens += estimate_tokens(prompt)
+        self.completion_tokens += estimate_tokens(output)
+        self.tokens_estimated = True
+
+
+class PerfLog:
+    """
+    Dziennik JSONL pomiarów wywołań modelu (CallRecord), współdzielony przez agentów i wątki.
+    Podsumowanie: python -m common.perf_log output/perf_*.jsonl
+    """
+
+    def __init__(self, path: str):
+        """
+        Parametry:
+            path (str): Ścieżka do pliku .jsonl; nowe rekordy są dopisywane na końcu.
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def append(self, record: CallRecord) -> None:
+        line = json.dumps(asdict(record), ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write(line)
+
+    @staticmethod
+    def load(paths: Iterable[str]) -> pd.DataFrame:
+        """All records from the given log files as one data frame (lines cut short are skipped)."""
+        rows = []
+        for path in paths:
+            with open(path, encoding="utf-8", errors="replace") as file:
+                for line in file:
+                    try:
+                        rows.append(json.loads(line))
+                    except ValueError:
+                        continue
+        return pd.DataFrame(rows, columns=list(CallRecord.__dataclass_fields__))
+
+
+def current_record() -> CallRecord:
+    """The record of the call running in this thread, or a detached one outside record_call."""
+    record = getattr(_current, "record", None)
+    return record if record is not None else CallRecord(model="", task="", course="")
+
+
+@contextmanager
+def record_call(
+    log: Optional[PerfLog],
+    model: str,
+    task: str,
+    course: str,
+    courses: int = 1,
+    queued_at: Optional[float] = None,
+) -> Iterator[CallRecord]:
+    """
+    Mierzy wywołanie modelu wykonywane w bloku with i dopisuje jego rekord do dziennika (jeśli podano).
+    Kod wywołujący model uzupełnia rekord przez current_record(): model_call, watch, count_tokens.
+    Wywołanie, które nie doszło do model_call, jest liczone jako trafienie w cache.
+
+    Parametry:
+        log (PerfLog | None): Dziennik; None oznacza pomiar bez zapisu.
+        model (str): Nazwa modelu.
+        task (str): Zadanie agenta, np. "filter" albo "rank".
+        course (str): Nazwa ocenianego kursu (pierwszego w partii).
+        courses (int): Liczba kursów ocenianych w wywołaniu.
+        queued_at (float | None): Chwila zlecenia wywołania (time.perf_counter); domyślnie wejście do bloku.
+    """
+    opened = time.perf_counter()
+    queued_at = opened if queued_at is None else queued_at
+    record = CallRecord(model=model, task=task, course=course, courses=courses,
+                        started=time.time() - (opened - queued_at))
+    _current.record = record
+    try:
+        yield record
+    except Exception as exc:
+        record.error = repr(exc)
+        raise
+    finally:
+        _current.record = None
+        finished = time.perf_counter()
+        model_started = getattr(record, "_model_started", None)
+        if model_started is None:
+            record.cache_hit = record.error is None
+            model_started = opened
+        record.queue_wait = model_started - queued_at
+        record.latency = finished - model_started
+        if log is not None:
+            log.append(record)
+
+
+def summarize(records: pd.DataFrame, prices: Optional[dict[str, tuple[float, float]]] = None) -> pd.DataFrame:
+    """
+    Podsumowuje dziennik wydajności dla każdej pary (model, zadanie): percentyle opóźnień wywołań modelu,
+    przepustowość w kursach na sekundę czasu ściennego, tokeny na kurs, udział trafień w cache
+    i poprawnie sparsowanych odpowiedzi oraz koszt (tylko wywołania spoza cache). Koszt jest dokładny
+    tylko wtedy, gdy "estimated tokens %" (udział wywołań z szacowanymi tokenami) wynosi 0.
+
+    Parametry:
+        records (pd.DataFrame): Rekordy z PerfLog.load.
+        prices (dict | None): Ceny USD za milion tokenów (prompt, odpowiedź) według modelu; domyślnie PRICES.
+    """
+    prices = PRICES if prices is None else prices
+    records = records.assign(
+        finished=records["started"] + records["queue_wait"] + records["latency"],
+        called=~records["cache_hit"].astype(bool) & records["error"].isna(),
+        parsed_ok=records["parsed"].isin([STRICT, TOLERANT]),
+        # Logs written before provider usage was recorded have only estimates
+        tokens_estimated=records["tokens_estimated"].astype("boolean").fillna(True).astype(bool),
+    )
+    rows = []
+    for (model, task), group in records.groupby(["model", "task"], sort=True):
+        called = group[group["called"]]
+        courses = group["courses"].sum()
+        price_in, price_out = prices.get(model, (float("nan"), float("nan")))
+        cost = (called["prompt_tokens"].sum() * price_in + called["completion_tokens"].sum() * price_out) / 1e6
+        wall = group["finished"].max() - group["started"].min()
+        rows.append({
+            "model": model,
+            "task": task,
+            "calls": len(group),
+            "courses": courses,
+            "errors": int(group["error"].notna().sum()),
+            "cache hit %": 100 * group["cache_hit"].astype(bool).mean(),
+            "parsed %": 100 * group.loc[group["error"].isna(), "parsed_ok"].mean(),
+            "latency p50": called["latency"].quantile(0.50),
+            "latency p95": called["latency"].quantile(0.95),
+            "latency p99": called["latency"].quantile(0.99),
+            "first token p50": called["first_token"].dropna().quantile(0.50),
+            "queue wait p50": group["queue_wait"].quantile(0.50),
+            "courses/s": courses / wall if wall > 0 else float("nan"),
+            "prompt tokens/course": group["prompt_tokens"].sum() / courses,
+            "completion tokens/course": group["completion_tokens"].sum() / courses,
+            "estimated tokens %": 100 * called["tokens_estimated"].mean(),
+            "cost USD": cost,
+            "USD/1000 courses": 1000 * cost / courses,
+        })
+    return pd.DataFrame(rows).set_index(["model", "task"])
+
+
+if __name__ == "__main__":
+    # Run from the agents directory, e.g.:
+    #   python -m common.perf_log "ranking agents/output/perf_gpt-4.1-nano.jsonl" "ranking agents/output/perf_Bielik.jsonl"
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Podsumowanie dzienników wydajności wywołań modelu.")
+    parser.add_argument("paths", nargs="+", help="Pliki perf_*.jsonl")
+    parser.add_argument("--price", action="append", default=[], metavar="MODEL=IN,OUT",
+                        help="Cena USD za milion tokenów promptu i odpowiedzi, np. Bielik=0,0")
+    parser.add_argument("--csv", default=None, help="Zapisz podsumowanie także do pliku CSV")
+    args = parser.parse_args()
+
+    prices = dict(PRICES)
+    for price in args.price:
+        model, _, values = price.rpartition("=")
+        prices[model] = tuple(float(value) for value in values.split(","))
+
+    summary = summarize(PerfLog.load(args.paths), prices).round(3)
+    print(summary.T.to_string())
+    if (summary["estimated tokens %"] > 0).any():
+        print("\nTokens and costs of calls without provider usage are estimated from the text length "
+              "(see 'estimated tokens %').")
+    if args.csv:
+        summary.to_csv(args.csv)
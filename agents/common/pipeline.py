@@ -0,0 +1,395 @@
+import heapq
+import importlib.util
+import queue
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
+
+from common.batch import AgentPool
+from common.course_catalog import CourseCatalog
+from common.embedding_index import DEFAULT_TOP_K, EmbeddingIndex
+from common.structured_scorer import ASSESSMENT_KEY, MODE_KEY, StructuredScorer
+from common.survey import ASSESSMENT_PREFERENCE, MODE_PREFERENCE, NO_PREFERENCE, canonical_survey
+from common.topic_labels import TOPIC_KEY
+
+AGENTS_DIR = Path(__file__).resolve().parent.parent
+
+TOPIC_SCORE = 'zgodność tematyki zajęć'
+# A course with the highest filter score cannot be outranked, so it goes to ranking while filtering still runs
+MAX_FILTER_SCORE = 10
+# Dimensions scored by the ranking agent; the recommendation score is their weighted mean
+RANK_KEYS = (
+    'zgodność tematyki zajęć',
+    'zgodność trybu prowadzenia zajęć',
+    'zgodność rodzaju zaliczenia',
+)
+
+
+def load_course_ranker(directory: str) -> type:
+    """
+    Importuje klasę CourseRanker z katalogu agentów (np. "filtering agents") pod unikalną nazwą modułu,
+    bo agenci filtrujący i rankingowi mają plik o tej samej nazwie (course_ranker.py).
+
+    Parametry:
+        directory (str): Katalog w agents/ z plikiem course_ranker.py.
+    """
+    module_name = f"{directory.replace(' ', '_')}_course_ranker"
+    if module_name not in sys.modules:
+        spec = importlib.util.spec_from_file_location(module_name, AGENTS_DIR / directory / "course_ranker.py")
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        spec.loader.exec_module(module)
+    return sys.modules[module_name].CourseRanker
+
+
+def has_preference(value: Any) -> bool:
+    return value is not None and not re.search(NO_PREFERENCE, str(value).lower())
+
+
+def is_error(result: Any) -> bool:
+    return not isinstance(result, dict) or result.get('nazwa przedmiotu') == 'Błąd'
+
+
+class Stage:
+    """
+    Etap rekomendacji: kursy oceniane na agentach z puli w osobnej puli wątków, a wyniki
+    (etap, nazwa kursu, wynik) trafiają do wspólnej kolejki zdarzeń potoku w kolejności ukończenia.
+    Po zatrzymaniu oceny jeszcze nierozpoczęte są anulowane, a wyniki wywołań już trwających pomijane.
+    """
+
+    def __init__(self, name: str, agent: Any, events: queue.Queue, concurrency: int = 8):
+        """
+        Parametry:
+            name (str): Nazwa etapu w zdarzeniach, np. "filter".
+            agent: Agent filtrujący albo rankingowy (CourseRanker) z danymi ankiety.
+            events (queue.Queue): Kolejka zdarzeń potoku.
+            concurrency (int): Maksymalna liczba jednoczesnych zapytań.
+        """
+        self.name = name
+        self.agent = agent
+        self.events = events
+        self.pool = AgentPool(agent.spawn, agents=[agent])
+        self.submitted = 0
+        self.finished = 0
+        self.started: Optional[float] = None
+        self.stopped = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, concurrency))
+
+    @property
+    def running(self) -> bool:
+        return self.finished < self.submitted and not self.stopped.is_set()
+
+    def submit(self, course_name: str) -> None:
+        if self.started is None:
+            self.started = time.perf_counter()
+        self.submitted += 1
+        self._executor.submit(self._score, course_name, time.perf_counter())
+
+    def _score(self, course_name: str, queued_at: float) -> None:
+        if self.stopped.is_set():
+            return
+        try:
+            result = self.pool.run(course_name, queued_at=queued_at)
+        except Exception as exc:
+            result = self.agent.error_result(course_name, exc)
+        if not self.stopped.is_set():
+            self.events.put((self.name, course_name, result))
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+@dataclass
+class PipelineUpdate:
+    """Stan rekomendacji po kolejnym wyniku: etap, liczniki i bieżąca lista najlepszych kursów."""
+
+    stage: str  # "filter", "rank" or "done"
+    elapsed: float
+    filtered: int = 0  # Courses scored by the filtering stage
+    candidates: int = 0  # Courses passed on to the ranking stage
+    ranked: int = 0  # Courses scored by the ranking stage
+    top: list[dict[str, Any]] = field(default_factory=list)
+    timed_out: list[str] = field(default_factory=list)  # Stages cut short by their timeout
+    stage_seconds: dict[str, float] = field(default_factory=dict)
+
+    def snapshot(self) -> "PipelineUpdate":
+        """A copy that later updates of the running pipeline do not change."""
+        return replace(self, top=list(self.top), timed_out=list(self.timed_out),
+                       stage_seconds=dict(self.stage_seconds))
+
+
+class RecommendationPipeline:
+    """
+    Rekomendacja kursów dla ankiety studenta w dwóch etapach: tani agent filtrujący ocenia nazwy
+    wszystkich kursów katalogu pod kątem preferowanej tematyki, a agent rankingowy ocenia szczegółowo
+    najlepiej ocenione z nich. Oba etapy działają równolegle na puli agentów i mają własne limity
+    czasu oraz wspólny budżet opóźnienia całej rekomendacji; po ich przekroczeniu wynik powstaje
+    z ocen gotowych do tej chwili. Wyniki częściowe są udostępniane strumieniowo (stream).
+    """
+
+    def __init__(
+        self,
+        filter_agent: Callable[[dict[str, Any]], Any],
+        rank_agent: Callable[[dict[str, Any]], Any],
+        courses_filename: str,
+        top_n: int = 10,
+        filter_threshold: float = 5,
+        max_candidates: int = 40,
+        filter_timeout: float = 20.0,
+        rank_timeout: float = 60.0,
+        latency_budget: float = 75.0,
+        concurrency: int = 8,
+        weights: Optional[dict[str, float]] = None,
+        update_interval: float = 0.25,
+        structured_scorer: Optional[StructuredScorer] = None,
+        embedding_index: Optional[EmbeddingIndex] = None,
+        embedding_top_k: int = DEFAULT_TOP_K,
+    ):
+        """
+        Parametry:
+            filter_agent (Callable): Tworzy agenta filtrującego dla ankiety {TOPIC_KEY: tematyka}.
+            rank_agent (Callable): Tworzy agenta rankingowego dla pełnej ankiety.
+            courses_filename (str): Ścieżka do pliku z metadanymi kursów.
+            top_n (int): Liczba rekomendowanych kursów.
+            filter_threshold (float): Minimalna ocena tematyki (0-10), z którą kurs przechodzi do rankingu.
+            max_candidates (int): Najwyżej tylu najlepiej ocenionych przez filtr kursów trafia do rankingu.
+            filter_timeout (float): Limit czasu etapu filtrowania w sekundach.
+            rank_timeout (float): Limit czasu etapu rankingu w sekundach, liczony od przekazania pierwszego kursu.
+            latency_budget (float): Limit czasu całej rekomendacji w sekundach; skraca etap rankingu.
+            concurrency (int): Maksymalna liczba jednoczesnych zapytań w każdym etapie.
+            weights (dict[str, float] | None): Wagi wymiarów RANK_KEYS w ocenie końcowej; domyślnie równe.
+            update_interval (float): Najmniejszy odstęp w sekundach między wynikami częściowymi etapu filtrowania.
+            structured_scorer (StructuredScorer | None): Oceny trybu i rodzaju zaliczenia z reguł, według których
+                wybierane są kursy do rankingu dla ankiety bez preferowanej tematyki; domyślnie tworzony
+                z courses_filename przy pierwszej takiej ankiecie.
+            embedding_index (EmbeddingIndex | None): Opcjonalny indeks wektorowy kursów; gdy podany, agent
+                filtrujący ocenia tylko embedding_top_k kursów najbliższych preferowanej tematyce
+                (EmbeddingIndex.candidates) oraz kursy katalogu, których indeks jeszcze nie zawiera.
+                Z HashingEmbedder i DEFAULT_TOP_K to nadal 43% katalogu.
+            embedding_top_k (int): Liczba kandydatów z indeksu (benchmarks/bench_embedding_recall.py).
+        """
+        self.filter_agent = filter_agent
+        self.rank_agent = rank_agent
+        self.courses_filename = courses_filename
+        self.catalog = CourseCatalog.load(courses_filename)
+        self.top_n = top_n
+        self.filter_threshold = filter_threshold
+        self.max_candidates = max_candidates
+        self.filter_timeout = filter_timeout
+        self.rank_timeout = rank_timeout
+        self.latency_budget = latency_budget
+        self.concurrency = concurrency
+        self.weights = dict(weights) if weights is not None else {key: 1.0 for key in RANK_KEYS}
+        self.update_interval = update_interval
+        self.structured_scorer = structured_scorer
+        self.embedding_index = embedding_index
+        self.embedding_top_k = embedding_top_k
+
+    def overall_score(self, result: dict[str, Any]) -> Optional[float]:
+        """Weighted mean of the ranking scores present in a result, or None without any."""
+        scored = [(self.weights[key], result[key]) for key in self.weights
+                  if isinstance(result.get(key), (int, float)) and result[key] >= 0]
+        total = sum(weight for weight, _ in scored)
+        if not total:
+            return None
+        return sum(weight * score for weight, score in scored) / total
+
+    def top(self, ranked: dict[str, dict[str, Any]], filter_scores: dict[str, float]) -> list[dict[str, Any]]:
+        """The current top-N rows: course, recommendation score, dimension scores and filter score."""
+        rows = []
+        for course_name, result in ranked.items():
+            score = self.overall_score(result)
+            if score is None:
+                continue
+            rows.append({'nazwa przedmiotu': course_name,
+                         'ocena': round(score, 2),
+                         **{key: result.get(key) for key in RANK_KEYS},
+                         'ocena filtra': filter_scores.get(course_name)})
+        rows.sort(key=lambda row: (-row['ocena'], -(row['ocena filtra'] or 0), row['nazwa przedmiotu']))
+        return rows[:self.top_n]
+
+    def filter_candidates(self, survey_data: dict[str, Any], names: list[str]) -> list[str]:
+        """
+        Kursy oceniane przez agenta filtrującego: cały katalog albo, z embedding_index, kandydaci z indeksu
+        i kursy, których indeks nie zawiera (np. dodane po jego zbudowaniu), w kolejności katalogu.
+
+        Parametry:
+            survey_data (dict[str, Any]): Kanoniczne dane z ankiety studenta.
+            names (list[str]): Nazwy kursów katalogu.
+        """
+        if self.embedding_index is None:
+            return names
+        indexed = {course["Nazwa przedmiotu"] for course in self.embedding_index.courses}
+        candidates = set(self.embedding_index.candidates(survey_data, self.embedding_top_k))
+        return [name for name in names if name in candidates or name not in indexed]
+
+    def rule_candidates(self, survey_data: dict[str, Any], names: list[str]) -> list[str]:
+        """
+        Kursy do rankingu dla ankiety bez preferowanej tematyki, od najlepiej dopasowanych: według średniej
+        ocen z reguł (StructuredScorer; brak danych liczy się jako 5) w wymiarach, w których ankieta
+        ma preferencję (tryb prowadzenia, rodzaj zaliczenia).
+        Zwraca najwyżej max_candidates kursów; przy równych ocenach decyduje kolejność katalogu, tak jak
+        przy ocenach filtra w stream. Ankieta bez żadnych preferencji daje pierwsze max_candidates kursów katalogu.
+
+        Parametry:
+            survey_data (dict[str, Any]): Kanoniczne dane z ankiety studenta.
+            names (list[str]): Nazwy kursów katalogu.
+        """
+        keys = [key for key, preference in ((MODE_KEY, MODE_PREFERENCE), (ASSESSMENT_KEY, ASSESSMENT_PREFERENCE))
+                if has_preference(survey_data.get(preference))]
+        if not keys:
+            return names[:self.max_candidates]
+        if self.structured_scorer is None:
+            self.structured_scorer = StructuredScorer(self.courses_filename)
+        scores = self.structured_scorer.score(survey_data)[keys].reindex(names).fillna(5).mean(axis=1)
+        # Stable sort: ties keep the catalog order
+        scores = scores.sort_values(ascending=False, kind="stable")
+        return list(scores.index[:self.max_candidates])
+
+    def stream(self, survey_data: dict[str, Any]) -> Iterator[PipelineUpdate]:
+        """
+        Uruchamia rekomendację i zwraca kolejne stany: postęp filtrowania, bieżącą listę najlepszych
+        kursów po każdym wyniku rankingu i stan końcowy (stage == "done"). Do rankingu trafia
+        max_candidates kursów z najwyższą oceną filtra (nie niższą niż filter_threshold; przy równych
+        ocenach decyduje kolejność katalogu), wybranych po zakończeniu filtrowania albo po jego limicie czasu.
+        Kursy z oceną MAX_FILTER_SCORE trafiają do rankingu od razu, więc pierwsze rekomendacje mogą pojawić
+        się jeszcze w trakcie filtrowania. Bez preferowanej tematyki kursy wybiera rule_candidates.
+
+        Parametry:
+            survey_data (dict[str, Any]): Dane z ankiety studenta (np. z app/survey_gradio.py).
+        """
+        start = time.perf_counter()
+        deadline = start + self.latency_budget
+        survey_data = canonical_survey(survey_data)
+        update = PipelineUpdate(stage="filter", elapsed=0.0)
+        events: queue.Queue = queue.Queue()
+        names = list(dict.fromkeys(self.catalog.names()))
+        positions = {course_name: i for i, course_name in enumerate(names)}
+        filter_scores: dict[str, float] = {}
+        ranked: dict[str, dict[str, Any]] = {}
+        # The best filtered courses waiting for the end of filtering: a min-heap of
+        # (score, -catalog position, course), so that the worst one is evicted first
+        waiting: list[tuple[float, int, str]] = []
+        last_update = 0.0
+
+        rank_stage = Stage("rank", self.rank_agent(survey_data), events, self.concurrency)
+
+        def rank(course_name: str) -> None:
+            rank_stage.submit(course_name)
+            update.candidates += 1
+
+        def wait_for_ranking(course_name: str, score: float) -> None:
+            room = self.max_candidates - rank_stage.submitted
+            entry = (score, -positions[course_name], course_name)
+            if len(waiting) < room:
+                heapq.heappush(waiting, entry)
+            elif waiting and entry > waiting[0]:
+                heapq.heapreplace(waiting, entry)
+
+        def stage_done(stage: Stage) -> None:
+            update.stage_seconds[stage.name] = time.perf_counter() - (stage.started or start)
+
+        def filtering_done() -> None:
+            # The best courses of the filtered ones (all or those scored before the timeout) go to ranking
+            stage_done(filter_stage)
+            for _, _, course_name in sorted(waiting, reverse=True)[:self.max_candidates - rank_stage.submitted]:
+                rank(course_name)
+            waiting.clear()
+
+        filter_stage = None
+        topic = survey_data.get(TOPIC_KEY)
+        if has_preference(topic):
+            filter_stage = Stage("filter", self.filter_agent({TOPIC_KEY: topic}), events, self.concurrency)
+            for course_name in self.filter_candidates(survey_data, names):
+                filter_stage.submit(course_name)
+        else:
+            # Without a topic preference there is nothing to filter by
+            for course_name in self.rule_candidates(survey_data, names):
+                rank(course_name)
+        filter_deadline = min(start + self.filter_timeout, deadline)
+
+        try:
+            while True:
+                now = time.perf_counter()
+                filtering = filter_stage is not None and filter_stage.running
+                if filtering and now >= filter_deadline:
+                    filter_stage.stop()
+                    update.timed_out.append("filter")
+                    filtering_done()
+                    continue
+                rank_deadline = min((rank_stage.started or now) + self.rank_timeout, deadline)
+                if rank_stage.running and now >= rank_deadline:
+                    # The recommendation is due, so unfinished filtering is cut short as well
+                    update.timed_out += ["filter", "rank"] if filtering else ["rank"]
+                    if filtering:
+                        stage_done(filter_stage)
+                    break
+                if not filtering and not rank_stage.running:
+                    break
+
+                update.stage = "filter" if filtering else "rank"
+                wait = min(filter_deadline if filtering else deadline,
+                           rank_deadline if rank_stage.running else deadline) - now
+                try:
+                    stage, course_name, result = events.get(timeout=max(0.0, wait))
+                except queue.Empty:
+                    continue
+                update.elapsed = time.perf_counter() - start
+
+                if stage == "filter":
+                    if filter_stage.stopped.is_set():
+                        continue
+                    filter_stage.finished += 1
+                    update.filtered += 1
+                    score = result.get(TOPIC_SCORE) if not is_error(result) else None
+                    if isinstance(score, (int, float)):
+                        filter_scores[course_name] = score
+                        if score >= MAX_FILTER_SCORE and rank_stage.submitted < self.max_candidates:
+                            rank(course_name)
+                            while len(waiting) > self.max_candidates - rank_stage.submitted:
+                                heapq.heappop(waiting)
+                        elif score >= self.filter_threshold:
+                            wait_for_ranking(course_name, score)
+                    if rank_stage.submitted >= self.max_candidates and filter_stage.running:
+                        filter_stage.stop()  # No further course could reach the ranking
+                    if not filter_stage.running:
+                        filtering_done()
+                    if update.elapsed - last_update >= self.update_interval:
+                        last_update = update.elapsed
+                        yield update.snapshot()
+                elif not rank_stage.stopped.is_set():
+                    rank_stage.finished += 1
+                    update.ranked += 1
+                    if not is_error(result):
+                        ranked[course_name] = result
+                    update.top = self.top(ranked, filter_scores)
+                    last_update = update.elapsed
+                    yield update.snapshot()
+        finally:
+            for stage in (filter_stage, rank_stage):
+                if stage is not None:
+                    stage.stop()
+
+        if rank_stage.started is not None:
+            stage_done(rank_stage)
+        update.stage = "done"
+        update.elapsed = time.perf_counter() - start
+        yield update.snapshot()
+
+    def run(self, survey_data: dict[str, Any]) -> PipelineUpdate:
+        """
+        Zwraca końcowy stan rekomendacji (lista top w update.top).
+
+        Parametry:
+            survey_data (dict[str, Any]): Dane z ankiety studenta.
+        """
+        update = None
+        for update in self.stream(survey_data):
+            pass
+        return update
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import re
+from collections import Counter
+from typing import Optional
+
+from common.rate_limit import estimate_tokens
+
+# Token budget of every field pasted into the ranking prompt; fields missing here are left out
+FIELD_BUDGETS = {
+    "Tryb prowadzenia": 16,
+    "Skrócony opis": 120,
+    "Pełny opis": 250,
+    "Efekty uczenia się": 150,
+    "Metody i kryteria oceniania": 120,
+}
+
+# Bump when the compaction rules change, so that cached compact catalogs are rebuilt
+COMPACTION_VERSION = 1
+
+WHITESPACE_RUN = re.compile(r"[ \t\r\f\v ]+")
+SENTENCE_END = re.compile(r"(?<=[.!?;])\s+")
+
+
+def normalize_whitespace(text: str) -> str:
+    """Collapse runs of spaces, strip every line and drop empty lines."""
+    lines = (WHITESPACE_RUN.sub(" ", line).strip() for line in str(text).splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def truncate_to_budget(text: str, budget: int) -> str:
+    """Cut text to about budget tokens, at the last sentence (or word) end that fits, marking the cut with '…'."""
+    if estimate_tokens(text) <= budget:
+        return text
+    limit = max(1, budget * 4)
+    head = text[:limit]
+    cut = max(head.rfind(". "), head.rfind(".\n"), head.rfind("\n"))
+    if cut < limit // 2:
+        cut = head.rfind(" ")
+    return (head[:cut + 1] if cut > 0 else head).rstrip() + "…"
+
+
+class PromptCompactor:
+    """
+    Buduje zwięzłą wersję opisu kursu do promptu: normalizuje białe znaki, usuwa szablonowe
+    linie USOS powtarzające się w wielu kursach (nagłówki "Wiedza:", zasady obecności itp.)
+    z pól, w których jest też inna treść, pomija zdania powtórzone z wcześniejszego pola
+    i przycina każde pole do budżetu tokenów.
+    """
+
+    def __init__(self, budgets: Optional[dict[str, int]] = None, min_repeats: int = 10):
+        """
+        Parametry:
+            budgets (dict[str, int] | None): Budżet tokenów na pole, w kolejności pól w prompcie;
+                domyślnie FIELD_BUDGETS.
+            min_repeats (int): Linia występująca w co najmniej tylu kursach jest traktowana jako szablonowa.
+        """
+        self.budgets = dict(FIELD_BUDGETS if budgets is None else budgets)
+        self.min_repeats = min_repeats
+
+    def settings_key(self) -> str:
+        """Short hash of the compaction settings, part of the compact catalog cache key."""
+        settings = json.dumps([COMPACTION_VERSION, self.budgets, self.min_repeats], ensure_ascii=False)
+        return hashlib.sha1(settings.encode("utf-8")).hexdigest()[:12]
+
+    def boilerplate(self, records: list[dict[str, str]]) -> set[str]:
+        """Normalized lines that occur in at least min_repeats different courses."""
+        counts: Counter = Counter()
+        for record in records:
+            lines = set()
+            for field in self.budgets:
+                if field in record:
+                    lines.update(normalize_whitespace(record[field]).split("\n"))
+            counts.update(lines)
+        return {line for line, count in counts.items() if count >= self.min_repeats}
+
+    def compact_record(self, record: dict[str, str], boilerplate: set[str] = frozenset()) -> dict[str, str]:
+        """
+        Zwraca zwięzły rekord kursu: nazwę i pola z budżetem, bez pól pustych po oczyszczeniu.
+
+        Parametry:
+            record (dict[str, str]): Rekord z CourseCatalog.
+            boilerplate (set[str]): Linie szablonowe z boilerplate().
+        """
+        compact = {"Nazwa przedmiotu": record["Nazwa przedmiotu"]}
+        seen: set[str] = set()
+        for field, budget in self.budgets.items():
+            if field not in record or record[field] is None:
+                continue
+            lines = []
+            text_lines = normalize_whitespace(record[field]).split("\n")
+            # A field made only of common lines is a value shared by many courses ("w sali"), not boilerplate
+            if all(line in boilerplate for line in text_lines):
+                boilerplate_here = frozenset()
+            else:
+                boilerplate_here = boilerplate
+            for line in text_lines:
+                if line in boilerplate_here:
+                    continue
+                # Short sentences ("Egzamin.") may legitimately repeat; long ones are text copied between fields
+                sentences = [sentence for sentence in SENTENCE_END.split(line)
+                             if len(sentence) <= 40 or sentence.lower() not in seen]
+                if sentences:
+                    lines.append(" ".join(sentences))
+            text = truncate_to_budget("\n".join(lines), budget)
+            if text:
+                compact[field] = text
+                # Only sentences that made it into the prompt count as already said
+                seen.update(sentence.lower() for line in text.split("\n") for sentence in SENTENCE_END.split(line))
+        return compact
+
+    def compact_all(
+        self,
+        records: dict[str, dict[str, str]],
+        previous: Optional[tuple[dict[str, dict[str, str]], dict[str, dict[str, str]]]] = None,
+    ) -> dict[str, dict[str, str]]:
+        """
+        Kompaktuje wszystkie rekordy katalogu (klucz -> rekord), z liniami szablonowymi wyznaczonymi
+        na całym katalogu.
+
+        Parametry:
+            records (dict[str, dict[str, str]]): Rekordy z CourseCatalog według klucza katalogu.
+            previous (tuple | None): (rekordy, zwięzłe rekordy) poprzedniej wersji katalogu; jeśli linie
+                szablonowe się nie zmieniły, zwięzłe rekordy niezmienionych kursów są przepisywane.
+        """
+        boilerplate = self.boilerplate(list(records.values()))
+        reused = {}
+        if previous is not None:
+            previous_records, previous_compact = previous
+            if self.boilerplate(list(previous_records.values())) == boilerplate:
+                reused = {key: previous_compact[key] for key, record in records.items()
+                          if key in previous_compact and previous_records.get(key) == record}
+        return {key: reused[key] if key in reused else self.compact_record(record, boilerplate)
+                for key, record in records.items()}
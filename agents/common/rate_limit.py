@@ -0,0 +1,224 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Optional
+
+# HTTP statuses worth retrying: rate limits, timeouts and transient server errors
+RETRYABLE_STATUSES = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+# Exception class names (anywhere in the MRO) of timeouts and dropped connections in requests, httpx, openai and litellm
+RETRYABLE_NAMES = {"Timeout", "TimeoutException", "APITimeoutError", "ConnectionError", "APIConnectionError",
+                   "ServiceUnavailableError", "InternalServerError"}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of Polish text (about 4 characters per token), enough for TPM budgeting."""
+    return len(text) // 4 + 1
+
+
+def parse_retry_after(value: Any) -> Optional[float]:
+    """Seconds from a Retry-After value: a number of seconds or an HTTP date."""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(str(value)).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def classify_error(exc: BaseException) -> tuple[bool, bool, Optional[float]]:
+    """
+    Rozpoznaje błąd dostawcy na całym łańcuchu wyjątków (swarms opakowuje błąd modelu w AgentLLMError).
+    Zwraca (czy ponowić, czy to limit zapytań 429, zalecane opóźnienie z Retry-After w sekundach).
+
+    Parametry:
+        exc (BaseException): Wyjątek zgłoszony przez wywołanie modelu.
+    """
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        response = getattr(exc, "response", None)
+        status = getattr(exc, "status_code", None) or getattr(response, "status_code", None)
+        headers = getattr(response, "headers", None) or {}
+        retry_after = getattr(exc, "retry_after", None)
+        if retry_after is None and "retry-after-ms" in headers:
+            retry_after = parse_retry_after(headers["retry-after-ms"])
+            retry_after = None if retry_after is None else retry_after / 1000
+        if retry_after is None:
+            retry_after = parse_retry_after(headers.get("retry-after"))
+
+        if status in RETRYABLE_STATUSES:
+            return True, status == 429, retry_after
+        if isinstance(exc, TimeoutError) or RETRYABLE_NAMES & {cls.__name__ for cls in type(exc).__mro__}:
+            return True, False, retry_after
+        exc = exc.__cause__ or exc.__context__
+    return False, False, None
+
+
+class TokenBucket:
+    """
+    Kubełek tokenów uzupełniany ze stałą szybkością (limit na minutę). Pobranie większej liczby
+    tokenów niż dostępna rezerwuje je z wyprzedzeniem i zwraca czas oczekiwania, więc kolejne
+    wywołania ustawiają się w kolejce w kolejności zgłoszeń.
+    """
+
+    def __init__(self, per_minute: float, burst_seconds: float = 1.0):
+        """
+        Parametry:
+            per_minute (float): Limit na minutę (zapytań albo tokenów).
+            burst_seconds (float): Pojemność kubełka wyrażona w sekundach limitu (dopuszczalny zryw).
+        """
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """Take amount tokens and return how many seconds to wait before using them."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            return max(0.0, -self._tokens / self.rate)
+
+
+class RateLimiter:
+    """
+    Harmonogram wywołań modelu po stronie klienta, współdzielony przez wszystkich agentów i wątki:
+    limity zapytań i tokenów na minutę (kubełki tokenów), ponawianie z wykładniczym opóźnieniem
+    i losowym rozrzutem, obsługa Retry-After oraz liczba równoległych zapytań dostosowywana do
+    odpowiedzi 429 (zmniejszana o połowę po 429, zwiększana stopniowo po udanych wywołaniach).
+    """
+
+    def __init__(
+        self,
+        rpm: Optional[float] = None,
+        tpm: Optional[float] = None,
+        max_concurrency: int = 8,
+        min_concurrency: int = 1,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        seed: Optional[int] = None,
+    ):
+        """
+        Parametry:
+            rpm (float | None): Limit zapytań na minutę; None oznacza brak limitu.
+            tpm (float | None): Limit tokenów (prompt + limit odpowiedzi) na minutę; None oznacza brak limitu.
+            max_concurrency (int): Górna granica liczby równoległych zapytań.
+            min_concurrency (int): Dolna granica, do której 429 mogą zmniejszyć równoległość.
+            max_retries (int): Liczba ponowień po błędach przejściowych, po której wyjątek jest przekazywany dalej.
+            base_delay (float): Opóźnienie pierwszego ponowienia w sekundach, podwajane przy kolejnych.
+            max_delay (float): Górna granica pojedynczego opóźnienia w sekundach.
+            seed (int | None): Ziarno losowego rozrzutu opóźnień.
+        """
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min(min_concurrency, max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._random = random.Random(seed)
+
+        self._condition = threading.Condition()
+        self._limit = float(max_concurrency)
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self.counters = {"calls": 0, "retries": 0, "rate_limited": 0, "failures": 0, "throttled_seconds": 0.0}
+
+    @property
+    def concurrency(self) -> int:
+        """Current number of requests allowed in flight."""
+        return int(self._limit)
+
+    def _count(self, name: str, value: float = 1) -> None:
+        with self._condition:
+            self.counters[name] += value
+
+    def _acquire(self, tokens: int) -> None:
+        start = time.monotonic()
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    self._condition.wait(self._paused_until - now)
+                elif self._in_flight >= int(self._limit):
+                    self._condition.wait()
+                else:
+                    break
+            self._in_flight += 1
+        wait = max(
+            self.requests.reserve(1) if self.requests else 0.0,
+            self.tokens.reserve(tokens) if self.tokens and tokens else 0.0,
+        )
+        time.sleep(wait)
+        self._count("throttled_seconds", time.monotonic() - start)
+
+    def _release(self, rate_limited: bool, retry_after: Optional[float]) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            now = time.monotonic()
+            if rate_limited:
+                # Requests already in flight hit the same limit, so one decrease per backoff window is enough
+                if now - self._last_decrease > self.base_delay:
+                    self._limit = max(float(self.min_concurrency), self._limit / 2)
+                    self._last_decrease = now
+                if retry_after:
+                    self._paused_until = max(self._paused_until, now + retry_after)
+            else:
+                # Additive increase: about one more slot per `limit` successful calls
+                self._limit = min(float(self.max_concurrency), self._limit + 1 / self._limit)
+            self._condition.notify_all()
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Delay before retry number attempt (from 0): Retry-After if given, otherwise full-jitter exponential."""
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        with self._condition:
+            return self._random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, function: Callable[[], Any], tokens: int = 0) -> Any:
+        """
+        Wywołuje function w ramach limitów, ponawiając ją po błędach przejściowych (429, przekroczenie
+        czasu, błędy 5xx). Pozostałe błędy i błąd po max_retries ponowieniach są przekazywane dalej.
+
+        Parametry:
+            function (Callable[[], Any]): Wywołanie modelu.
+            tokens (int): Szacowana liczba tokenów wywołania, liczona do limitu tpm.
+        """
+        self._count("calls")
+        attempt = 0
+        while True:
+            self._acquire(tokens)
+            try:
+                result = function()
+            except Exception as exc:
+                retryable, rate_limited, retry_after = classify_error(exc)
+                self._release(rate_limited, retry_after)
+                if rate_limited:
+                    self._count("rate_limited")
+                if not retryable or attempt >= self.max_retries:
+                    self._count("failures")
+                    raise
+                delay = self.backoff(attempt, retry_after)
+                self._count("retries")
+                self._count("throttled_seconds", delay)
+                time.sleep(delay)
+                attempt += 1
+            else:
+                self._release(False, None)
+                return result
+
+    def stats(self) -> dict[str, float]:
+        """Counters of calls, retries, 429 responses, final failures and time spent waiting, plus current concurrency."""
+        with self._condition:
+            return {**self.counters, "throttled_seconds": round(self.counters["throttled_seconds"], 3),
+                    "concurrency": int(self._limit)}
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Callable, Optional
+
+
+class CacheMissError(KeyError):
+    """Raised in replay mode when a response is not in the cache."""
+
+
+class ResponseCache:
+    """
+    Trwała pamięć podręczna odpowiedzi modelu w bazie SQLite, adresowana skrótem treści zapytania.
+    Po przekroczeniu limitu rozmiaru usuwane są najdawniej używane wpisy.
+    W trybie replay cache jest tylko do odczytu, a brak wpisu zgłasza CacheMissError.
+    """
+
+    def __init__(self, path: str = "llm_cache.sqlite", max_bytes: int = 256 * 1024 * 1024, replay: bool = False):
+        """
+        Parametry:
+            path (str): Ścieżka do pliku bazy SQLite.
+            max_bytes (int): Maksymalny łączny rozmiar zapisanych odpowiedzi w bajtach.
+            replay (bool): Czy cache działa tylko do odczytu (bez wywołań modelu).
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.replay = replay
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._connection.commit()
+        # Running size of all stored responses, so that a put does not scan the table
+        self._total = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(model_name: str, system_prompt: str, prompt: str, temperature: float) -> str:
+        """
+        Buduje klucz cache jako skrót SHA-256 wszystkiego, co wpływa na odpowiedź modelu.
+
+        Parametry:
+            model_name (str): Nazwa modelu.
+            system_prompt (str): Prompt systemowy agenta.
+            prompt (str): Wyrenderowany prompt (zawiera dane ankiety i kursu).
+            temperature (float): Temperatura próbkowania.
+        """
+        payload = json.dumps([model_name, system_prompt, prompt, temperature], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for key or None, counting hits and misses."""
+        with self._lock:
+            row = self._connection.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if not self.replay:
+                self._connection.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+                self._connection.commit()
+            return row[0]
+
+    def put(self, key: str, response: str) -> None:
+        """Store a response and evict least recently used entries above max_bytes."""
+        if self.replay:
+            return
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            row = self._connection.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._total += size - (row[0] if row is not None else 0)
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, response, size, now, now),
+            )
+            self._evict()
+            self._connection.commit()
+
+    def get_or_call(self, key: str, call: Callable[[], str]) -> str:
+        """
+        Zwraca odpowiedź z cache albo wywołuje model i zapisuje wynik.
+
+        Parametry:
+            key (str): Klucz zbudowany przez make_key.
+            call (Callable): Funkcja wywołująca model, używana przy braku wpisu.
+        """
+        response = self.get(key)
+        if response is not None:
+            return response
+        if self.replay:
+            raise CacheMissError(key)
+        response = call()
+        self.put(key, response)
+        return response
+
+    def _evict(self, batch: int = 64) -> None:
+        # Least recently used entries first, a batch at a time from the last_used index
+        while self._total > self.max_bytes:
+            rows = self._connection.execute("SELECT key, size FROM responses ORDER BY last_used LIMIT ?",
+                                            (batch,)).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self._total <= self.max_bytes:
+                    break
+                self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._total -= size
+
+    def stats(self) -> dict[str, float]:
+        """Hit/miss counters and the current number of cached entries."""
+        with self._lock:
+            entries = self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,85 @@
+from typing import Any, Iterator, Optional
+
+from common.output_parser import OutputParser, ParseResult, StreamParser
+from common.perf_log import current_record
+
+
+def stream_completion(
+    llm: Any,
+    model_name: str,
+    system_prompt: str,
+    prompt: str,
+    temperature: float = 0.0,
+    max_tokens: Optional[int] = None,
+    max_new_tokens: Optional[int] = None,
+) -> Iterator[str]:
+    """
+    Zwraca generator kolejnych fragmentów odpowiedzi modelu. Backend z metodą stream
+    (np. TransformersBackend) jest używany bezpośrednio, pozostałe modele przez litellm.
+    Zamknięcie generatora (np. break w pętli) przerywa generowanie po stronie modelu.
+
+    Parametry:
+        llm: Obiekt przekazany agentowi jako llm= albo None dla modeli po nazwie.
+        model_name (str): Nazwa modelu w formacie litellm, np. "gemini/gemini-2.0-flash".
+        system_prompt (str): Prompt systemowy agenta.
+        prompt (str): Wyrenderowany prompt z danymi ankiety i kursu.
+        temperature (float): Temperatura próbkowania.
+        max_tokens (int | None): Limit tokenów odpowiedzi dla litellm.
+        max_new_tokens (int | None): Limit tokenów odpowiedzi backendu; domyślnie ustawienie backendu.
+    """
+    if llm is not None and hasattr(llm, "stream"):
+        yield from llm.stream(prompt, system_prompt=system_prompt, max_new_tokens=max_new_tokens)
+        return
+
+    import litellm
+
+    response = litellm.completion(
+        model=model_name,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt},
+        ],
+        temperature=temperature,
+        max_tokens=max_tokens,
+        stream=True,
+        # The token usage then arrives in a final chunk, unless the stream is closed early
+        stream_options={"include_usage": True},
+    )
+    try:
+        for chunk in response:
+            usage = getattr(chunk, "usage", None)
+            if usage:
+                current_record().add_usage(usage.prompt_tokens or 0, usage.completion_tokens or 0)
+            if chunk.choices:
+                yield chunk.choices[0].delta.content or ""
+    finally:
+        # Closing the underlying HTTP stream is what stops the provider from generating further
+        for stream in (getattr(response, "completion_stream", None), response):
+            close = getattr(stream, "close", None)
+            if callable(close):
+                close()
+                break
+
+
+def read_until_complete(chunks: Iterator[str], parser: OutputParser) -> tuple[str, ParseResult, bool]:
+    """
+    Czyta strumień do chwili, gdy wszystkie klucze mają wartości (lub zamknięto blok odpowiedzi),
+    po czym przerywa generowanie. Zwraca odczytany tekst, wynik parsowania i informację,
+    czy odczyt zakończono wcześniej na podstawie sparsowanych wartości.
+
+    Parametry:
+        chunks (Iterator[str]): Fragmenty odpowiedzi, np. z stream_completion.
+        parser (OutputParser): Parser z kluczami oczekiwanymi w odpowiedzi.
+    """
+    stream = StreamParser(parser)
+    stopped = False
+    try:
+        for chunk in chunks:
+            if stream.feed(chunk):
+                stopped = True
+                break
+    finally:
+        close = getattr(chunks, "close", None)
+        if callable(close):
+            close()
+    return stream.text, stream.result(), stopped
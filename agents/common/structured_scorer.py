@@ -0,0 +1,163 @@
+import re
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+from common.course_catalog import CourseCatalog
+from common.survey import ASSESSMENT_PREFERENCE, MODE_PREFERENCE, NO_PREFERENCE
+
+MODE_KEY = 'zgodność trybu prowadzenia zajęć'
+ASSESSMENT_KEY = 'zgodność rodzaju zaliczenia'
+
+MIXED_MODE = "mieszany: w sali i zdalnie"
+
+# Assessment types of oguny_unique1.csv and the keywords that reveal them in "Metody i kryteria oceniania"
+ASSESSMENT_KEYWORDS = {
+    "Esej/praca pisemna": r"esej|prac\w* pisemn|prac\w* zaliczeniow|prac\w* końcow|recenzj",
+    "Obecność/aktywność": r"aktywnoś|aktywn\w* udział|obecność\w* na|za obecnoś",
+    "Prezentacja/referat": r"prezentacj|referat|wystąpieni",
+    "Projekt/zadanie": r"projekt|zadani\w* domow|zadań domow|portfolio",
+    "Test/egzamin": r"egzamin|test|kolokwi|sprawdzian|quiz",
+}
+ASSESSMENT_TYPES = tuple(ASSESSMENT_KEYWORDS)
+
+# Free-text survey answers (e.g. from app/survey.py) mapped onto the structured values
+MODE_SYNONYMS = {
+    MIXED_MODE: r"mieszan|hybryd",
+    "zdalnie": r"zdaln|online|internet|e-learning",
+    "w sali": r"w sali|stacjonar|na miejscu|warsztat",
+}
+ASSESSMENT_SYNONYMS = {
+    "Esej/praca pisemna": r"esej|pisemn",
+    "Obecność/aktywność": r"obecnoś|obecnos|aktywnoś|aktywnos",
+    "Prezentacja/referat": r"prezentac|referat",
+    "Projekt/zadanie": r"projekt|zadani",
+    "Test/egzamin": r"test|egzamin|kolokwi",
+}
+
+
+def parse_preference(value: Optional[str], synonyms: dict[str, str]) -> Optional[list[str]]:
+    """
+    Map a survey answer onto structured values.
+    Returns [] for "no preference" and None when the answer cannot be mapped (LLM fallback).
+    """
+    value = (value or "").lower()
+    if re.search(NO_PREFERENCE, value):
+        return []
+    matched = [label for label, pattern in synonyms.items() if re.search(pattern, value)]
+    return matched or None
+
+
+class StructuredScorer:
+    """
+    Deterministyczny scorer wymiarów 'zgodność trybu prowadzenia zajęć' i 'zgodność rodzaju zaliczenia'
+    liczonych wprost z pól strukturalnych katalogu, wektorowo dla wszystkich kursów naraz.
+    Wartość NaN oznacza brak danych ('(brak danych)' lub brak pola) - wtedy ocenę musi wystawić model.
+    """
+
+    def __init__(self, courses_filename: str, labels_filename: Optional[str] = None):
+        """
+        Parametry:
+            courses_filename (str): Ścieżka do pliku z metadanymi kursów (np. oguny.json).
+            labels_filename (str | None): Opcjonalny plik oguny_unique1.csv z ręcznie oznaczonym trybem
+                i rodzajami zaliczenia, nadpisujący wartości wyznaczone regułami.
+        """
+        catalog = CourseCatalog.load(courses_filename)
+        names = catalog.names()
+        records = [catalog.get(name) for name in names]
+
+        modes = pd.Series([record.get("Tryb prowadzenia", "") for record in records], index=names).str.lower()
+        methods = pd.Series([record.get("Metody i kryteria oceniania", "") for record in records],
+                            index=names).str.lower()
+
+        # Multi-group courses concatenate their modes, e.g. "mieszany: w sali i zdalniew sali"
+        single_modes = modes.str.replace(MIXED_MODE, " ", regex=False)
+        features = pd.DataFrame({
+            "has_mode": ~modes.str.contains(r"^\s*$|brak danych"),
+            "mixed": modes.str.contains(MIXED_MODE, regex=False),
+            "remote": single_modes.str.contains("zdalnie"),
+            "onsite": single_modes.str.contains(r"w sali|w terenie|lektura"),
+        }, index=names)
+
+        for label, pattern in ASSESSMENT_KEYWORDS.items():
+            features[label] = methods.str.contains(pattern)
+        features["has_assessment"] = features[list(ASSESSMENT_TYPES)].any(axis=1)
+
+        if labels_filename is not None:
+            self._apply_labels(features, pd.read_csv(labels_filename))
+
+        self.features = features[~features.index.duplicated()]
+
+    @staticmethod
+    def _apply_labels(features: pd.DataFrame, labels: pd.DataFrame) -> None:
+        labels = labels.drop_duplicates("Nazwa").set_index("Nazwa")
+        labels = labels[labels.index.isin(features.index)]
+        tryb = labels["Tryb"].str.lower()
+
+        features.loc[labels.index, "has_mode"] = True
+        features.loc[labels.index, "mixed"] = tryb == MIXED_MODE
+        features.loc[labels.index, "remote"] = tryb == "zdalnie"
+        features.loc[labels.index, "onsite"] = tryb.str.contains("w sali")
+
+        for label in ASSESSMENT_TYPES:
+            features.loc[labels.index, label] = labels[label] == 1
+        features.loc[labels.index, "has_assessment"] = labels[list(ASSESSMENT_TYPES)].sum(axis=1) > 0
+
+    def score(self, survey_data: dict[str, Any]) -> pd.DataFrame:
+        """
+        Ocenia wszystkie kursy katalogu względem ankiety w jednym przebiegu.
+        Zwraca DataFrame indeksowany nazwą kursu z kolumnami obu wymiarów w skali 0-10 (NaN = brak oceny).
+
+        Parametry:
+            survey_data (dict[str, Any]): Dane z ankiety studenta.
+        """
+        f = self.features
+        scores = pd.DataFrame(index=f.index)
+
+        preferred_modes = parse_preference(survey_data.get(MODE_PREFERENCE), MODE_SYNONYMS)
+        if preferred_modes is None:
+            scores[MODE_KEY] = np.nan
+        elif not preferred_modes:
+            scores[MODE_KEY] = np.where(f["has_mode"], 10.0, np.nan)
+        else:
+            mode_scores = []
+            for mode in preferred_modes:
+                if mode == MIXED_MODE:
+                    both_offered = f["remote"] & f["onsite"]
+                    mode_scores.append(np.select(
+                        [f["mixed"], both_offered, f["remote"] | f["onsite"]], [10.0, 7.0, 3.0], 0.0))
+                else:
+                    wanted = "remote" if mode == "zdalnie" else "onsite"
+                    mode_scores.append(np.select([f[wanted], f["mixed"]], [10.0, 5.0], 0.0))
+            scores[MODE_KEY] = np.where(f["has_mode"], np.max(mode_scores, axis=0), np.nan)
+
+        preferred_types = parse_preference(survey_data.get(ASSESSMENT_PREFERENCE), ASSESSMENT_SYNONYMS)
+        if preferred_types is None:
+            scores[ASSESSMENT_KEY] = np.nan
+        elif not preferred_types:
+            scores[ASSESSMENT_KEY] = np.where(f["has_assessment"], 10.0, np.nan)
+        else:
+            matched = f[preferred_types].any(axis=1)
+            scores[ASSESSMENT_KEY] = np.where(f["has_assessment"], np.where(matched, 10.0, 0.0), np.nan)
+
+        return scores
+
+
+if __name__ == "__main__":
+    # Run from the agents directory: python -m common.structured_scorer --courses-filename oguny.json
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Sprawdza reguły zaliczenia względem ręcznych etykiet.")
+    parser.add_argument("--courses-filename", default="oguny.json")
+    parser.add_argument("--labels-filename", default="oguny_unique1.csv")
+    args = parser.parse_args()
+
+    features = StructuredScorer(args.courses_filename).features
+    labels = pd.read_csv(args.labels_filename).drop_duplicates("Nazwa").set_index("Nazwa")
+    rules = features.loc[labels.index]
+    for label in ASSESSMENT_TYPES:
+        accuracy = (rules[label] == (labels[label] == 1)).mean()
+        print(f"{label:<22} accuracy {accuracy:.2f}")
+    print(f"Share of catalog with mode data: {features['has_mode'].mean():.2f}")
+    print(f"Share of catalog with assessment data: {features['has_assessment'].mean():.2f}")
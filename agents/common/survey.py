@@ -0,0 +1,48 @@
+import re
+from typing import Any
+
+from common.topic_labels import TOPIC_KEY
+
+MODE_PREFERENCE = "Preferowany tryb prowadzenia zajęć"
+ASSESSMENT_PREFERENCE = "Preferowany rodzaj zaliczenia"
+
+# Misspelled survey keys of the app (app/survey.py) mapped onto the keys read by the agents
+SURVEY_KEY_ALIASES = {
+    "Preferowna tematyka zajęć": TOPIC_KEY,
+}
+
+# Answer of the drivers for "no preference"; app/survey.py writes "BRAK PREFERENCJI" instead
+NO_PREFERENCE_VALUE = "nie mam preferencji"
+# Any answer meaning "no preference", as a search pattern over a lowercased answer
+NO_PREFERENCE = r"^\s*$|nie mam preferencji|brak preferencji"
+# Whole answers that only say "no preference", e.g. "BRAK PREFERENCJI", " Nie mam  preferencji. ", "-"
+NO_PREFERENCE_ANSWER = re.compile(r"(nie mam|brak)( żadnych)? preferencji\W*|\W*")
+
+
+def canonical_value(value: Any) -> Any:
+    """
+    Zwraca odpowiedź ankiety w postaci kanonicznej: tekst bez nadmiarowych białych znaków, a każdy
+    wariant braku preferencji jako NO_PREFERENCE_VALUE. Wielkość liter pozostałych odpowiedzi jest
+    zachowana, bo tematyka bywa nazwą kategorii (np. w tabeli topic_labels). Inne typy są zwracane bez zmian.
+
+    Parametry:
+        value (Any): Odpowiedź na pytanie ankiety.
+    """
+    if not isinstance(value, str):
+        return value
+    value = " ".join(value.split())
+    if NO_PREFERENCE_ANSWER.fullmatch(value.lower()):
+        return NO_PREFERENCE_VALUE
+    return value
+
+
+def canonical_survey(survey_data: dict[str, Any]) -> dict[str, Any]:
+    """
+    Zwraca ankietę w postaci kanonicznej: klucze czytane przez agentów (SURVEY_KEY_ALIASES)
+    i odpowiedzi według canonical_value, dzięki czemu ankiety różniące się tylko zapisem
+    dają te same prompty i trafiają w te same wpisy cache odpowiedzi.
+
+    Parametry:
+        survey_data (dict[str, Any]): Dane z ankiety studenta.
+    """
+    return {SURVEY_KEY_ALIASES.get(key, key): canonical_value(value) for key, value in survey_data.items()}
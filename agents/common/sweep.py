@@ -0,0 +1,92 @@
+import json
+import threading
+from pathlib import Path
+from typing import Any, Callable, Optional, Sequence
+
+
+class SweepJournal:
+    """
+    Dziennik JSONL ukończonych ocen w przebiegu ewaluacji: jedna linia na parę (preferencja, kurs).
+    Wynik jest dopisywany zaraz po ocenie, więc przerwany przebieg można wznowić bez ponownego
+    płacenia za gotowe wywołania, a pliki scores_*.json zbudować z dziennika.
+    """
+
+    def __init__(self, path: str):
+        """
+        Parametry:
+            path (str): Ścieżka do pliku .jsonl; jeśli istnieje, gotowe wyniki są z niego wczytywane.
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._results: dict[tuple, Any] = {}
+        self._lock = threading.Lock()
+
+        if self.path.exists():
+            with open(self.path, "rb") as file:
+                content = file.read()
+            for line in content.decode("utf-8", errors="replace").splitlines():
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Line cut short by an interrupted write
+                self._results[tuple(entry["key"])] = entry["result"]
+            if content and not content.endswith(b"\n"):
+                with open(self.path, "ab") as file:
+                    file.write(b"\n")
+
+    def __contains__(self, key: Sequence[str]) -> bool:
+        return tuple(key) in self._results
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def get(self, key: Sequence[str]) -> Optional[Any]:
+        return self._results.get(tuple(key))
+
+    def append(self, key: Sequence[str], result: Any) -> None:
+        """
+        Zapisuje wynik pod kluczem i od razu opróżnia bufor pliku.
+
+        Parametry:
+            key (Sequence[str]): Klucz pracy, np. (cecha, preferencja, nazwa kursu).
+            result: Wynik agenta (serializowalny do JSON).
+        """
+        line = json.dumps({"key": list(key), "result": result}, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write(line)
+            self._results[tuple(key)] = result
+
+    def results(self) -> dict[tuple, Any]:
+        """All journaled results, keyed by tuple keys."""
+        with self._lock:
+            return dict(self._results)
+
+    def pending(self, prefix: Sequence[str], course_names: Sequence[str]) -> list[str]:
+        """Course names (deduplicated, in order) without a journaled result under prefix."""
+        return [name for name in dict.fromkeys(course_names) if (*prefix, name) not in self]
+
+
+def run_journaled(
+    journal: SweepJournal,
+    prefix: Sequence[str],
+    course_names: Sequence[str],
+    score_many: Callable[..., list[dict[str, Any]]],
+) -> list[dict[str, Any]]:
+    """
+    Ocenia tylko kursy bez wyniku w dzienniku i zwraca wyniki dla wszystkich course_names, w ich kolejności.
+    Wyniki 'Błąd' nie są zapisywane, więc po wznowieniu te kursy są oceniane ponownie.
+
+    Parametry:
+        journal (SweepJournal): Dziennik przebiegu.
+        prefix (Sequence[str]): Początek klucza wspólny dla wywołania, np. (cecha, preferencja).
+        course_names (Sequence[str]): Nazwy kursów; mogą się powtarzać.
+        score_many (Callable): Metoda agenta (run_many, run_batch) przyjmująca nazwy kursów i on_result.
+    """
+    todo = journal.pending(prefix, course_names)
+    fresh: dict[str, dict[str, Any]] = {}
+    if todo:
+        fresh = dict(zip(todo, score_many(
+            todo, on_result=lambda course_name, result: journal.append((*prefix, course_name), result),
+        )))
+    return [journal.get((*prefix, course_name)) or fresh[course_name] for course_name in course_names]
@@ -0,0 +1,243 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import pandas as pd
+
+from common.course_catalog import CourseCatalog
+from common.output_parser import FAILED
+
+# Survey key of the topic preference scored by the filtering agent
+TOPIC_KEY = "Preferowana tematyka zajęć"
+# Category of courses that fit no topic; not a preference anyone filters by
+OTHER_CATEGORY = "Inne"
+
+
+def read_categories(path: str, column: str = "Kategorie tematyczne") -> list[str]:
+    """
+    Zwraca stały zbiór kategorii tematycznych z pliku CSV (np. courses_with_categories.csv),
+    od najczęstszej. Wartości z kilkoma kategoriami ("Historia i archeologia, Języki i kultury świata")
+    są rozbijane tylko wtedy, gdy każda część jest znaną kategorią, bo przecinek występuje też
+    w nazwach kategorii ("Sport, gry i rekreacja").
+
+    Parametry:
+        path (str): Ścieżka do pliku CSV.
+        column (str): Kolumna z kategoriami.
+    """
+    counts = pd.read_csv(path)[column].dropna().value_counts()
+    values = set(counts.index)
+    categories: dict[str, int] = {}
+    for value, count in counts.items():
+        parts = [part.strip() for part in value.split(", ")]
+        if len(parts) == 1 or not all(part in values for part in parts):
+            parts = [value]
+        for part in parts:
+            categories[part] = categories.get(part, 0) + count
+    categories.pop(OTHER_CATEGORY, None)
+    return sorted(categories, key=lambda category: (-categories[category], category))
+
+
+def prompt_variant(system_prompt: str) -> str:
+    """Short hash of the filtering agent's system prompt, stored with its labels (e.g. scores_only differs)."""
+    return hashlib.sha1(system_prompt.encode("utf-8")).hexdigest()[:12]
+
+
+def survey_topic(survey_data: dict[str, Any]) -> Optional[str]:
+    """The topic of a survey that asks only for a topic, i.e. one the labels table can answer."""
+    if set(survey_data) == {TOPIC_KEY}:
+        return survey_data[TOPIC_KEY]
+    return None
+
+
+class TopicLabels:
+    """
+    Tabela ocen dopasowania każdego kursu do każdej kategorii tematycznej w bazie SQLite,
+    wypełniana jednorazowo przez agenta filtrującego (label_course_topics.py), a w czasie
+    zapytania odczytywana z pamięci zamiast wywołań modelu. Każda ocena przechowuje skrót treści
+    kursu, nazwę modelu i wariant promptu (prompt_variant), więc przy aktualizacji oceniane są ponownie
+    tylko kursy, których opis się zmienił, a zmieniony opis ani inny prompt nie są nigdy obsługiwane
+    starą oceną. Nieudane oceny (ujemne albo nieodczytane z odpowiedzi) nie są zapisywane.
+    """
+
+    def __init__(self, path: str = "topic_labels.sqlite"):
+        """
+        Parametry:
+            path (str): Ścieżka do pliku bazy SQLite; istniejące oceny są wczytywane do pamięci.
+        """
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS labels (
+                category TEXT NOT NULL,
+                course TEXT NOT NULL,
+                score NUMERIC NOT NULL,
+                label TEXT,
+                parsed TEXT,
+                hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                variant TEXT NOT NULL DEFAULT '',
+                updated REAL NOT NULL,
+                PRIMARY KEY (category, course)
+            )
+            """
+        )
+        columns = {row[1] for row in self._connection.execute("PRAGMA table_info(labels)")}
+        if "variant" not in columns:
+            # Tables written before prompt variants; their labels are relabeled as stale
+            self._connection.execute("ALTER TABLE labels ADD COLUMN variant TEXT NOT NULL DEFAULT ''")
+        self._connection.commit()
+
+        # category -> course -> (score, label, parse confidence, content hash, model, prompt variant)
+        self._labels: dict[str, dict[str, tuple]] = {}
+        for category, course, *row in self._connection.execute(
+                "SELECT category, course, score, label, parsed, hash, model, variant FROM labels"):
+            self._labels.setdefault(category, {})[course] = tuple(row)
+
+    @staticmethod
+    def usable(result: dict[str, Any]) -> bool:
+        """Whether a filtering agent result is a real score worth storing (not 'Błąd', FAILED or negative)."""
+        score = result.get('zgodność tematyki zajęć')
+        return isinstance(score, (int, float)) and score >= 0 and result.get('pewność parsowania') != FAILED \
+            and result.get('nazwa przedmiotu') != 'Błąd'
+
+    @staticmethod
+    def _current(row: Optional[tuple], content_hash: str, model: Optional[str], variant: Optional[str]) -> bool:
+        # A stored failure is never current, so that it gets relabeled
+        return (row is not None and row[3] == content_hash and (model is None or row[4] == model)
+                and (variant is None or row[5] == variant) and row[0] >= 0 and row[2] != FAILED)
+
+    def get(self, course: str, category: str, content_hash: str, model: str,
+            variant: str) -> Optional[dict[str, Any]]:
+        """
+        Zwraca wynik w formacie agenta filtrującego albo None, jeśli kursu nie oceniono dla tej
+        kategorii, jego opis się zmienił albo ocenił go inny model lub prompt.
+
+        Parametry:
+            course (str): Nazwa kursu.
+            category (str): Kategoria tematyczna z ankiety.
+            content_hash (str): Aktualny skrót treści kursu (CourseCatalog.content_hash).
+            model (str): Model, którego ocen oczekuje agent.
+            variant (str): Wariant promptu agenta (prompt_variant).
+        """
+        row = self._labels.get(category, {}).get(course)
+        if not self._current(row, content_hash, model, variant):
+            return None
+        score, label, parsed = row[:3]
+        return {'nazwa przedmiotu': course,
+                'prawidłowość przedmiotu': label,
+                'zgodność tematyki zajęć': score,
+                'pewność parsowania': parsed}
+
+    def scores(self, category: str) -> dict[str, Any]:
+        """Score of every labeled course in a category."""
+        return {course: row[0] for course, row in self._labels.get(category, {}).items()}
+
+    def matching(self, category: str, min_score: float = 5) -> list[str]:
+        """Courses of a category scored at least min_score, best first."""
+        scores = self.scores(category)
+        return sorted((course for course, score in scores.items() if score >= min_score),
+                      key=lambda course: -scores[course])
+
+    def categories(self) -> list[str]:
+        return sorted(self._labels)
+
+    def put(self, course: str, category: str, result: dict[str, Any], content_hash: str, model: str,
+            variant: str) -> None:
+        """
+        Zapisuje wynik agenta filtrującego dla pary (kurs, kategoria).
+
+        Parametry:
+            course (str): Nazwa kursu.
+            category (str): Kategoria tematyczna.
+            result (dict[str, Any]): Wynik agenta z oceną 'zgodność tematyki zajęć'.
+            content_hash (str): Skrót treści kursu, dla którego policzono wynik.
+            model (str): Model, który wystawił ocenę.
+            variant (str): Wariant promptu, którym uzyskano ocenę (prompt_variant).
+        """
+        row = (result['zgodność tematyki zajęć'], result.get('prawidłowość przedmiotu'),
+               result.get('pewność parsowania'), content_hash, model, variant)
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO labels (category, course, score, label, parsed, hash, model, variant, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (category, course, *row, time.time()),
+            )
+            self._connection.commit()
+            self._labels.setdefault(category, {})[course] = row
+
+    def stale(self, catalog: CourseCatalog, category: str, model: Optional[str] = None,
+              variant: Optional[str] = None) -> list[str]:
+        """
+        Catalog courses without a current label in a category: new, changed, stored as a failure or
+        (if model / variant is given) labeled by another model or prompt.
+        """
+        labels = self._labels.get(category, {})
+        return [course for course in dict.fromkeys(catalog.names())
+                if not self._current(labels.get(course), catalog.content_hash(course), model, variant)]
+
+    def remove_missing(self, catalog: CourseCatalog) -> int:
+        """Delete labels of courses that are no longer in the catalog and return how many were removed."""
+        removed = 0
+        with self._lock:
+            for category, labels in self._labels.items():
+                for course in [course for course in labels if course not in catalog]:
+                    self._connection.execute("DELETE FROM labels WHERE category = ? AND course = ?",
+                                             (category, course))
+                    del labels[course]
+                    removed += 1
+            self._connection.commit()
+        return removed
+
+    def update(
+        self,
+        catalog: CourseCatalog,
+        categories: list[str],
+        score_many: Callable[..., list[dict[str, Any]]],
+        model: str,
+        variant: str,
+    ) -> dict[str, int]:
+        """
+        Ocenia kursy bez aktualnej oceny w każdej kategorii i zapisuje wyniki zaraz po ich otrzymaniu,
+        więc przerwaną aktualizację można wznowić. Wyniki 'Błąd', nieodczytane (FAILED) i z ujemną
+        oceną nie są zapisywane, więc kolejna aktualizacja ocenia te kursy ponownie.
+        Zwraca liczbę ocen nowych, aktualnych (pominiętych), nieudanych i usuniętych.
+
+        Parametry:
+            catalog (CourseCatalog): Katalog kursów.
+            categories (list[str]): Kategorie tematyczne, np. z read_categories.
+            score_many (Callable): Wywoływana z (kategoria, nazwy kursów, on_result), np. run_batch agenta
+                filtrującego z ankietą {TOPIC_KEY: kategoria}; on_result(nazwa kursu, wynik) zapisuje wynik.
+            model (str): Nazwa modelu zapisywana przy ocenach.
+            variant (str): Wariant promptu agentów score_many (prompt_variant), zapisywany przy ocenach.
+        """
+        counts = {"labeled": 0, "up_to_date": 0, "failed": 0, "removed": self.remove_missing(catalog)}
+        for category in categories:
+            pending = self.stale(catalog, category, model, variant)
+            counts["up_to_date"] += len(set(catalog.names())) - len(pending)
+            if not pending:
+                continue
+
+            stored = set()
+
+            def on_result(course: str, result: dict[str, Any]) -> None:
+                if self.usable(result):
+                    self.put(course, category, result, catalog.content_hash(course), model, variant)
+                    stored.add(course)
+
+            score_many(category, pending, on_result)
+            counts["labeled"] += len(stored)
+            counts["failed"] += len(pending) - len(stored)
+        return counts
+
+    def __len__(self) -> int:
+        return sum(len(labels) for labels in self._labels.values())
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
@@ -2,6 +2,12 @@
 import json
 import pandas as pd
 from course_ranker import CourseRanker
+from common.perf_log import PerfLog, summarize
+from common.rate_limit import RateLimiter
+from common.response_cache import ResponseCache
+from common.sweep import SweepJournal, run_journaled
+from common.topic_labels import TopicLabels
+from functools import partial
 import random
 from pathlib import Path
 import time
@@ -9,11 +15,26 @@ import os
 
 #%%
 if __name__ == "__main__":
-    import torch
-
     os.environ["OPENAI_API_KEY"] = ### Your token goes here
 
     model_name = "gpt-4o-mini"
+    # Persistent LLM response cache; replay=True reruns the evaluation from cache without model calls
+    cache = ResponseCache(f"llm_cache_{model_name.replace('/', '_')}.sqlite")
+    # Maximum number of requests in flight at once
+    concurrency = 8
+    # Client-side RPM/TPM limits of the API key (tier 1 here); 429s and timeouts are retried with backoff
+    rate_limiter = RateLimiter(rpm=500, tpm=200_000, max_concurrency=concurrency)
+    # Number of course names sent in one prompt; 1 scores every course separately, as in the published sweeps
+    batch_size = 1
+    # True stops reading each answer once all scores are parsed (single-course prompts only, no justification);
+    # off for the published sweeps
+    stream_scores = False
+    # Every finished (preference, course) result is appended here; rerunning the script skips them
+    journal = SweepJournal(f"output/journal_{model_name.replace('/', '_')}.jsonl")
+    # Latency, tokens, cache hits and parsing of every model call; summary: python -m common.perf_log <file>
+    perf_log = PerfLog(f"output/perf_{model_name.replace('/', '_')}.jsonl")
+    # Offline topic scores (label_course_topics.py); courses with a current score there need no model call
+    topic_labels = TopicLabels("output/topic_labels.sqlite")
 
     test_data = pd.read_csv("oguny_unique1.csv")
     all_names = test_data["Nazwa"].values.tolist()
@@ -37,18 +58,26 @@ if __name__ == "__main__":
             "Preferowana tematyka zajęć": pref,
         }
 
-        for i, (n1, cat) in enumerate(zip(all_names, categories)):
-            filter_agent1 = CourseRanker(
-                survey_data,
-                courses_filename,
-                # llm=local_llm
-                model_name = model_name
-            )
-
+        filter_agent = CourseRanker(
+            survey_data,
+            courses_filename,
+            # llm=local_llm
+            model_name = model_name,
+            cache=cache,
+            stream_scores=stream_scores,
+            perf_log=perf_log,
+            rate_limiter=rate_limiter,
+            topic_labels=topic_labels,
+        )
+        if batch_size > 1:
+            score_many = partial(filter_agent.run_batch, batch_size=batch_size, concurrency=concurrency)
+        else:
+            score_many = partial(filter_agent.run_many, concurrency=concurrency)
+        outputs = run_journaled(journal, (feature, pref), all_names, score_many)
+
+        for i, (n1, cat, o) in enumerate(zip(all_names, categories, outputs)):
             print("############## preferowana:", pref, "kategoria", cat, "##############")
 
-            o = filter_agent1.run(n1)
-
             elapsed = time.time() - start_time
 
             hours = int(elapsed // 3600)
@@ -67,5 +96,9 @@ if __name__ == "__main__":
         with open(f"output/scores_{pref}.json", "w", encoding="utf-8") as file:
             json.dump(Results[pref], file, ensure_ascii=False, indent=2)
 
+    print("LLM cache:", cache.stats())
+    print(summarize(PerfLog.load([perf_log.path])).round(3).T.to_string())
+    print("Rate limiter:", rate_limiter.stats())
+
 with open(f"output/scores.json", "w", encoding="utf-8") as file:
     json.dump(Results, file, ensure_ascii=False, indent=2)
\ No newline at end of file
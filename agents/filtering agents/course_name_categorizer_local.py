@@ -2,6 +2,9 @@
 import json
 import pandas as pd
 from course_ranker_local import CourseRanker
+from common.perf_log import PerfLog, summarize
+from common.response_cache import ResponseCache
+from common.sweep import SweepJournal, run_journaled
 import random
 from pathlib import Path
 import time
@@ -9,10 +12,8 @@ import os
 
 #%%
 if __name__ == "__main__":
-    import torch
-    from transformers import AutoModelForCausalLM, AutoTokenizer
     from huggingface_hub import login
-    from swarm_models.huggingface import HuggingfaceLLM
+    from common.backends.transformers_local import TransformersBackend
 
     # Hugging Face login
     hf_token = ### Your token goes here
@@ -20,11 +21,23 @@ if __name__ == "__main__":
 
     # Model path from hugging face
     model_name = "speakleash/Bielik-1.5B-v3.0-Instruct"
-
-    local_llm = HuggingfaceLLM(
-        model_id=model_name,
+    # Persistent LLM response cache; replay=True reruns the evaluation from cache without model calls
+    cache = ResponseCache(f"llm_cache_{model_name.replace('/', '_')}.sqlite")
+    # True stops generating each answer once all scores are parsed (no justification); off for the published sweeps
+    stream_scores = False
+    # Every finished (preference, course) result is appended here; rerunning the script skips them
+    journal = SweepJournal(f"output/journal_{model_name.replace('/', '_')}.jsonl")
+    # Latency, tokens, cache hits and parsing of every model call; summary: python -m common.perf_log <file>
+    perf_log = PerfLog(f"output/perf_{model_name.replace('/', '_')}.jsonl")
+
+    # Model and tokenizer are loaded once; prompts are generated in left-padded batches,
+    # and the prompt start shared by all courses is encoded once (prefix KV cache)
+    local_llm = TransformersBackend.load(
+        model_name,
         device="cuda",
-        max_length=1000
+        max_new_tokens=96,
+        batch_size=16,
+        prefix_cache=True,
     )
 
     test_data = pd.read_csv("oguny_unique1.csv")
@@ -48,16 +61,19 @@ if __name__ == "__main__":
             "Preferowana tematyka zajęć": pref,
         }
 
-        for i, (n1, cat) in enumerate(zip(all_names, categories)):
-            filter_agent1 = CourseRanker(
-                survey_data,
-                courses_filename,
-                llm=local_llm
-            )
+        filter_agent1 = CourseRanker(
+            survey_data,
+            courses_filename,
+            llm=local_llm,
+            cache=cache,
+            stream_scores=stream_scores,
+            perf_log=perf_log,
+        )
 
-            print("############## preferowana:", pref, "kategoria", cat, "##############")
+        outputs = run_journaled(journal, (feature, pref), all_names, filter_agent1.run_many)
 
-            o = filter_agent1.run(n1)
+        for i, (n1, cat, o) in enumerate(zip(all_names, categories, outputs)):
+            print("############## preferowana:", pref, "kategoria", cat, "##############")
 
             elapsed = time.time() - start_time
 
@@ -77,5 +93,8 @@ if __name__ == "__main__":
         with open(f"output/scores_{pref}.json", "w", encoding="utf-8") as file:
             json.dump(Results[pref], file, ensure_ascii=False, indent=2)
 
+    print("LLM cache:", cache.stats())
+    print(summarize(PerfLog.load([perf_log.path])).round(3).T.to_string())
+
 with open(f"output/scores.json", "w", encoding="utf-8") as file:
     json.dump(Results, file, ensure_ascii=False, indent=2)
\ No newline at end of file
@@ -1,54 +1,94 @@
 # %%
 import json
 import time
-from typing import Any
-from swarms import Agent
+from typing import Any, Callable, Optional
 import re
 import ast
+import sys
+from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from common.agent_base import LazyAgent
+from common.backends.base import LLMBackend
+from common.batch import AgentPool, run_many
+from common.course_catalog import CourseCatalog
+from common.output_parser import FAILED, PARTIAL, STRICT, OutputParser
+from common.perf_log import PerfLog, current_record, record_call
+from common.rate_limit import RateLimiter, estimate_tokens
+from common.response_cache import ResponseCache
+from common.streaming import read_until_complete, stream_completion
+from common.survey import canonical_survey
+from common.topic_labels import TopicLabels, prompt_variant, survey_topic
 
-def find_key_positions(text, keys):
-    """Find all key positions in the text."""
-    positions = []
-    for key in keys:
-        for match in re.finditer(re.escape(key), text):
-            positions.append((match.start(), key))
-    # Sort by position in the text
-    return sorted(positions, key=lambda x: x[0])
 
+OUTPUT_PARSER = OutputParser(
+    score_keys=['zgodność tematyki zajęć'],
+    label_keys=['prawidłowość przedmiotu'],
+)
 
-def extract_values_between_keys(text, keys):
-    positions = find_key_positions(text, keys)
-    results = {'nazwa przedmiotu': 'ok',
-               'prawidłowość przedmiotu': 'ok',
-               'zgodność tematyki zajęć': -1}
+# Task name in the performance log (common.perf_log)
+PERF_TASK = "filter"
 
-    for i, (start_idx, key) in enumerate(positions):
-        key_end = start_idx + len(key)
-        end_idx = positions[i + 1][0] if i + 1 < len(positions) else len(text)
-        snippet = text[key_end:end_idx]
+SYSTEM_PROMPT = """
+                Na podstawie preferencji studenta oraz samej nazwy przedmiotu przydziel ocenę oraz uzasadnienie tej oceny, obejmujące wady i zalety przedmiotu. Odpowiedź zwróć w formacie:
+                odpowiedź:{
+                    'nazwa przedmiotu': {nazwa przedmiotu},
+                    'prawidłowość przedmiotu':{tak/nie w zależności od tego czy pasuje czy nie}
+                    'zgodność tematyki zajęć':{liczba 0-10 odzwierciedlająca dopasowanie Opisu kursu do Preferencje studenta}
+                }
+            """
+
+SCORES_ONLY_SYSTEM_PROMPT = """
+                Na podstawie preferencji studenta oraz samej nazwy przedmiotu przydziel ocenę. Zwróć wyłącznie odpowiedź w poniższym formacie, bez uzasadnienia i bez dodatkowego tekstu:
+                odpowiedź:{
+                    'nazwa przedmiotu': {nazwa przedmiotu},
+                    'prawidłowość przedmiotu':{tak/nie w zależności od tego czy pasuje czy nie}
+                    'zgodność tematyki zajęć':{liczba 0-10 odzwierciedlająca dopasowanie Opisu kursu do Preferencje studenta}
+                }
+            """
 
-        if "liczba" in snippet:
-            continue  # Skip this snippet if it contains "Liczba"
+# Token budget of the scores-only variant - the answer dict alone, with a long course name
+SCORES_ONLY_MAX_TOKENS = 96
 
-        if key == 'prawidłowość przedmiotu':
-            match = snippet
-            results[key] = match
+
+def normalize_course_name(name):
+    """Casefold a course name and drop quotes and repeated whitespace."""
+    return " ".join(name.strip().strip("'\"").split()).casefold()
+
+
+def parse_batch_output(text, course_names):
+    """
+    Map the records of a batched answer back to the requested course names.
+    Records are matched by their 'nr' field and, failing that, by course name.
+    Names without a parsable record are missing from the returned dict.
+    """
+    by_name = {normalize_course_name(name): name for name in course_names}
+    results = {}
+
+    for block in re.finditer(r'\{[^{}]*\}', text):
+        record = block.group()
+        parsed = OUTPUT_PARSER.parse(record)
+        if 'zgodność tematyki zajęć' in parsed.missing:
+            continue  # Skip echoed format templates and truncated records
+
+        name = None
+        number = re.search(r"nr['\"]?\s*:\s*['\"]?(\d+)", record)
+        if number and 1 <= int(number.group(1)) <= len(course_names):
+            name = course_names[int(number.group(1)) - 1]
         else:
-            match = re.search(r'\d{1,3}', snippet)
-            if match:
-                try:
-                    val = int(match.group())
-                    if key != '}' and val > results[key]:
-                        results[key] = val
-                except ValueError:
-                    continue  # Skip if not an int
+            named = re.search(r"nazwa przedmiotu['\"]?\s*:\s*(['\"])(.+?)\1\s*[,}]", record)
+            if named:
+                name = by_name.get(normalize_course_name(named.group(2)))
+        if name is None or name in results:
+            continue
+
+        results[name] = {'nazwa przedmiotu': name, **parsed.values, 'pewność parsowania': parsed.confidence}
 
     return results
 
 
 # %%
-class CourseRanker(Agent):
+class CourseRanker(LazyAgent):
     """
     Agent oceniający kursy akademickie na podstawie ich szczegółowych metadanych.
     Odrzuca kursy, które nie spełniają określonych kryteriów.
@@ -64,6 +104,12 @@ class CourseRanker(Agent):
             model_name: str = "gemini/gemini-2.0-flash",
             dynamic_temperature_enabled: bool = False,
             output_type: str = "string",
+            cache: Optional[ResponseCache] = None,
+            stream_scores: bool = False,
+            scores_only: bool = False,
+            perf_log: Optional[PerfLog] = None,
+            rate_limiter: Optional[RateLimiter] = None,
+            topic_labels: Optional[TopicLabels] = None,
             **kwargs: Any,
     ):
         """
@@ -75,23 +121,28 @@ class CourseRanker(Agent):
             max_tokens (int): Maksymalna liczba tokenów w odpowiedzi.
             model_name (str): Nazwa modelu AI do użycia.
             dynamic_temperature_enabled (bool): Czy dynamiczna temperatura jest włączona.
+            cache (ResponseCache | None): Trwały cache odpowiedzi modelu współdzielony przez agentów.
+            stream_scores (bool): Czy odczytywać odpowiedź strumieniowo i przerwać generowanie,
+                gdy wszystkie oceny są już znane (uzasadnienie nie jest wtedy generowane).
+            scores_only (bool): Czy użyć promptu bez uzasadnienia, z limitem SCORES_ONLY_MAX_TOKENS tokenów.
+            perf_log (PerfLog | None): Dziennik pomiarów każdego wywołania modelu (czasy, tokeny, cache, parsowanie).
+            rate_limiter (RateLimiter | None): Współdzielony harmonogram wywołań (limity RPM/TPM, ponawianie
+                po 429 i przekroczeniu czasu); swarms nie ponawia wtedy wywołań samodzielnie.
+            topic_labels (TopicLabels | None): Gotowe oceny kursów dla kategorii tematycznych; gdy ankieta
+                zawiera tylko tematykę, aktualna ocena z tabeli zastępuje wywołanie modelu.
         """
+        if rate_limiter is not None:
+            # Immediate retries inside swarms would only add to the 429s; the limiter backs off instead
+            kwargs.setdefault("retry_attempts", 1)
 
         super().__init__(
             agent_name="Pomocnik oceniający dopasowanie przedmiotów do preferencji studenta.",
             agent_description="""
                 Jesteś obiektywnym doradcą akademickim wyspecjalizowanym w dopasowywaniu kursów do preferencji studentów. Komunikujesz się bezpośrednio ze studentem.
             """,
-            system_prompt="""
-                Na podstawie preferencji studenta oraz samej nazwy przedmiotu przydziel ocenę oraz uzasadnienie tej oceny, obejmujące wady i zalety przedmiotu. Odpowiedź zwróć w formacie:
-                odpowiedź:{
-                    'nazwa przedmiotu': {nazwa przedmiotu},
-                    'prawidłowość przedmiotu':{tak/nie w zależności od tego czy pasuje czy nie}
-                    'zgodność tematyki zajęć':{liczba 0-10 odzwierciedlająca dopasowanie Opisu kursu do Preferencje studenta}
-                }
-            """,
+            system_prompt=SCORES_ONLY_SYSTEM_PROMPT if scores_only else SYSTEM_PROMPT,
             max_loops=max_loops,
-            max_tokens=max_tokens,
+            max_tokens=min(max_tokens, SCORES_ONLY_MAX_TOKENS) if scores_only else max_tokens,
             temperature=0.0,
             model_name=model_name,
             dynamic_temperature_enabled=False,
@@ -99,28 +150,85 @@ class CourseRanker(Agent):
             **kwargs,
         )
 
-        self.survey_data = survey_data
+        self._init_kwargs = dict(
+            survey_data=survey_data,
+            courses_filename=courses_filename,
+            ranked_courses_filename=ranked_courses_filename,
+            max_loops=max_loops,
+            max_tokens=max_tokens,
+            model_name=model_name,
+            output_type=output_type,
+            cache=cache,
+            stream_scores=stream_scores,
+            scores_only=scores_only,
+            perf_log=perf_log,
+            rate_limiter=rate_limiter,
+            topic_labels=topic_labels,
+            **kwargs,
+        )
+        self.survey_data = canonical_survey(survey_data)
         self.courses_filename = courses_filename
         self.ranked_courses_filename = ranked_courses_filename
+        self.cache = cache
+        self.stream_scores = stream_scores
+        # Backends keep their own response limit, except for the tight scores-only budget
+        self.max_new_tokens = self.max_tokens if scores_only else None
+        self.perf_log = perf_log
+        self.model_label = getattr(kwargs.get("llm"), "model_id", None) or model_name
+        self.rate_limiter = rate_limiter
+        self.topic_labels = topic_labels
+        self.topic = survey_topic(self.survey_data)
+        self.catalog = CourseCatalog.load(courses_filename)
+        self._pool = None
+
+    @staticmethod
+    def label_variant(scores_only: bool = False) -> str:
+        """Prompt variant under which agents built with this scores_only setting store and read topic labels."""
+        return prompt_variant(SCORES_ONLY_SYSTEM_PROMPT if scores_only else SYSTEM_PROMPT)
 
     def get_course_details(self, course_name: str) -> dict[str, Any]:
         """
-        Pobiera szczegółowe metadane kursu z pliku JSON.
+        Pobiera szczegółowe metadane kursu ze współdzielonego katalogu.
 
         Parametry:
             course_name (str): Nazwa kursu do wyszukania.
         """
 
-        with open(self.courses_filename, "r", encoding='utf-8') as file:
-            courses_data = json.load(file)
-
-        course = courses_data[course_name]
+        course = self.catalog.get(course_name, ("Nazwa przedmiotu",))
         courses_dict = course["Nazwa przedmiotu"]
         return courses_dict
 
-    def run(self, course_name: str, **kwargs) -> dict[str, Any]:
+    def lookup_label(self, course_name: str) -> Optional[dict[str, Any]]:
+        """
+        Zwraca ocenę kursu z tabeli topic_labels albo None, jeśli trzeba zapytać model.
+
+        Parametry:
+            course_name (str): Nazwa kursu.
+        """
+        if self.topic_labels is None or self.topic is None or course_name not in self.catalog:
+            return None
+        return self.topic_labels.get(course_name, self.topic, self.catalog.content_hash(course_name),
+                                     self.model_label, prompt_variant(self.system_prompt))
+
+    def run(self, course_name: str, queued_at: Optional[float] = None, **kwargs) -> dict[str, Any]:
         """
         Uruchamia agenta do oceny kursu na podstawie metadanych i ankiety studenta.
+        Pomiary wywołania trafiają do perf_log, jeśli został podany.
+
+        Parametry:
+            course_name (str): Nazwa kursu do oceny.
+            queued_at (float | None): Chwila zlecenia oceny (time.perf_counter), od której liczony jest czas w kolejce.
+        """
+        with record_call(self.perf_log, self.model_label, PERF_TASK, course_name, queued_at=queued_at) as record:
+            labeled = self.lookup_label(course_name)
+            if labeled is not None:
+                record.parsed = labeled['pewność parsowania']
+                return labeled
+            return self.score_course(course_name, **kwargs)
+
+    def score_course(self, course_name: str, **kwargs) -> dict[str, Any]:
+        """
+        Ocenia jeden kurs: buduje prompt, wywołuje model i odczytuje oceny z odpowiedzi.
 
         Parametry:
             course_name (str): Nazwa kursu do oceny.
@@ -144,20 +252,220 @@ class CourseRanker(Agent):
 
         # self.llm.set_max_length(len(prompt)//2 + 200)
 
-        output = super().run(prompt,
-                             **kwargs
-                             )
-
-        keys = [
-            'prawidłowość przedmiotu',
-            'zgodność tematyki zajęć',
-            '}'
-        ]
+        output = self._call_llm(prompt, stop_early=self.stream_scores, **kwargs)
 
-        matches = extract_values_between_keys(output, keys)
+        result = OUTPUT_PARSER.parse(output)
+        current_record().parsed = result.confidence
+        matches = {'nazwa przedmiotu': 'ok', **result.values, 'pewność parsowania': result.confidence}
 
         print(matches)
 
         matches['nazwa przedmiotu'] = course_details
 
-        return matches
\ No newline at end of file
+        return matches
+
+    def _call_llm(self, prompt: str, stop_early: bool = False, **kwargs) -> str:
+        """
+        Wysyła prompt do modelu na czystej historii rozmowy, korzystając z cache, jeśli został podany.
+
+        Parametry:
+            prompt (str): Wyrenderowany prompt z danymi ankiety i kursu.
+            stop_early (bool): Czy czytać odpowiedź strumieniowo i uciąć ją po ostatniej ocenie.
+        """
+        llm_run = super().run
+        record = current_record()
+
+        def unlimited_call() -> str:
+            record.model_call()
+            if stop_early:
+                chunks = record.watch(stream_completion(self._init_kwargs.get("llm"), self.model_name,
+                                                        self.system_prompt, prompt, self.temperature, self.max_tokens,
+                                                        self.max_new_tokens))
+                output, _, _ = read_until_complete(chunks, OUTPUT_PARSER)
+                return output
+            llm = self._init_kwargs.get("llm")
+            if isinstance(llm, LLMBackend):
+                # swarms leaves the system prompt out when it calls a custom llm, so backends are called directly
+                return llm.generate(prompt, self.system_prompt, self.max_new_tokens)
+            self.reset_history()
+            return llm_run(prompt, **kwargs)
+
+        def call() -> str:
+            if self.rate_limiter is None:
+                return unlimited_call()
+            # OpenAI counts the larger of max_tokens and the prompt estimate against TPM up front
+            tokens = max(estimate_tokens(self.system_prompt + prompt), self.max_tokens)
+            return self.rate_limiter.call(unlimited_call, tokens=tokens)
+
+        if self.cache is None:
+            output = call()
+        else:
+            model_name = self.model_label
+            if stop_early:
+                model_name += " (stream)"  # Truncated answers must not be served to non-streaming runs
+            key = ResponseCache.make_key(model_name, self.system_prompt, prompt, self.temperature)
+            output = self.cache.get_or_call(key, call)
+        record.count_tokens(self.system_prompt + prompt, output)
+        return output
+
+    def spawn(self) -> "CourseRanker":
+        """
+        Tworzy nowego agenta z tymi samymi ustawieniami i danymi ankiety.
+        """
+        return type(self)(**self._init_kwargs)
+
+    def error_result(self, course_name: str, exc: Exception) -> dict[str, Any]:
+        """
+        Zwraca wynik oznaczony jako 'Błąd' dla kursu, którego nie udało się ocenić.
+
+        Parametry:
+            course_name (str): Nazwa kursu.
+            exc (Exception): Wyjątek zgłoszony podczas oceny.
+        """
+        print(f"Błąd podczas oceny kursu '{course_name}': {exc!r}")
+        return {'nazwa przedmiotu': 'Błąd',
+                'prawidłowość przedmiotu': 'Błąd',
+                'zgodność tematyki zajęć': -1}
+
+    def run_many(
+            self,
+            course_names: list[str],
+            concurrency: int = 4,
+            on_result: Optional[Callable[[str, dict[str, Any]], None]] = None,
+            **kwargs,
+    ) -> list[dict[str, Any]]:
+        """
+        Ocenia wiele kursów równolegle, z ograniczoną liczbą jednoczesnych zapytań do modelu.
+        Wyniki są zwracane w kolejności course_names, a błąd jednego kursu nie przerywa partii.
+        Agenci są pobierani z puli, więc powstaje ich najwyżej concurrency na cały czas życia agenta.
+
+        Parametry:
+            course_names (list[str]): Nazwy kursów do oceny.
+            concurrency (int): Maksymalna liczba jednoczesnych zapytań.
+            on_result (Callable | None): Wywoływana z (nazwa kursu, wynik) zaraz po ocenie każdego kursu
+                (poza wynikami 'Błąd'), np. do zapisu postępu w dzienniku.
+        """
+        queued_at = time.perf_counter()  # The executor queues every course at once
+        return run_many(
+            lambda course_name: self.get_pool().run(course_name, queued_at=queued_at, **kwargs),
+            course_names,
+            concurrency=concurrency,
+            on_error=self.error_result,
+            on_result=on_result,
+        )
+
+    def get_pool(self) -> AgentPool:
+        """
+        Zwraca pulę agentów wielokrotnego użytku, do której należy także ten agent.
+        """
+        if self._pool is None:
+            self._pool = AgentPool(self.spawn, agents=[self])
+        return self._pool
+
+    def run_batch_prompt(self, course_names: list[str], **kwargs) -> dict[str, dict[str, Any]]:
+        """
+        Ocenia kilka kursów w jednym zapytaniu do modelu.
+        Zwraca słownik nazwa kursu -> wynik tylko dla kursów, których rekord udało się odczytać.
+
+        Parametry:
+            course_names (list[str]): Nazwy kursów umieszczane w jednym prompcie.
+        """
+        course_details = [self.get_course_details(course_name) for course_name in course_names]
+        names_list = "\n".join(
+            f"                    {i}. '{details}'" for i, details in enumerate(course_details, start=1)
+        )
+
+        prompt = f"""
+                Ocen każdy z poniższych kursów na podstawie preferencji studenta:
+                    Preferencje studenta: {self.survey_data}
+                    Nazwy przedmiotów:
+{names_list}
+                    Dla każdego kursu zwróć osobny rekord, w kolejności listy, w formacie:
+                    {{'nr': {{numer kursu z listy}}, 'nazwa przedmiotu': {{nazwa przedmiotu}}, 'prawidłowość przedmiotu': {{tak/nie}}, 'zgodność tematyki zajęć': {{liczba 0-10}}}}
+                    Koniec wiadomości.
+                    {self.agent_name}: odpowiedź:
+            """
+
+        output = self._call_llm(prompt, **kwargs)
+        parsed = parse_batch_output(output, course_details)
+
+        return {course_name: parsed[details]
+                for course_name, details in zip(course_names, course_details) if details in parsed}
+
+    def run_batch(
+            self,
+            course_names: list[str],
+            batch_size: int = 10,
+            concurrency: int = 4,
+            max_retries: int = 2,
+            on_result: Optional[Callable[[str, dict[str, Any]], None]] = None,
+            **kwargs,
+    ) -> list[dict[str, Any]]:
+        """
+        Ocenia kursy partiami po batch_size nazw w jednym prompcie, wysyłając partie równolegle.
+        Kursy z aktualną oceną w topic_labels nie trafiają do promptów.
+        Kursy, których rekordu brakuje w odpowiedzi, są ponawiane w coraz mniejszych partiach;
+        po wyczerpaniu prób (albo gdy partia ma już jeden kurs) dostają wynik 'Błąd' z ostatnim błędem partii.
+        Wyniki są zwracane w kolejności course_names.
+
+        Parametry:
+            course_names (list[str]): Nazwy kursów do oceny.
+            batch_size (int): Liczba kursów w jednym prompcie.
+            concurrency (int): Maksymalna liczba jednoczesnych zapytań.
+            max_retries (int): Liczba ponowień dla brakujących kursów.
+            on_result (Callable | None): Wywoływana z (nazwa kursu, wynik) dla każdego odczytanego rekordu,
+                zaraz po jego partii.
+        """
+        results: dict[str, dict[str, Any]] = {}
+        pending = []
+        for course_name in dict.fromkeys(course_names):
+            labeled = self.lookup_label(course_name)
+            if labeled is None:
+                pending.append(course_name)
+                continue
+            results[course_name] = labeled
+            if on_result is not None:
+                on_result(course_name, labeled)
+
+        def score(batch: list[str]) -> dict[str, dict[str, Any]]:
+            with record_call(self.perf_log, self.model_label, PERF_TASK, batch[0], courses=len(batch),
+                             queued_at=queued_at) as record, self.get_pool().acquire() as agent:
+                batch_results = agent.run_batch_prompt(batch, **kwargs)
+                record.parsed = STRICT if len(batch_results) == len(batch) else PARTIAL if batch_results else FAILED
+                return batch_results
+
+        errors: dict[str, Exception] = {}
+
+        def batch_done(batch: list[str], batch_results: dict[str, dict[str, Any]]) -> None:
+            for course_name in batch:
+                if course_name not in batch_results:
+                    errors[course_name] = KeyError("brak rekordu w odpowiedzi modelu")
+            if on_result is not None:
+                for course_name, result in batch_results.items():
+                    on_result(course_name, result)
+
+        def batch_failed(batch: list[str], exc: Exception) -> dict[str, dict[str, Any]]:
+            print(f"Błąd podczas oceny partii {len(batch)} kursów od '{batch[0]}': {exc!r}")
+            for course_name in batch:
+                errors[course_name] = exc
+            return {}
+
+        previous_size = None
+        for attempt in range(max_retries + 1):
+            # The temperature is 0, so resending an identical batch would return the same answer
+            # (from the cache, if there is one): retries stop once single courses have been tried
+            size = max(1, batch_size // 2 ** attempt)
+            if not pending or size == previous_size:
+                break
+            previous_size = size
+            batches = [pending[i:i + size] for i in range(0, len(pending), size)]
+            queued_at = time.perf_counter()
+            for batch_results in run_many(score, batches, concurrency=concurrency,
+                                          on_error=batch_failed, on_result=batch_done):
+                results.update(batch_results)
+            pending = [course_name for course_name in pending if course_name not in results]
+
+        for course_name in pending:
+            results[course_name] = self.error_result(course_name, errors[course_name])
+
+        return [results[course_name] for course_name in course_names]
@@ -1,55 +1,60 @@
 # %%
 import json
 import time
-from typing import Any
-from swarms import Agent
-import re
+from typing import Any, Callable, Optional
 import ast
+import sys
+from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from common.agent_base import LazyAgent
+from common.backends.base import LLMBackend
+from common.backends.transformers_local import TransformersBackend
+from common.batch import AgentPool, run_many
+from common.course_catalog import CourseCatalog
+from common.output_parser import STRICT, OutputParser
+from common.perf_log import CallRecord, PerfLog, current_record, record_call
+from common.response_cache import ResponseCache
+from common.streaming import read_until_complete, stream_completion
+from common.survey import canonical_survey
 
-def find_key_positions(text, keys):
-    """Find all key positions in the text."""
-    positions = []
-    for key in keys:
-        for match in re.finditer(re.escape(key), text):
-            positions.append((match.start(), key))
-    # Sort by position in the text
-    return sorted(positions, key=lambda x: x[0])
 
+OUTPUT_PARSER = OutputParser(
+    score_keys=['zgodność tematyki zajęć'],
+    label_keys=['prawidłowość przedmiotu'],
+)
 
-def extract_values_between_keys(text, keys):
-    positions = find_key_positions(text, keys)
-    results = {'nazwa przedmiotu': 'ok',
-               'prawidłowość przedmiotu': 'ok',
-               'zgodność tematyki zajęć': -1}
+# Answers read from the next-token probabilities in the logit_scores mode
+LABEL_OPTIONS = ("tak", "nie")
+SCORE_OPTIONS = tuple(f" {score}" for score in range(11))
 
-    for i, (start_idx, key) in enumerate(positions):
-        key_end = start_idx + len(key)
-        end_idx = positions[i + 1][0] if i + 1 < len(positions) else len(text)
-        snippet = text[key_end:end_idx]
+# Task name in the performance log (common.perf_log)
+PERF_TASK = "filter"
 
-        if "liczba" in snippet:
-            continue  # Skip this snippet if it contains "Liczba"
+SYSTEM_PROMPT = """
+                Na podstawie preferencji studenta oraz samej nazwy przedmiotu przydziel ocenę oraz uzasadnienie tej oceny, obejmujące wady i zalety przedmiotu. Odpowiedź zwróć w formacie:
+                odpowiedź:{
+                    'nazwa przedmiotu': {nazwa przedmiotu},
+                    'prawidłowość przedmiotu':{tak/nie w zależności od tego czy pasuje czy nie}
+                    'zgodność tematyki zajęć':{liczba 0-10 odzwierciedlająca dopasowanie Opisu kursu do Preferencje studenta}
+                }
+            """
 
-        if key == 'prawidłowość przedmiotu':
-            match = snippet
-            if len(snippet) > 2:
-                results[key] = match
-        else:
-            match = re.search(r'\d{1,3}', snippet)
-            if match:
-                try:
-                    val = int(match.group())
-                    if key != '}' and val > results[key]:
-                        results[key] = val
-                except ValueError:
-                    continue  # Skip if not an int
+SCORES_ONLY_SYSTEM_PROMPT = """
+                Na podstawie preferencji studenta oraz samej nazwy przedmiotu przydziel ocenę. Zwróć wyłącznie odpowiedź w poniższym formacie, bez uzasadnienia i bez dodatkowego tekstu:
+                odpowiedź:{
+                    'nazwa przedmiotu': {nazwa przedmiotu},
+                    'prawidłowość przedmiotu':{tak/nie w zależności od tego czy pasuje czy nie}
+                    'zgodność tematyki zajęć':{liczba 0-10 odzwierciedlająca dopasowanie Opisu kursu do Preferencje studenta}
+                }
+            """
 
-    return results
+# Token budget of the scores-only variant - the answer dict alone, with a long course name
+SCORES_ONLY_MAX_TOKENS = 96
 
 
 # %%
-class CourseRanker(Agent):
+class CourseRanker(LazyAgent):
     """
     Agent oceniający kursy akademickie na podstawie ich szczegółowych metadanych.
     Odrzuca kursy, które nie spełniają określonych kryteriów.
@@ -65,6 +70,11 @@ class CourseRanker(Agent):
             model_name: str = "gemini/gemini-2.0-flash",
             dynamic_temperature_enabled: bool = False,
             output_type: str = "string",
+            cache: Optional[ResponseCache] = None,
+            stream_scores: bool = False,
+            scores_only: bool = False,
+            perf_log: Optional[PerfLog] = None,
+            logit_scores: bool = False,
             **kwargs: Any,
     ):
         """
@@ -76,6 +86,13 @@ class CourseRanker(Agent):
             max_tokens (int): Maksymalna liczba tokenów w odpowiedzi.
             model_name (str): Nazwa modelu AI do użycia.
             dynamic_temperature_enabled (bool): Czy dynamiczna temperatura jest włączona.
+            cache (ResponseCache | None): Trwały cache odpowiedzi modelu współdzielony przez agentów.
+            stream_scores (bool): Czy odczytywać odpowiedź strumieniowo i przerwać generowanie,
+                gdy wszystkie oceny są już znane (uzasadnienie nie jest wtedy generowane).
+            scores_only (bool): Czy użyć promptu bez uzasadnienia, z limitem SCORES_ONLY_MAX_TOKENS tokenów.
+            perf_log (PerfLog | None): Dziennik pomiarów każdego wywołania modelu (czasy, tokeny, cache, parsowanie).
+            logit_scores (bool): Czy z lokalnym TransformersBackend odczytywać oceny z prawdopodobieństw następnego
+                tokenu po ustalonym początku odpowiedzi (run_logit_batch) zamiast generować odpowiedź.
         """
 
         super().__init__(
@@ -83,16 +100,9 @@ class CourseRanker(Agent):
             agent_description="""
                 Jesteś obiektywnym doradcą akademickim wyspecjalizowanym w dopasowywaniu kursów do preferencji studentów. Komunikujesz się bezpośrednio ze studentem.
             """,
-            system_prompt="""
-                Na podstawie preferencji studenta oraz samej nazwy przedmiotu przydziel ocenę oraz uzasadnienie tej oceny, obejmujące wady i zalety przedmiotu. Odpowiedź zwróć w formacie:
-                odpowiedź:{
-                    'nazwa przedmiotu': {nazwa przedmiotu},
-                    'prawidłowość przedmiotu':{tak/nie w zależności od tego czy pasuje czy nie}
-                    'zgodność tematyki zajęć':{liczba 0-10 odzwierciedlająca dopasowanie Opisu kursu do Preferencje studenta}
-                }
-            """,
+            system_prompt=SCORES_ONLY_SYSTEM_PROMPT if scores_only else SYSTEM_PROMPT,
             max_loops=max_loops,
-            max_tokens=max_tokens,
+            max_tokens=min(max_tokens, SCORES_ONLY_MAX_TOKENS) if scores_only else max_tokens,
             temperature=0.0,
             model_name=model_name,
             dynamic_temperature_enabled=False,
@@ -100,31 +110,54 @@ class CourseRanker(Agent):
             **kwargs,
         )
 
-        self.survey_data = survey_data
+        self._init_kwargs = dict(
+            survey_data=survey_data,
+            courses_filename=courses_filename,
+            ranked_courses_filename=ranked_courses_filename,
+            max_loops=max_loops,
+            max_tokens=max_tokens,
+            model_name=model_name,
+            output_type=output_type,
+            cache=cache,
+            stream_scores=stream_scores,
+            scores_only=scores_only,
+            perf_log=perf_log,
+            logit_scores=logit_scores,
+            **kwargs,
+        )
+        self.survey_data = canonical_survey(survey_data)
         self.courses_filename = courses_filename
         self.ranked_courses_filename = ranked_courses_filename
+        self.cache = cache
+        self.stream_scores = stream_scores
+        # Backends keep their own response limit, except for the tight scores-only budget
+        self.max_new_tokens = self.max_tokens if scores_only else None
+        self.perf_log = perf_log
+        self.logit_scores = logit_scores
+        self.model_label = getattr(kwargs.get("llm"), "model_id", None) or model_name
+        self.catalog = CourseCatalog.load(courses_filename)
+        self._pool = None
 
     def get_course_details(self, course_name: str) -> dict[str, Any]:
         """
-        Pobiera szczegółowe metadane kursu z pliku JSON.
+        Pobiera szczegółowe metadane kursu ze współdzielonego katalogu.
 
         Parametry:
             course_name (str): Nazwa kursu do wyszukania.
         """
 
-        with open(self.courses_filename, "r", encoding='utf-8') as file:
-            courses_data = json.load(file)
-
-        course = courses_data[course_name]
+        course = self.catalog.get(course_name, ("Nazwa przedmiotu",))
         courses_dict = course["Nazwa przedmiotu"]
         return courses_dict
 
-    def run(self, course_name: str, **kwargs) -> dict[str, Any]:
+    def run(self, course_name: str, queued_at: Optional[float] = None, **kwargs) -> dict[str, Any]:
         """
         Uruchamia agenta do oceny kursu na podstawie metadanych i ankiety studenta.
+        Pomiary wywołania trafiają do perf_log, jeśli został podany.
 
         Parametry:
             course_name (str): Nazwa kursu do oceny.
+            queued_at (float | None): Chwila zlecenia oceny (time.perf_counter), od której liczony jest czas w kolejce.
         """
         print(f"""\n
             –––––––––––––––––––––––––––––––––––––––––––––––––––––––
@@ -133,9 +166,26 @@ class CourseRanker(Agent):
             –––––––––––––––––––––––––––––––––––––––––––––––––––––––
         \n""")
 
-        course_details = self.get_course_details(course_name)
+        if self.logit_scores and isinstance(self._init_kwargs.get("llm"), TransformersBackend):
+            return self.run_logit_batch([course_name])[0]
 
-        prompt = f"""
+        with record_call(self.perf_log, self.model_label, PERF_TASK, course_name, queued_at=queued_at) as record:
+            course_details = self.get_course_details(course_name)
+            prompt = self.build_prompt(course_name, course_details)
+            output = self._call_llm(prompt, stop_early=self.stream_scores, **kwargs)
+            result = self.parse_output(output, course_details)
+            record.parsed = result['pewność parsowania']
+            return result
+
+    def build_prompt(self, course_name: str, course_details: Any) -> str:
+        """
+        Buduje prompt oceny jednego kursu.
+
+        Parametry:
+            course_name (str): Nazwa kursu do oceny.
+            course_details: Dane kursu zwrócone przez get_course_details.
+        """
+        return f"""
                 Ocen kurs '{course_name}' na podstawie poniższych danych:
                     Preferencje studenta: {self.survey_data}
                     Nazwa przedmiotu: {course_details}
@@ -143,20 +193,279 @@ class CourseRanker(Agent):
                     {self.agent_name}: odpowiedź:
             """
 
-        output = super().run(prompt,
-                             **kwargs
-                             )
+    def parse_output(self, output: str, course_details: Any) -> dict[str, Any]:
+        """
+        Odczytuje oceny z odpowiedzi modelu.
 
-        keys = [
-            'prawidłowość przedmiotu',
-            'zgodność tematyki zajęć',
-            '}'
-        ]
+        Parametry:
+            output (str): Odpowiedź modelu.
+            course_details: Dane kursu zwrócone przez get_course_details.
+        """
+        result = OUTPUT_PARSER.parse(output)
+        return self.result_record(course_details, result.values, result.confidence)
 
-        matches = extract_values_between_keys(output, keys)
+    @staticmethod
+    def result_record(course_details: Any, values: dict[str, Any], confidence: str) -> dict[str, Any]:
+        """Result of one course in both scoring paths: printed with 'ok' as the name, returned with the course name."""
+        matches = {'nazwa przedmiotu': 'ok', **values, 'pewność parsowania': confidence}
 
         print(matches)
 
         matches['nazwa przedmiotu'] = course_details
 
-        return matches
\ No newline at end of file
+        return matches
+
+    def run_local_batch(
+            self,
+            course_names: list[str],
+            on_result: Optional[Callable[[str, dict[str, Any]], None]] = None,
+    ) -> list[dict[str, Any]]:
+        """
+        Ocenia kursy lokalnym modelem, wysyłając wiele promptów w jednym wywołaniu generate.
+        Odpowiedzi obecne w cache nie są generowane ponownie. Błąd jednej partii
+        daje wynik 'Błąd' tylko dla jej kursów. Wyniki są zwracane w kolejności course_names.
+
+        Parametry:
+            course_names (list[str]): Nazwy kursów do oceny.
+            on_result (Callable | None): Wywoływana z (nazwa kursu, wynik) dla każdego ocenionego kursu,
+                zaraz po jego partii.
+        """
+        backend = self._init_kwargs["llm"]
+        results: dict[int, dict[str, Any]] = {}
+        outputs: dict[int, str] = {}
+        details: dict[int, Any] = {}
+        prompts: dict[int, str] = {}
+
+        queued_at = time.perf_counter()
+        queued_at_wall = time.time()
+
+        def log(i: int, started: float, finished: float, output: str = "", cache_hit: bool = False,
+                error: Optional[Exception] = None) -> None:
+            # Every course of a generate call gets the latency of the whole call, as its answer waits for it
+            if self.perf_log is None:
+                return
+            record = CallRecord(self.model_label, PERF_TASK, course_names[i], started=queued_at_wall,
+                                queue_wait=started - queued_at, latency=finished - started,
+                                cache_hit=cache_hit, error=None if error is None else repr(error))
+            if error is None:
+                record.parsed = results[i]['pewność parsowania']
+                record.count_tokens(self.system_prompt + prompts[i], output)
+            self.perf_log.append(record)
+
+        def finish(i: int, output: str) -> None:
+            results[i] = self.parse_output(output, details[i])
+            if on_result is not None:
+                on_result(course_names[i], results[i])
+
+        for i, course_name in enumerate(course_names):
+            try:
+                details[i] = self.get_course_details(course_name)
+            except KeyError as exc:
+                results[i] = self.error_result(course_name, exc)
+                continue
+            prompts[i] = self.build_prompt(course_name, details[i])
+            if self.cache is not None:
+                started = time.perf_counter()
+                cached = self.cache.get(self.cache_key(prompts[i], self.stream_scores))
+                finished = time.perf_counter()
+                if cached is not None:
+                    outputs[i] = cached
+                    finish(i, cached)
+                    log(i, started, finished, cached, cache_hit=True)
+
+        missing = [i for i in prompts if i not in outputs]
+        for start in range(0, len(missing), backend.batch_size):
+            chunk = missing[start:start + backend.batch_size]
+            started = time.perf_counter()
+            try:
+                generated = backend.generate_batch(
+                    [prompts[i] for i in chunk],
+                    system_prompt=self.system_prompt,
+                    max_new_tokens=self.max_new_tokens,
+                    stop_when=OUTPUT_PARSER.settled if self.stream_scores else None,
+                )
+            except Exception as exc:
+                for i in chunk:
+                    results[i] = self.error_result(course_names[i], exc)
+                    log(i, started, time.perf_counter(), error=exc)
+                continue
+            finished = time.perf_counter()
+            for i, output in zip(chunk, generated):
+                outputs[i] = output
+                if self.cache is not None:
+                    self.cache.put(self.cache_key(prompts[i], self.stream_scores), output)
+                finish(i, output)
+                log(i, started, finished, output)
+
+        return [results[i] for i in range(len(course_names))]
+
+    def run_logit_batch(
+            self,
+            course_names: list[str],
+            on_result: Optional[Callable[[str, dict[str, Any]], None]] = None,
+    ) -> list[dict[str, Any]]:
+        """
+        Ocenia kursy lokalnym modelem bez generowania odpowiedzi: po początku odpowiedzi w formacie agenta
+        odczytuje z logitów prawdopodobieństwa 'tak'/'nie' dla 'prawidłowość przedmiotu', a następnie
+        (po odpowiedzi o największym prawdopodobieństwie) ocen 0-10 dla 'zgodność tematyki zajęć'.
+        Jeden przebieg modelu na partię kursów i wymiar, bez parsowania. Wynik zawiera ocenę najbardziej
+        prawdopodobną, ocenę oczekiwaną i prawdopodobieństwa obu odpowiedzi. Wyniki w kolejności course_names.
+
+        Parametry:
+            course_names (list[str]): Nazwy kursów do oceny.
+            on_result (Callable | None): Wywoływana z (nazwa kursu, wynik) dla każdego ocenionego kursu,
+                zaraz po jego partii.
+        """
+        backend = self._init_kwargs["llm"]
+        results: dict[int, dict[str, Any]] = {}
+        details: dict[int, Any] = {}
+        queued_at = time.perf_counter()
+        queued_at_wall = time.time()
+
+        for i, course_name in enumerate(course_names):
+            try:
+                details[i] = self.get_course_details(course_name)
+            except KeyError as exc:
+                results[i] = self.error_result(course_name, exc)
+
+        def log(i: int, started: float, finished: float, answer: str = "", error: Optional[Exception] = None) -> None:
+            # Every course of a batch gets the latency of the whole batch, as its scores wait for it
+            if self.perf_log is None:
+                return
+            record = CallRecord(self.model_label, PERF_TASK, course_names[i], started=queued_at_wall,
+                                queue_wait=started - queued_at, latency=finished - started,
+                                error=None if error is None else repr(error))
+            if error is None:
+                record.parsed = STRICT
+                record.count_tokens(self.system_prompt + prompts[i] + answer, "")
+            self.perf_log.append(record)
+
+        pending = list(details)
+        prompts = {i: self.build_prompt(course_names[i], details[i]) for i in pending}
+        for start in range(0, len(pending), backend.batch_size):
+            chunk = pending[start:start + backend.batch_size]
+            answers = [f"odpowiedź:{{'nazwa przedmiotu': '{details[i]}', 'prawidłowość przedmiotu': '" for i in chunk]
+            started = time.perf_counter()
+            try:
+                labels = backend.score_options([prompts[i] for i in chunk], answers, LABEL_OPTIONS,
+                                               self.system_prompt)
+                answers = [f"{answer}{label.best}', 'zgodność tematyki zajęć':"
+                           for answer, label in zip(answers, labels)]
+                scores = backend.score_options([prompts[i] for i in chunk], answers, SCORE_OPTIONS,
+                                               self.system_prompt)
+            except Exception as exc:
+                for i in chunk:
+                    results[i] = self.error_result(course_names[i], exc)
+                    log(i, started, time.perf_counter(), error=exc)
+                continue
+            finished = time.perf_counter()
+
+            for i, answer, label, score in zip(chunk, answers, labels, scores):
+                results[i] = self.result_record(details[i], {
+                    'prawidłowość przedmiotu': label.best,
+                    'zgodność tematyki zajęć': int(score.best),
+                    'oczekiwana zgodność tematyki zajęć': round(score.expected(), 2),
+                    'prawdopodobieństwo prawidłowości': round(label.confidence, 3),
+                    'prawdopodobieństwo oceny': round(score.confidence, 3),
+                }, STRICT)
+                log(i, started, finished, answer)
+                if on_result is not None:
+                    on_result(course_names[i], results[i])
+
+        return [results[i] for i in range(len(course_names))]
+
+    def _call_llm(self, prompt: str, stop_early: bool = False, **kwargs) -> str:
+        """
+        Wysyła prompt do modelu na czystej historii rozmowy, korzystając z cache, jeśli został podany.
+
+        Parametry:
+            prompt (str): Wyrenderowany prompt z danymi ankiety i kursu.
+            stop_early (bool): Czy czytać odpowiedź strumieniowo i uciąć ją po ostatniej ocenie.
+        """
+        llm_run = super().run
+        record = current_record()
+
+        def call() -> str:
+            record.model_call()
+            if stop_early:
+                chunks = record.watch(stream_completion(self._init_kwargs.get("llm"), self.model_name,
+                                                        self.system_prompt, prompt, self.temperature, self.max_tokens,
+                                                        self.max_new_tokens))
+                output, _, _ = read_until_complete(chunks, OUTPUT_PARSER)
+                return output
+            llm = self._init_kwargs.get("llm")
+            if isinstance(llm, LLMBackend):
+                # swarms leaves the system prompt out when it calls a custom llm, so backends are called directly
+                return llm.generate(prompt, self.system_prompt, self.max_new_tokens)
+            self.reset_history()
+            return llm_run(prompt, **kwargs)
+
+        if self.cache is None:
+            output = call()
+        else:
+            output = self.cache.get_or_call(self.cache_key(prompt, stop_early), call)
+        record.count_tokens(self.system_prompt + prompt, output)
+        return output
+
+    def cache_key(self, prompt: str, stop_early: bool = False) -> str:
+        """Cache key of a rendered prompt for this agent's model, system prompt and temperature."""
+        model_name = self.model_label
+        if stop_early:
+            model_name += " (stream)"  # Truncated answers must not be served to non-streaming runs
+        return ResponseCache.make_key(model_name, self.system_prompt, prompt, self.temperature)
+
+    def spawn(self) -> "CourseRanker":
+        """
+        Tworzy nowego agenta z tymi samymi ustawieniami i danymi ankiety.
+        """
+        return type(self)(**self._init_kwargs)
+
+    def error_result(self, course_name: str, exc: Exception) -> dict[str, Any]:
+        """
+        Zwraca wynik oznaczony jako 'Błąd' dla kursu, którego nie udało się ocenić.
+
+        Parametry:
+            course_name (str): Nazwa kursu.
+            exc (Exception): Wyjątek zgłoszony podczas oceny.
+        """
+        print(f"Błąd podczas oceny kursu '{course_name}': {exc!r}")
+        return {'nazwa przedmiotu': 'Błąd',
+                'prawidłowość przedmiotu': 'Błąd',
+                'zgodność tematyki zajęć': -1}
+
+    def run_many(
+            self,
+            course_names: list[str],
+            concurrency: int = 4,
+            on_result: Optional[Callable[[str, dict[str, Any]], None]] = None,
+            **kwargs,
+    ) -> list[dict[str, Any]]:
+        """
+        Ocenia wiele kursów równolegle, z ograniczoną liczbą jednoczesnych zapytań do modelu.
+        Wyniki są zwracane w kolejności course_names, a błąd jednego kursu nie przerywa partii.
+        Agenci są pobierani z puli, więc powstaje ich najwyżej concurrency na cały czas życia agenta.
+        Z lokalnym TransformersBackend kursy są oceniane partiami przez run_local_batch
+        (albo run_logit_batch, gdy logit_scores).
+
+        Parametry:
+            course_names (list[str]): Nazwy kursów do oceny.
+            concurrency (int): Maksymalna liczba jednoczesnych zapytań.
+            on_result (Callable | None): Wywoływana z (nazwa kursu, wynik) zaraz po ocenie każdego kursu
+                (poza wynikami 'Błąd'), np. do zapisu postępu w dzienniku.
+        """
+        if isinstance(self._init_kwargs.get("llm"), TransformersBackend):
+            if self.logit_scores:
+                return self.run_logit_batch(course_names, on_result=on_result)
+            return self.run_local_batch(course_names, on_result=on_result)
+
+        if self._pool is None:
+            self._pool = AgentPool(self.spawn, agents=[self])
+
+        queued_at = time.perf_counter()  # The executor queues every course at once
+        return run_many(
+            lambda course_name: self._pool.run(course_name, queued_at=queued_at, **kwargs),
+            course_names,
+            concurrency=concurrency,
+            on_error=self.error_result,
+            on_result=on_result,
+        )
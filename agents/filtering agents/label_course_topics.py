@@ -0,0 +1,59 @@
+#%%
+from course_ranker import CourseRanker
+from common.course_catalog import CourseCatalog
+from common.perf_log import PerfLog, summarize
+from common.rate_limit import RateLimiter
+from common.response_cache import ResponseCache
+from common.topic_labels import TOPIC_KEY, TopicLabels, read_categories
+import time
+import os
+
+#%%
+if __name__ == "__main__":
+    os.environ["OPENAI_API_KEY"] = ### Your token goes here
+
+    model_name = "gpt-4o-mini"
+    # Persistent LLM response cache, shared with the filtering sweep
+    cache = ResponseCache(f"llm_cache_{model_name.replace('/', '_')}.sqlite")
+    # Maximum number of requests in flight at once
+    concurrency = 8
+    # Client-side RPM/TPM limits of the API key (tier 1 here); 429s and timeouts are retried with backoff
+    rate_limiter = RateLimiter(rpm=500, tpm=200_000, max_concurrency=concurrency)
+    # Number of course names sent in one prompt
+    batch_size = 10
+    # Latency, tokens, cache hits and parsing of every model call; summary: python -m common.perf_log <file>
+    perf_log = PerfLog(f"output/perf_labels_{model_name.replace('/', '_')}.jsonl")
+
+    courses_filename = "oguny.json"
+    catalog = CourseCatalog.load(courses_filename)
+    # The fixed set of topics students filter by
+    categories = read_categories("courses_with_categories.csv")
+
+    # Score of every (course, topic) pair; a rerun only scores courses that are new or whose description changed
+    topic_labels = TopicLabels("output/topic_labels.sqlite")
+
+    def score_many(category, course_names, on_result):
+        filter_agent = CourseRanker(
+            {TOPIC_KEY: category},
+            courses_filename,
+            model_name=model_name,
+            cache=cache,
+            perf_log=perf_log,
+            rate_limiter=rate_limiter,
+        )
+        return filter_agent.run_batch(course_names, batch_size=batch_size, concurrency=concurrency,
+                                      on_result=on_result)
+
+    start_time = time.time()
+    counts = topic_labels.update(catalog, categories, score_many, model=model_name,
+                                 variant=CourseRanker.label_variant())
+    print(f"############## {len(catalog)} courses x {len(categories)} topics: {counts}, "
+          f"elapsed time: {time.time() - start_time:.1f}s ##############")
+
+    for category in categories:
+        print(category, len(topic_labels.matching(category)), "matching courses")
+
+    print("LLM cache:", cache.stats())
+    if perf_log.path.exists():
+        print(summarize(PerfLog.load([perf_log.path])).round(3).T.to_string())
+    print("Rate limiter:", rate_limiter.stats())
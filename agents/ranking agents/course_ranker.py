@@ -1,48 +1,68 @@
 #%%
 import json
+import math
 import time
-from typing import Any
-from swarms import Agent
-import re
+from typing import Any, Callable, Optional
 import ast
+import sys
+from pathlib import Path
 
-def find_key_positions(text, keys):
-    """Find all key positions in the text."""
-    positions = []
-    for key in keys:
-        for match in re.finditer(re.escape(key), text):
-            positions.append((match.start(), key))
-    # Sort by position in the text
-    return sorted(positions, key=lambda x: x[0])
-
-
-def extract_values_between_keys(text, keys):
-    positions = find_key_positions(text, keys)
-    results = {'nazwa przedmiotu': 'ok',
-        'zgodność tematyki zajęć': -1,
-        'zgodność trybu prowadzenia zajęć': -1,
-        'zgodność rodzaju zaliczenia': -1}
-
-    for i, (start_idx, key) in enumerate(positions):
-        key_end = start_idx + len(key)
-        end_idx = positions[i + 1][0] if i + 1 < len(positions) else len(text)
-        snippet = text[key_end:end_idx]
-
-        if "liczba" in snippet:
-            continue  # Skip this snippet if it contains "Liczba"
-
-        match = re.search(r'\d{1,3}', snippet)
-        if match:
-            try:
-                val = int(match.group())
-                if key != '}' and val > results[key]:
-                    results[key] = val
-            except ValueError:
-                continue  # Skip if not an int
-
-    return results
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from common.agent_base import LazyAgent
+from common.backends.base import LLMBackend
+from common.batch import AgentPool, run_many
+from common.course_catalog import CourseCatalog, PROMPT_FIELDS
+from common.output_parser import FAILED, PARTIAL, STRICT, TOLERANT, OutputParser
+from common.perf_log import PerfLog, current_record, record_call
+from common.prompt_compaction import PromptCompactor
+from common.rate_limit import RateLimiter, estimate_tokens
+from common.response_cache import ResponseCache
+from common.streaming import read_until_complete, stream_completion
+from common.structured_scorer import StructuredScorer
+from common.survey import ASSESSMENT_PREFERENCE, MODE_PREFERENCE, NO_PREFERENCE_VALUE, canonical_survey
+from common.topic_labels import TOPIC_KEY
+
+OUTPUT_PARSER = OutputParser([
+    'zgodność tematyki zajęć',
+    'zgodność trybu prowadzenia zajęć',
+    'zgodność rodzaju zaliczenia',
+])
+
+# Ranking dimensions scored one at a time (per_dimension): the survey answer and the course fields each one needs
+DIMENSIONS = {
+    'zgodność tematyki zajęć': (TOPIC_KEY, ("Skrócony opis", "Pełny opis", "Efekty uczenia się")),
+    'zgodność trybu prowadzenia zajęć': (MODE_PREFERENCE, ("Tryb prowadzenia",)),
+    'zgodność rodzaju zaliczenia': (ASSESSMENT_PREFERENCE, ("Metody i kryteria oceniania",)),
+}
+DIMENSION_PARSERS = {dimension: OutputParser([dimension]) for dimension in DIMENSIONS}
+
+# Task name in the performance log (common.perf_log)
+PERF_TASK = "rank"
+
+SYSTEM_PROMPT = """
+                Na podstawie preferencji studenta oraz opisu przedmiotu przydziel ocenę przedmiotu, uzasadnienie tej oceny, obejmujące wady i zalety przedmiotu. Odpowiedź zwróć w formacie:
+                odpowiedź:{
+                    'nazwa przedmiotu': {nazwa przedmiotu},
+                    'zgodność tematyki zajęć':{liczba 0-10 odzwierciedlająca dopasowanie Opisu kursu do Preferencje studenta},
+                    'zgodność trybu prowadzenia zajęć':{liczba 0-10 odzwierciedlająca dopasowanie Opisu kursu do Preferencje studenta},
+                    'zgodność rodzaju zaliczenia':{liczba 0-10 odzwierciedlająca dopasowanie Opisu kursu do Preferencje studenta}
+                }
+            """
+
+SCORES_ONLY_SYSTEM_PROMPT = """
+                Na podstawie preferencji studenta oraz opisu przedmiotu przydziel ocenę przedmiotu. Zwróć wyłącznie odpowiedź w poniższym formacie, bez uzasadnienia i bez dodatkowego tekstu:
+                odpowiedź:{
+                    'nazwa przedmiotu': {nazwa przedmiotu},
+                    'zgodność tematyki zajęć':{liczba 0-10 odzwierciedlająca dopasowanie Opisu kursu do Preferencje studenta},
+                    'zgodność trybu prowadzenia zajęć':{liczba 0-10 odzwierciedlająca dopasowanie Opisu kursu do Preferencje studenta},
+                    'zgodność rodzaju zaliczenia':{liczba 0-10 odzwierciedlająca dopasowanie Opisu kursu do Preferencje studenta}
+                }
+            """
+
+# Token budget of the scores-only variant - the answer dict alone, with a long course name
+SCORES_ONLY_MAX_TOKENS = 128
 #%%
-class CourseRanker(Agent):
+class CourseRanker(LazyAgent):
     """
     Agent oceniający kursy akademickie na podstawie ich szczegółowych metadanych.
     Odrzuca kursy, które nie spełniają określonych kryteriów.
@@ -58,6 +78,14 @@ class CourseRanker(Agent):
         model_name: str = "gemini/gemini-2.0-flash",
         dynamic_temperature_enabled: bool = False,
         output_type: str = "string",
+        cache: Optional[ResponseCache] = None,
+        structured_scorer: Optional[StructuredScorer] = None,
+        stream_scores: bool = False,
+        scores_only: bool = False,
+        perf_log: Optional[PerfLog] = None,
+        compactor: Optional[PromptCompactor] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        per_dimension: bool = False,
         **kwargs: Any,
     ):
         """
@@ -69,24 +97,33 @@ class CourseRanker(Agent):
             max_tokens (int): Maksymalna liczba tokenów w odpowiedzi.
             model_name (str): Nazwa modelu AI do użycia.
             dynamic_temperature_enabled (bool): Czy dynamiczna temperatura jest włączona.
+            cache (ResponseCache | None): Trwały cache odpowiedzi modelu współdzielony przez agentów.
+            structured_scorer (StructuredScorer | None): Reguły oceniające tryb i rodzaj zaliczenia z pól
+                strukturalnych; model ocenia wtedy tylko tematykę (lub wymiar bez danych).
+            stream_scores (bool): Czy odczytywać odpowiedź strumieniowo i przerwać generowanie,
+                gdy wszystkie oceny są już znane (uzasadnienie nie jest wtedy generowane).
+            scores_only (bool): Czy użyć promptu bez uzasadnienia, z limitem SCORES_ONLY_MAX_TOKENS tokenów.
+            perf_log (PerfLog | None): Dziennik pomiarów każdego wywołania modelu (czasy, tokeny, cache, parsowanie).
+            compactor (PromptCompactor | None): Jeśli podany, do promptu trafia zwięzły opis kursu
+                (bez szablonowego tekstu, z budżetem tokenów na pole) zamiast pełnych pól katalogu.
+            rate_limiter (RateLimiter | None): Współdzielony harmonogram wywołań (limity RPM/TPM, ponawianie
+                po 429 i przekroczeniu czasu); swarms nie ponawia wtedy wywołań samodzielnie.
+            per_dimension (bool): Czy oceniać każdy wymiar (DIMENSIONS) osobnym zapytaniem zawierającym tylko
+                odpowiedź ankiety dla tego wymiaru i potrzebne pola kursu. Odpowiedzi z cache są wtedy
+                wspólne dla wszystkich ankiet z tą samą preferencją w danym wymiarze.
         """
+        if rate_limiter is not None:
+            # Immediate retries inside swarms would only add to the 429s; the limiter backs off instead
+            kwargs.setdefault("retry_attempts", 1)
         
         super().__init__(
             agent_name="Pomocnik oceniający dopasowanie przedmiotów do preferencji studenta.",
             agent_description="""
                 Jesteś obiektywnym doradcą akademickim wyspecjalizowanym w dopasowywaniu kursów do preferencji studentów. Komunikujesz się bezpośrednio ze studentem.
             """,
-            system_prompt="""
-                Na podstawie preferencji studenta oraz opisu przedmiotu przydziel ocenę przedmiotu, uzasadnienie tej oceny, obejmujące wady i zalety przedmiotu. Odpowiedź zwróć w formacie:
-                odpowiedź:{
-                    'nazwa przedmiotu': {nazwa przedmiotu},
-                    'zgodność tematyki zajęć':{liczba 0-10 odzwierciedlająca dopasowanie Opisu kursu do Preferencje studenta},
-                    'zgodność trybu prowadzenia zajęć':{liczba 0-10 odzwierciedlająca dopasowanie Opisu kursu do Preferencje studenta},
-                    'zgodność rodzaju zaliczenia':{liczba 0-10 odzwierciedlająca dopasowanie Opisu kursu do Preferencje studenta}
-                }
-            """,
+            system_prompt=SCORES_ONLY_SYSTEM_PROMPT if scores_only else SYSTEM_PROMPT,
             max_loops=max_loops,
-            max_tokens=max_tokens,
+            max_tokens=min(max_tokens, SCORES_ONLY_MAX_TOKENS) if scores_only else max_tokens,
             temperature=0.0,
             model_name=model_name,
             dynamic_temperature_enabled=False,
@@ -94,43 +131,77 @@ class CourseRanker(Agent):
             **kwargs,
         )
         
-        self.survey_data = survey_data
+        self._init_kwargs = dict(
+            survey_data=survey_data,
+            courses_filename=courses_filename,
+            ranked_courses_filename=ranked_courses_filename,
+            max_loops=max_loops,
+            max_tokens=max_tokens,
+            model_name=model_name,
+            output_type=output_type,
+            cache=cache,
+            structured_scorer=structured_scorer,
+            stream_scores=stream_scores,
+            scores_only=scores_only,
+            perf_log=perf_log,
+            compactor=compactor,
+            rate_limiter=rate_limiter,
+            per_dimension=per_dimension,
+            **kwargs,
+        )
+        self.survey_data = canonical_survey(survey_data)
         self.courses_filename = courses_filename
         self.ranked_courses_filename = ranked_courses_filename
+        self.cache = cache
+        self.stream_scores = stream_scores
+        # Backends keep their own response limit, except for the tight scores-only budget
+        self.max_new_tokens = self.max_tokens if scores_only else None
+        self.perf_log = perf_log
+        self.compactor = compactor
+        self.model_label = getattr(kwargs.get("llm"), "model_id", None) or model_name
+        self.rate_limiter = rate_limiter
+        self.per_dimension = per_dimension
+        self.structured_scores = structured_scorer.score(self.survey_data) if structured_scorer is not None else None
+        self.catalog = CourseCatalog.load(courses_filename)
+        self._pool = None
 
     def get_course_details(self, course_name: str) -> dict[str, Any]:
         """
-        Pobiera szczegółowe metadane kursu z pliku JSON.
+        Pobiera szczegółowe metadane kursu ze współdzielonego katalogu.
 
         Parametry:
             course_name (str): Nazwa kursu do wyszukania.
         """
+        if self.compactor is not None:
+            return self.catalog.compact(course_name, self.compactor)
 
-        with open(self.courses_filename, "r", encoding='utf-8') as file:
-            courses_data = json.load(file)
-
-        course = courses_data[course_name]
+        course = self.catalog.get(course_name)
         courses_dict = {
             "Nazwa przedmiotu": course["Nazwa przedmiotu"]
         }
-        if "Tryb prowadzenia" in course.keys():
-            courses_dict["Tryb prowadzenia"] = course["Tryb prowadzenia"]
-        if "Skrócony opis" in course.keys():
-            courses_dict["Skrócony opis"] = course["Skrócony opis"]
-        if "Pełny opis" in course.keys():
-            courses_dict["Pełny opis"] = course["Pełny opis"]
-        if "Efekty uczenia się" in course.keys():
-            courses_dict["Efekty uczenia się"] = course["Efekty uczenia się"]
-        if "Metody i kryteria oceniania" in course.keys():
-            courses_dict["Metody i kryteria oceniania"] = course["Metody i kryteria oceniania"]
+        for field in PROMPT_FIELDS:
+            if field in course:
+                courses_dict[field] = course[field]
 
         return courses_dict
 
 
-    def run(self, course_name: str, **kwargs) -> dict[str, Any]:
+    def run(self, course_name: str, queued_at: Optional[float] = None, **kwargs) -> dict[str, Any]:
         """
         Uruchamia agenta do oceny kursu na podstawie metadanych i ankiety studenta.
-        
+        Pomiary wywołania trafiają do perf_log, jeśli został podany.
+
+        Parametry:
+            course_name (str): Nazwa kursu do oceny.
+            queued_at (float | None): Chwila zlecenia oceny (time.perf_counter), od której liczony jest czas w kolejce.
+        """
+        with record_call(self.perf_log, self.model_label, PERF_TASK, course_name, queued_at=queued_at):
+            return self.score_course(course_name, **kwargs)
+
+    def score_course(self, course_name: str, **kwargs) -> dict[str, Any]:
+        """
+        Ocenia jeden kurs: buduje prompt, wywołuje model i odczytuje oceny z odpowiedzi.
+
         Parametry:
             course_name (str): Nazwa kursu do oceny.
         """
@@ -142,8 +213,30 @@ class CourseRanker(Agent):
         \n""")
 
         course_details = self.get_course_details(course_name)
+        rule_scores = self.get_structured_scores(course_details['Nazwa przedmiotu'])
 
-        prompt = f"""
+        if self.per_dimension:
+            matches = {'nazwa przedmiotu': 'ok', **self.score_dimensions(course_details, rule_scores, **kwargs)}
+            matches['nazwa przedmiotu'] = course_details['Nazwa przedmiotu']
+            return matches
+
+        parser = OUTPUT_PARSER
+        if len(rule_scores) == 2:
+            # Mode and assessment come from the rules, the model only judges the topic
+            parser = DIMENSION_PARSERS['zgodność tematyki zajęć']
+            topic_details = {field: value for field, value in course_details.items()
+                             if field not in ("Tryb prowadzenia", "Metody i kryteria oceniania")}
+            prompt = f"""
+                Ocen wyłącznie zgodność tematyki kursu '{course_name}' na podstawie poniższych danych:
+                    Preferowana tematyka zajęć: {self.survey_data.get("Preferowana tematyka zajęć", "nie mam preferencji")}
+                    Opis kursu: {topic_details}
+                    Odpowiedź zwróć w formacie:
+                    odpowiedź:{{'nazwa przedmiotu': {{nazwa przedmiotu}}, 'zgodność tematyki zajęć': {{liczba 0-10}}}}
+                    Koniec wiadomości.
+                    {self.agent_name}: odpowiedź:
+            """
+        else:
+            prompt = f"""
                 Ocen kurs '{course_name}' na podstawie poniższych danych:
                     Preferencje studenta: {self.survey_data}
                     Opis kursu: {course_details}
@@ -153,18 +246,167 @@ class CourseRanker(Agent):
 
         # self.llm.set_max_length(len(prompt)//2 + 200)
 
-        output = super().run(prompt,
-            **kwargs
-        )
-
-        keys = [
-            'zgodność tematyki zajęć',
-            'zgodność trybu prowadzenia zajęć',
-            'zgodność rodzaju zaliczenia',
-            '}'
-        ]
+        output = self._call_llm(prompt, stop_early=self.stream_scores, parser=parser, **kwargs)
 
-        matches = extract_values_between_keys(output, keys)
+        result = parser.parse(output)
+        current_record().parsed = result.confidence
+        matches = {'nazwa przedmiotu': 'ok', **result.values, 'pewność parsowania': result.confidence}
+        matches.update(rule_scores)
         matches['nazwa przedmiotu'] = course_details['Nazwa przedmiotu']
 
-        return matches
\ No newline at end of file
+        return matches
+
+    def score_dimensions(self, course_details: dict[str, Any], rule_scores: dict[str, int],
+                         **kwargs) -> dict[str, Any]:
+        """
+        Ocenia osobnym zapytaniem każdy wymiar bez oceny z reguł. Prompt zależy tylko od kursu, wymiaru
+        i kanonicznej odpowiedzi ankiety w tym wymiarze, więc z cache korzystają też studenci,
+        których ankiety różnią się w pozostałych wymiarach.
+
+        Parametry:
+            course_details (dict[str, Any]): Dane kursu zwrócone przez get_course_details.
+            rule_scores (dict[str, int]): Oceny wyznaczone regułami (get_structured_scores).
+        """
+        course_name = course_details['Nazwa przedmiotu']
+        scores: dict[str, Any] = {}
+        confidences = []
+        for dimension, (preference_key, fields) in DIMENSIONS.items():
+            if dimension in rule_scores:
+                scores[dimension] = rule_scores[dimension]
+                continue
+            details = {field: course_details[field] for field in ("Nazwa przedmiotu", *fields)
+                       if field in course_details}
+            prompt = f"""
+                Ocen wyłącznie {dimension} kursu '{course_name}' na podstawie poniższych danych:
+                    {preference_key}: {self.survey_data.get(preference_key, NO_PREFERENCE_VALUE)}
+                    Opis kursu: {details}
+                    Odpowiedź zwróć w formacie:
+                    odpowiedź:{{'nazwa przedmiotu': {{nazwa przedmiotu}}, '{dimension}': {{liczba 0-10}}}}
+                    Koniec wiadomości.
+                    {self.agent_name}: odpowiedź:
+            """
+            parser = DIMENSION_PARSERS[dimension]
+            result = parser.parse(self._call_llm(prompt, stop_early=self.stream_scores, parser=parser, **kwargs))
+            scores[dimension] = result.values[dimension]
+            confidences.append(result.confidence)
+
+        # The least trustworthy answer; some dimensions failed but not all -> PARTIAL
+        if not confidences:
+            confidence = STRICT
+        elif all(confidence == FAILED for confidence in confidences):
+            confidence = FAILED
+        elif FAILED in confidences or PARTIAL in confidences:
+            confidence = PARTIAL
+        else:
+            confidence = TOLERANT if TOLERANT in confidences else STRICT
+        current_record().parsed = confidence
+        scores['pewność parsowania'] = confidence
+        return scores
+
+    def get_structured_scores(self, course_name: str) -> dict[str, int]:
+        """
+        Zwraca oceny trybu i rodzaju zaliczenia wyznaczone regułami (bez wymiarów, dla których brak danych).
+
+        Parametry:
+            course_name (str): Nazwa kursu.
+        """
+        if self.structured_scores is None or course_name not in self.structured_scores.index:
+            return {}
+        row = self.structured_scores.loc[course_name]
+        return {key: int(value) for key, value in row.items() if not math.isnan(value)}
+
+    def _call_llm(self, prompt: str, stop_early: bool = False, parser: OutputParser = OUTPUT_PARSER,
+                  **kwargs) -> str:
+        """
+        Wysyła prompt do modelu na czystej historii rozmowy, korzystając z cache, jeśli został podany.
+
+        Parametry:
+            prompt (str): Wyrenderowany prompt z danymi ankiety i kursu.
+            stop_early (bool): Czy czytać odpowiedź strumieniowo i uciąć ją po ostatniej ocenie.
+            parser (OutputParser): Parser ocen oczekiwanych w odpowiedzi, do ucięcia strumienia.
+        """
+        llm_run = super().run
+        record = current_record()
+        llm = self._init_kwargs.get("llm")
+
+        def unlimited_call() -> str:
+            record.model_call()
+            if stop_early:
+                chunks = record.watch(stream_completion(llm, self.model_name, self.system_prompt, prompt,
+                                                        self.temperature, self.max_tokens,
+                                                        self.max_new_tokens))
+                output, _, _ = read_until_complete(chunks, parser)
+                return output
+            if isinstance(llm, LLMBackend):
+                # swarms leaves the system prompt out when it calls a custom llm, so backends are called directly
+                return llm.generate(prompt, self.system_prompt, self.max_new_tokens)
+            self.reset_history()
+            return llm_run(prompt, **kwargs)
+
+        def call() -> str:
+            if self.rate_limiter is None:
+                return unlimited_call()
+            # OpenAI counts the larger of max_tokens and the prompt estimate against TPM up front
+            tokens = max(estimate_tokens(self.system_prompt + prompt), self.max_tokens)
+            return self.rate_limiter.call(unlimited_call, tokens=tokens)
+
+        if self.cache is None:
+            output = call()
+        else:
+            model_name = self.model_label
+            if stop_early:
+                model_name += " (stream)"  # Truncated answers must not be served to non-streaming runs
+            key = ResponseCache.make_key(model_name, self.system_prompt, prompt, self.temperature)
+            output = self.cache.get_or_call(key, call)
+        record.count_tokens(self.system_prompt + prompt, output)
+        return output
+
+    def spawn(self) -> "CourseRanker":
+        """
+        Tworzy nowego agenta z tymi samymi ustawieniami i danymi ankiety.
+        """
+        return type(self)(**self._init_kwargs)
+
+    def error_result(self, course_name: str, exc: Exception) -> dict[str, Any]:
+        """
+        Zwraca wynik oznaczony jako 'Błąd' dla kursu, którego nie udało się ocenić.
+
+        Parametry:
+            course_name (str): Nazwa kursu.
+            exc (Exception): Wyjątek zgłoszony podczas oceny.
+        """
+        print(f"Błąd podczas oceny kursu '{course_name}': {exc!r}")
+        return {'nazwa przedmiotu': 'Błąd',
+                'zgodność tematyki zajęć': -1,
+                'zgodność trybu prowadzenia zajęć': -1,
+                'zgodność rodzaju zaliczenia': -1}
+
+    def run_many(
+            self,
+            course_names: list[str],
+            concurrency: int = 4,
+            on_result: Optional[Callable[[str, dict[str, Any]], None]] = None,
+            **kwargs,
+    ) -> list[dict[str, Any]]:
+        """
+        Ocenia wiele kursów równolegle, z ograniczoną liczbą jednoczesnych zapytań do modelu.
+        Wyniki są zwracane w kolejności course_names, a błąd jednego kursu nie przerywa partii.
+        Agenci są pobierani z puli, więc powstaje ich najwyżej concurrency na cały czas życia agenta.
+
+        Parametry:
+            course_names (list[str]): Nazwy kursów do oceny.
+            concurrency (int): Maksymalna liczba jednoczesnych zapytań.
+            on_result (Callable | None): Wywoływana z (nazwa kursu, wynik) zaraz po ocenie każdego kursu
+                (poza wynikami 'Błąd'), np. do zapisu postępu w dzienniku.
+        """
+        if self._pool is None:
+            self._pool = AgentPool(self.spawn, agents=[self])
+
+        queued_at = time.perf_counter()  # The executor queues every course at once
+        return run_many(
+            lambda course_name: self._pool.run(course_name, queued_at=queued_at, **kwargs),
+            course_names,
+            concurrency=concurrency,
+            on_error=self.error_result,
+            on_result=on_result,
+        )
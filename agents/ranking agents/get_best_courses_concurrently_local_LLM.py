@@ -2,6 +2,13 @@
 import json
 import pandas as pd
 from course_ranker import CourseRanker
+from common.perf_log import PerfLog, summarize
+from common.prompt_compaction import PromptCompactor
+from common.rate_limit import RateLimiter
+from common.response_cache import ResponseCache
+from common.structured_scorer import StructuredScorer
+from common.sweep import SweepJournal, run_journaled
+from functools import partial
 import random
 from pathlib import Path
 import time
@@ -9,8 +16,6 @@ import os
 
 #%%
 if __name__ == "__main__":
-    import torch
-    from transformers import AutoModelForCausalLM, AutoTokenizer
     # from huggingface_hub import login
     # from swarm_models.huggingface import HuggingfaceLLM
     #
@@ -30,6 +35,27 @@ if __name__ == "__main__":
     os.environ["OPENAI_API_KEY"] = ### Your token goes here
 
     model_name = "gpt-4.1-nano"
+    # Persistent LLM response cache; replay=True reruns the evaluation from cache without model calls
+    cache = ResponseCache(f"llm_cache_{model_name.replace('/', '_')}.sqlite")
+    # Score mode and assessment type with rules over the catalog fields instead of the LLM.
+    # Labels from oguny_unique1.csv are deliberately not passed - they are the ground truth here.
+    use_structured_scorer = False
+    # Maximum number of requests in flight at once (use 1 for a local model)
+    concurrency = 8
+    # Client-side RPM/TPM limits of the API key (tier 1 here); 429s and timeouts are retried with backoff
+    rate_limiter = RateLimiter(rpm=500, tpm=200_000, max_concurrency=concurrency)
+    # True stops reading each answer once all scores are parsed (no justification); off for the published sweeps
+    stream_scores = False
+    # True sends whitespace-normalized course descriptions without USOS boilerplate, cut to per-field token
+    # budgets (PromptCompactor); changes every prompt and cache key, so off for the published sweeps
+    compact_prompts = False
+    compactor = PromptCompactor() if compact_prompts else None
+    # Every finished (preference, course) result is appended here; rerunning the script skips them
+    journal = SweepJournal(f"output/journal_{model_name.replace('/', '_')}.jsonl")
+    # Latency, tokens, cache hits and parsing of every model call; summary: python -m common.perf_log <file>
+    perf_log = PerfLog(f"output/perf_{model_name.replace('/', '_')}.jsonl")
+    # Course samples are drawn from this seed, so that a resumed run scores the same pairs
+    seed = 0
 
     test_data = pd.read_csv("oguny_unique1.csv")
     all_names = test_data["Nazwa"].values.tolist()
@@ -38,6 +64,8 @@ if __name__ == "__main__":
     with open(courses_filename, "r", encoding="utf-8") as file:
         courses_data = json.load(file)
 
+    structured_scorer = StructuredScorer(courses_filename) if use_structured_scorer else None
+
     features_dict = {
         "Tryb": ['zdalnie', 'mieszany: w sali i zdalnie', 'w sali'],
         "Kryteria": ['Esej/praca pisemna', 'Obecność/aktywność', 'Test/egzamin'],
@@ -61,9 +89,9 @@ if __name__ == "__main__":
     set3 = set(features_names['w sali']) & set(features_names['Test/egzamin']) & set(
         features_names['Języki i kultury świata'])
 
-    features_names["w1"] = list(set1)
-    features_names["w2"] = list(set2)
-    features_names["w3"] = list(set3)
+    features_names["w1"] = sorted(set1)
+    features_names["w2"] = sorted(set2)
+    features_names["w3"] = sorted(set3)
 
     start_time = time.time()
 
@@ -108,29 +136,31 @@ if __name__ == "__main__":
 
 
             pref_names = features_names[pref]
-            contr_names = list(set(all_names) - set(pref_names))
-            pref_sample = random.choices(pref_names, k=10)
-            contr_sample = random.choices(contr_names, k=10)
+            contr_names = sorted(set(all_names) - set(pref_names))
+            rng = random.Random(f"{seed}:{feature}:{pref}")
+            pref_sample = rng.choices(pref_names, k=10)
+            contr_sample = rng.choices(contr_names, k=10)
 
             Results[feature][pref] = {}
 
+            ranker_agent = CourseRanker(
+                survey_data,
+                courses_filename,
+                # llm=local_llm
+                model_name = model_name,
+                cache=cache,
+                structured_scorer=structured_scorer,
+                stream_scores=stream_scores,
+                perf_log=perf_log,
+                compactor=compactor,
+                rate_limiter=rate_limiter,
+            )
+            outputs = run_journaled(journal, (feature, pref), pref_sample + contr_sample,
+                                    partial(ranker_agent.run_many, concurrency=concurrency))
+
             for i, (n1, n2) in enumerate(zip(pref_sample, contr_sample)):
-                ranker_agent1 = CourseRanker(
-                    survey_data,
-                    courses_filename,
-                    # llm=local_llm
-                    model_name = model_name
-                )
-                ranker_agent2 = CourseRanker(
-                    survey_data,
-                    courses_filename,
-                    # llm=local_llm
-                    model_name = model_name
-                )
-
-                course_names = [n1, n2]
-                o1 = ranker_agent1.run(n1)
-                o2 = ranker_agent2.run(n2)
+                o1 = outputs[i]
+                o2 = outputs[len(pref_sample) + i]
                 # o1 = {'zgodność trybu prowadzenia zajęć':1, 'zgodność rodzaju zaliczenia':1, 'zgodność tematyki zajęć':1}
                 # o2 = {'zgodność trybu prowadzenia zajęć':1, 'zgodność rodzaju zaliczenia':1, 'zgodność tematyki zajęć':1}
 
@@ -197,4 +227,8 @@ if __name__ == "__main__":
             json.dump(Results[feature], file, ensure_ascii=False, indent=2)
 
     with open(f"output/scores.json", "w", encoding="utf-8") as file:
-        json.dump(Results, file, ensure_ascii=False, indent=2)
\ No newline at end of file
+        json.dump(Results, file, ensure_ascii=False, indent=2)
+
+    print("LLM cache:", cache.stats())
+    print(summarize(PerfLog.load([perf_log.path])).round(3).T.to_string())
+    print("Rate limiter:", rate_limiter.stats())
\ No newline at end of file
@@ -1,5 +1,46 @@
 import gradio as gr
 import json
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "agents"))
+from common.pipeline import RecommendationPipeline, load_course_ranker
+from common.prompt_compaction import PromptCompactor
+from common.rate_limit import RateLimiter
+from common.response_cache import ResponseCache
+from common.topic_labels import TopicLabels
+
+# The API key is read from the OPENAI_API_KEY environment variable
+model_name = "gpt-4.1-nano"
+courses_filename = str(Path(__file__).resolve().parent.parent / "train_data" / "oguny.json")
+concurrency = 8
+
+_pipeline = None
+
+
+def get_pipeline():
+    """Build the recommendation pipeline on first use; it is shared by all sessions of the app."""
+    global _pipeline
+    if _pipeline is None:
+        FilterRanker = load_course_ranker("filtering agents")
+        RankRanker = load_course_ranker("ranking agents")
+        cache = ResponseCache(f"llm_cache_{model_name.replace('/', '_')}.sqlite")
+        rate_limiter = RateLimiter(rpm=500, tpm=200_000, max_concurrency=2 * concurrency)
+        # Offline topic scores (agents/filtering agents/label_course_topics.py) answer the filter without model calls
+        topic_labels = TopicLabels(str(Path(__file__).resolve().parent.parent / "agents" / "filtering agents"
+                                       / "output" / "topic_labels.sqlite"))
+        compactor = PromptCompactor()
+        _pipeline = RecommendationPipeline(
+            lambda survey: FilterRanker(survey, courses_filename, model_name=model_name, cache=cache,
+                                        rate_limiter=rate_limiter, topic_labels=topic_labels),
+            lambda survey: RankRanker(survey, courses_filename, model_name=model_name, cache=cache,
+                                      rate_limiter=rate_limiter, compactor=compactor, stream_scores=True),
+            courses_filename,
+            concurrency=concurrency,
+        )
+    return _pipeline
 
 def collect_survey_gradio(ects, ects_neg, interests, interests_neg, type_, type_neg, zaliczenie, zaliczenie_neg, dodatkowe, dodatkowe_neg):
     def clean_input(value):
@@ -20,9 +61,20 @@ def collect_survey_gradio(ects, ects_neg, interests, interests_neg, type_, type_
 
     return json.dumps(survey, indent=4, ensure_ascii=False)
 
+
+def recommend_gradio(*answers):
+    """Stream the survey JSON, the current top courses and the pipeline progress to the UI."""
+    survey_json = collect_survey_gradio(*answers)
+    for update in get_pipeline().stream(json.loads(survey_json)):
+        status = (f"Etap: {update.stage}, {update.elapsed:.1f} s | przefiltrowane kursy: {update.filtered}, "
+                  f"kandydaci: {update.candidates}, ocenione: {update.ranked}")
+        if update.timed_out:
+            status += f" | przekroczony limit czasu: {', '.join(update.timed_out)}"
+        yield survey_json, pd.DataFrame(update.top), status
+
 # Gradio Interface
 iface = gr.Interface(
-    fn=collect_survey_gradio,
+    fn=recommend_gradio,
     inputs=[
         gr.Textbox(label="Podaj liczbę punktów ECTS lub przedział punktów"),
         gr.Textbox(label="Podaj liczbę punktów ECTS, która nie jest dla Ciebie satysfakcjonująca"),
@@ -35,7 +87,11 @@ iface = gr.Interface(
         gr.Textbox(label="Podaj dodatkowe preferencje"),
         gr.Textbox(label="Podaj dodatkowe ograniczenia")
     ],
-    outputs=gr.Textbox(label="Preferencje w formacie JSON"),
+    outputs=[
+        gr.Textbox(label="Preferencje w formacie JSON"),
+        gr.Dataframe(label="Rekomendowane przedmioty"),
+        gr.Textbox(label="Postęp"),
+    ],
     title="Ankieta preferencji dotyczących przedmiotów",
     description="Wypełnij pola poniżej. Jeśli nie masz preferencji, pozostaw puste – zostaną zapisane jako 'BRAK PREFERENCJI'."
 )